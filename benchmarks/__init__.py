@@ -0,0 +1 @@
+"""Benchmarks for the AIOptimind hot paths. Run from the repository root, e.g. `python -m benchmarks.embedding_backends`."""
@@ -0,0 +1,108 @@
+import random
+
+ENTITIES = ["Job", "Invoice", "Customer", "Employee", "Shipment", "Vendor", "Payment", "Asset", "Ledger", "Contract"]
+VERBS = ["Save", "Update", "Delete", "Get", "Validate", "Approve", "Export", "Import", "Sync", "Archive"]
+TYPES = ["int", "string", "decimal", "DateTime", "bool", "Guid"]
+
+
+def _method(rng, entity, verb):
+    params = ", ".join(f"{rng.choice(TYPES)} {name}" for name in rng.sample(["id", "name", "amount", "date", "flag", "key", "code"], rng.randint(1, 4)))
+    body = []
+    for i in range(rng.randint(3, 25)):
+        kind = rng.random()
+        if kind < 0.3:
+            body.append(f"            var value{i} = await _crud.GetAsync<{entity}>(id);")
+        elif kind < 0.5:
+            body.append(f"            if (value{max(i - 1, 0)} == null) {{ _logger.LogError(\"{entity} {verb} failed\"); return false; }}")
+        elif kind < 0.7:
+            body.append(f"            _auditService.Record(\"{verb}{entity}\", {rng.randint(1, 999)});")
+        elif kind < 0.85:
+            body.append(f"            await _crud.SaveAsync(new {entity}Header {{ Id = id, Status = \"{verb}d\" }});")
+        else:
+            body.append(f"            // {verb} step {i} for {entity.lower()} records")
+    lines = [
+        f"        /// <summary>{verb} a {entity.lower()} using the internal CRUD framework.</summary>",
+        f"        public async Task<bool> {verb}{entity}Async({params})",
+        "        {",
+        *body,
+        "            return true;",
+        "        }",
+    ]
+    return "\n".join(lines)
+
+
+def generate_cs_file(rng, index):
+    entity = rng.choice(ENTITIES)
+    verbs = rng.sample(VERBS, rng.randint(2, 8))
+    methods = "\n\n".join(_method(rng, entity, verb) for verb in verbs)
+    return f"""using System;
+using System.Threading.Tasks;
+using MyHub.Framework.Data;
+using MyHub.Framework.Logging;
+
+namespace MyHub.Modules.{entity}
+{{
+    public class {entity}Service{index}
+    {{
+        private readonly AppCRUD _crud;
+        private readonly ILoggingService _logger;
+        private readonly IAuditService _auditService;
+
+        public {entity}Service{index}(AppCRUD crud, ILoggingService logger, IAuditService auditService)
+        {{
+            _crud = crud;
+            _logger = logger;
+            _auditService = auditService;
+        }}
+
+{methods}
+    }}
+}}
+"""
+
+
+def sample_cs_corpus(n_files=50, seed=7):
+    """Deterministic synthetic C# framework corpus: {file_name: source}."""
+    rng = random.Random(seed)
+    return {f"Service{i}": generate_cs_file(rng, i) for i in range(n_files)}
+
+
+FIELDS = ["Id", "Name", "Code", "Branch", "Amount", "Status", "CreatedOn", "ApprovedBy", "Remarks", "Currency"]
+RULES = [
+    "{field} is mandatory and must be validated before the record is saved.",
+    "When {field} changes, an audit entry is written through the internal audit service.",
+    "{field} must be unique per branch; duplicates are rejected with a validation message.",
+    "The screen shows {field} read-only once the {entity} is approved.",
+    "{field} defaults to the value configured for the user's branch.",
+    "Errors while saving {field} are logged with the framework logging service, never rethrown.",
+]
+
+
+def generate_function_doc(rng, index):
+    """A functional specification in the shape users upload: numbered sections, field tables, rules."""
+    entity = rng.choice(ENTITIES)
+    verb = rng.choice(VERBS)
+    fields = rng.sample(FIELDS, rng.randint(4, 8))
+    lines = [f"{entity.upper()} {verb.upper()} FUNCTIONAL SPECIFICATION", "",
+             "1 Purpose", "",
+             f"This document describes how the {entity.lower()} {verb.lower()} screen works for module {index}. "
+             f"It covers the fields captured, the validation rules and the {verb.lower()} workflow.", ""]
+    lines += ["2 Fields", ""]
+    for number, field in enumerate(fields, start=1):
+        lines += [f"2.{number} {field}", "",
+                  f"{field} holds the {entity.lower()} {field.lower()}. " + " ".join(
+                      rng.choice(RULES).format(field=field, entity=entity.lower()) for _ in range(rng.randint(2, 5))), ""]
+    lines += ["3 Workflow", ""]
+    for step in range(1, rng.randint(4, 9)):
+        lines.append(f"Step {step}: the user {rng.choice(['enters', 'reviews', 'confirms', 'submits'])} the "
+                     f"{rng.choice(fields).lower()} and the system calls {verb}{entity}Async through AppCRUD.")
+    lines += ["", "4 Exceptions", "",
+              f"If {verb}{entity}Async fails the error is logged and the user sees a friendly message. "
+              f"No partial {entity.lower()} data is committed."]
+    return "\n".join(lines)
+
+
+def sample_function_docs(n_docs=20, seed=11):
+    """Deterministic synthetic function documents as extracted by textract: {file_name: text}."""
+    rng = random.Random(seed)
+    return {f"FunctionSpec{i}.docx": generate_function_doc(rng, i) for i in range(n_docs)}
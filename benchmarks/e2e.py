@@ -0,0 +1,346 @@
+"""
+End-to-end benchmark of the agent's hot paths against local stand-ins.
+
+Runs the synthetic C# corpus and function documents through the real
+ingest, retrieval and generation code with Weaviate replaced by
+SimulatedWeaviate and the LLM by FakeLLMServer, and reports:
+
+- embedding throughput (batched texts/sec, single-text latency)
+- ingest throughput for framework code and function documents
+- retrieval p50/p95/p99 and store round trips per query
+- prompt and context token counts
+- end-to-end request latency and time to first token, on the CLI path
+  (main.run_agent) and the async Gradio handler path, under concurrency
+- the tracing spans of the whole run per stage (embedding, weaviate.*,
+  context, llm, ...), so a regression points at the stage that caused it
+
+Caches (embedding, retrieval, response) are off so every run measures the
+work itself. Write --json to keep a run and --compare it later; any metric
+worse than the baseline by more than --tolerance fails the run:
+
+    python -m benchmarks.e2e --json baseline.json
+    python -m benchmarks.e2e --compare baseline.json --tolerance 0.15
+    python -m benchmarks.e2e --embedding-backend hash --files 20 --requests 10   # no model download
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.corpus import sample_cs_corpus, sample_function_docs
+from benchmarks.fake_llm import FakeLLMServer
+from benchmarks.stand_ins import WEAVIATE_ROUND_TRIP_MS, SimulatedWeaviate
+
+PROMPTS = [
+    "Optimize this method and use the internal framework for saving.",
+    "Add proper exception handling with the framework logging service.",
+    "Refactor this code to use AppCRUD SaveAsync instead of raw SQL.",
+    "Find bugs in this method and explain the fixes.",
+    "Make this method async and validate the header before saving.",
+]
+USER_NAME = "bench@example.com"
+# Metrics where a larger value is better; every other numeric leaf is a cost (ms, tokens, round trips, seconds)
+HIGHER_IS_BETTER = ("per_sec",)
+NOISE_FLOOR_MS = 1.0  # latency changes smaller than this are timer noise, whatever the percentage
+
+
+def configure_environment(args, llm_url, workdir):
+    """Point the app's own settings at the stand-ins; must run before weaviate_config is imported."""
+    os.environ.update({
+        "EMBEDDING_BACKEND": args.embedding_backend,
+        "EMBEDDING_CACHE": "0",
+        "RETRIEVAL_CACHE": "0",
+        "RESPONSE_CACHE": "0",
+        "LLM_PROVIDER": args.provider,
+        "OPENAI_BASE_URL": f"{llm_url}/v1",
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "fake"),
+        "OLLAMA_URL": llm_url,
+        "KEYWORD_INDEX_DIR": os.path.join(workdir, "keyword_index"),
+        "LOCAL_VECTOR_INDEX": "1" if args.local_index else "0",
+        "LOCAL_VECTOR_INDEX_DIR": os.path.join(workdir, "local_index"),
+        "TRACE_SUMMARY": "0",  # per-stage totals go into the results instead
+        "METRICS_PORT": "0",
+    })
+    # stand_ins already imported these two (hash backend registration, tracing spans), so set their import-time settings too
+    import embedding_backends
+    import tracing
+
+    embedding_backends.EMBEDDING_BACKEND = args.embedding_backend
+    tracing.TRACE_SUMMARY = False
+
+
+def _percentiles(samples):
+    from serving import _percentiles
+
+    return _percentiles(samples)
+
+
+def user_requests(count, seed=101):
+    """(user code, prompt) pairs: methods from a corpus the framework was not ingested from."""
+    methods = []
+    for source in sample_cs_corpus(max(4, count // 3 + 1), seed=seed).values():
+        methods.extend(part.split("        }\n")[0] + "        }" for part in source.split("        /// <summary>")[1:])
+    return [(methods[i % len(methods)], PROMPTS[i % len(PROMPTS)]) for i in range(count)]
+
+
+# ---------- stages ----------
+def bench_embedding(texts, batch_size):
+    from ollama_config import get_embedding, get_embeddings, get_model
+
+    started = time.perf_counter()
+    get_model()
+    load_seconds = time.perf_counter() - started
+    get_embeddings(texts[:batch_size], batch_size=batch_size)  # warm-up
+
+    started = time.perf_counter()
+    get_embeddings(texts, batch_size=batch_size)
+    seconds = time.perf_counter() - started
+
+    single = []
+    for text in texts[:50]:
+        started = time.perf_counter()
+        get_embedding(text)
+        single.append(time.perf_counter() - started)
+    return {"texts": len(texts), "model_load_seconds": round(load_seconds, 3),
+            "batched_texts_per_sec": round(len(texts) / seconds, 1), "single_text": _percentiles(single)}
+
+
+def bench_ingest(store, corpus, docs, batch_size):
+    from weaviate_config import store_document_embeddings, store_framework_embeddings
+
+    store.reset_stats()
+    started = time.perf_counter()
+    store_framework_embeddings(store, corpus, "FXCodeEmbedding", batch_size=batch_size)
+    code_seconds = time.perf_counter() - started
+    chunks = len(store._store.fetch("FXCodeEmbedding", return_properties=["file_name"]))
+    code_round_trips = sum(store.stats().values())
+
+    store.reset_stats()
+    started = time.perf_counter()
+    store_document_embeddings(store, docs, "FunctionDocsEmbedding", USER_NAME, batch_size=batch_size)
+    doc_seconds = time.perf_counter() - started
+    doc_chunks = len(store._store.fetch("FunctionDocsEmbedding", return_properties=["file_name"]))
+    doc_round_trips = sum(store.stats().values())
+
+    store.reset_stats()
+    started = time.perf_counter()
+    store_framework_embeddings(store, corpus, "FXCodeEmbedding", batch_size=batch_size)
+    unchanged_seconds = time.perf_counter() - started
+    return {
+        "framework": {"files": len(corpus), "chunks": chunks, "seconds": round(code_seconds, 3),
+                      "files_per_sec": round(len(corpus) / code_seconds, 1), "chunks_per_sec": round(chunks / code_seconds, 1),
+                      "round_trips": code_round_trips},
+        "framework_unchanged": {"seconds": round(unchanged_seconds, 3), "round_trips": sum(store.stats().values())},
+        "documents": {"files": len(docs), "chunks": doc_chunks, "seconds": round(doc_seconds, 3),
+                      "files_per_sec": round(len(docs) / doc_seconds, 1), "round_trips": doc_round_trips},
+    }
+
+
+def bench_retrieval(store, requests):
+    from context_packer import count_tokens, pack_context
+    from llm_provider import model_name
+    from ollama_config import get_embeddings
+    from weaviate_config import retrieve_framework_context
+
+    vectors = get_embeddings([code for code, _ in requests])
+    store.reset_stats()
+    latencies, context_tokens = [], []
+    for (_, prompt), vector in zip(requests, vectors):
+        started = time.perf_counter()
+        results = retrieve_framework_context(store, vector.tolist(), prompt)
+        latencies.append(time.perf_counter() - started)
+        context_tokens.append(count_tokens(pack_context(results, model=model_name(), fields=("code",)), model_name()))
+    return {"queries": len(requests), "latency": _percentiles(latencies),
+            "round_trips_per_query": round(sum(store.stats().values()) / len(requests), 2),
+            "context_tokens_mean": round(sum(context_tokens) / len(context_tokens), 1),
+            "context_tokens_max": max(context_tokens)}
+
+
+def _state():
+    return {"inputs": {"flags": {"test": False, "optimize": True, "bug": False},
+                       "FnRadio": {"test": False, "generate": False, "curd": False}}}
+
+
+def bench_cli_requests(store, requests, concurrency):
+    """The main.run_agent path: embed the user's code, retrieve, stream the suggestion."""
+    from weaviate_config import generate_code_suggestion, retrieve_framework_context, store_user_embedding_with_vector
+
+    def one(code, prompt):
+        started = time.perf_counter()
+        _, vector = store_user_embedding_with_vector(store, code)
+        context = retrieve_framework_context(store, vector, prompt)
+        first, usage = None, None
+        for _, usage in generate_code_suggestion(code, prompt, context, _state(), stream=True):
+            first = first or time.perf_counter() - started
+        return time.perf_counter() - started, first, usage
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(lambda request: one(*request), requests))
+    return _request_summary(outcomes, time.perf_counter() - started, concurrency)
+
+
+def bench_handler_requests(store, requests, concurrency):
+    """The gradio_ui chat path: blocking steps on the serving executors, generation on the async client."""
+    from serving import blocking_executor, embedding_executor
+    from weaviate_config import generate_code_suggestion, retrieve_framework_context, store_user_embedding_with_vector
+
+    async def one(limit, code, prompt):
+        async with limit:
+            started = time.perf_counter()
+            _, vector = await embedding_executor.run(store_user_embedding_with_vector, store, code)
+            context = await blocking_executor.run(retrieve_framework_context, store, vector, prompt)
+            first, usage = None, None
+            reply = await blocking_executor.run(generate_code_suggestion, code, prompt, context, _state(), stream="async")
+            async for _, usage in reply:
+                first = first or time.perf_counter() - started
+            return time.perf_counter() - started, first, usage
+
+    async def run_all():
+        limit = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(one(limit, code, prompt) for code, prompt in requests))
+
+    started = time.perf_counter()
+    outcomes = asyncio.run(run_all())
+    return _request_summary(outcomes, time.perf_counter() - started, concurrency)
+
+
+def span_summary():
+    """Per span stage: calls, errors, total time and tokens over the run (tracing.snapshot() without the bucket quantiles)."""
+    import tracing
+
+    return {stage: {"count": s["count"], "errors": s["errors"], "total_ms": round(s["seconds_total"] * 1000, 1),
+                    "tokens_in": s["tokens_in"], "tokens_out": s["tokens_out"]}
+            for stage, s in sorted(tracing.snapshot().items())}
+
+
+def _request_summary(outcomes, seconds, concurrency):
+    prompt_tokens = [usage["prompt_tokens"] for _, _, usage in outcomes if usage]
+    return {"requests": len(outcomes), "concurrency": concurrency,
+            "requests_per_sec": round(len(outcomes) / seconds, 2),
+            "latency": _percentiles([total for total, _, _ in outcomes]),
+            "first_token": _percentiles([first for _, first, _ in outcomes if first is not None]),
+            "prompt_tokens_mean": round(sum(prompt_tokens) / len(prompt_tokens), 1) if prompt_tokens else 0,
+            "prompt_tokens_max": max(prompt_tokens, default=0)}
+
+
+# ---------- comparison ----------
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(results, baseline, tolerance):
+    """Metrics worse than baseline by more than tolerance (a fraction), as printable lines."""
+    current, previous = _flatten(results), _flatten(baseline)
+    regressions = []
+    for key in sorted(current.keys() & previous.keys()):
+        # span totals sum many small calls (and executor queueing): there to explain a regression, too noisy to flag one
+        if key.startswith(("config.", "environment.", "spans.")) or key.endswith((".files", ".chunks", ".texts", ".queries", ".requests", ".concurrency")):
+            continue
+        old, new = previous[key], current[key]
+        if not old or (key.endswith("_ms") and abs(new - old) < NOISE_FLOOR_MS):
+            continue
+        change = (new - old) / abs(old)
+        worse = -change if key.endswith(HIGHER_IS_BETTER) else change
+        if worse > tolerance:
+            regressions.append(f"{key}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def run(args):
+    corpus = sample_cs_corpus(args.files)
+    docs = sample_function_docs(args.docs)
+    requests = user_requests(args.requests)
+    llm = FakeLLMServer(ttft_ms=args.llm_ttft_ms, tokens_per_sec=args.llm_tokens_per_sec,
+                        completion_tokens=args.llm_completion_tokens).start()
+    workdir = tempfile.mkdtemp(prefix="aioptimind-bench-")
+    configure_environment(args, llm.url, workdir)
+
+    from cs_chunker import chunk_cs_source
+    from weaviate_config import ensure_schema, user_code_writes
+
+    store = SimulatedWeaviate(round_trip_ms=args.weaviate_rtt_ms)
+    try:
+        ensure_schema(store)
+        texts = [chunk["code"] for source in corpus.values() for chunk in chunk_cs_source(source)]
+        print(f"🧪 {len(corpus)} C# file(s) ({len(texts)} chunk(s)), {len(docs)} function doc(s), {len(requests)} request(s); "
+              f"embedding backend {args.embedding_backend}, Weaviate RTT {args.weaviate_rtt_ms} ms, LLM {args.provider} "
+              f"(TTFT {args.llm_ttft_ms} ms, {args.llm_tokens_per_sec} tok/s)")
+        results = {"config": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+                   "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}}
+        stages = [
+            ("embedding", lambda: bench_embedding(texts, args.batch_size)),
+            ("ingest", lambda: bench_ingest(store, corpus, docs, args.batch_size)),
+            ("retrieval", lambda: bench_retrieval(store, requests)),
+            ("cli_requests", lambda: bench_cli_requests(store, requests, args.concurrency)),
+            ("handler_requests", lambda: bench_handler_requests(store, requests, args.concurrency)),
+        ]
+        for name, stage in stages:
+            if args.stages and name not in args.stages:
+                continue
+            started = time.perf_counter()
+            results[name] = stage()
+            print(f"⏱️ {name}: {time.perf_counter() - started:.2f}s {json.dumps(results[name])}")
+        user_code_writes.flush()
+        results["store_round_trips"] = store.stats()
+        results["llm_requests"] = llm.requests
+        results["spans"] = span_summary()
+        return results
+    finally:
+        store.close()
+        llm.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against local Weaviate and LLM stand-ins")
+    parser.add_argument("--files", type=int, default=60, help="Synthetic .cs files to ingest")
+    parser.add_argument("--docs", type=int, default=20, help="Synthetic function documents to ingest")
+    parser.add_argument("--requests", type=int, default=30, help="User requests per request stage")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--embedding-backend", default=os.getenv("EMBEDDING_BACKEND", "torch"),
+                        help="torch, onnx, onnx-int8, or hash (no model, for smoke runs)")
+    parser.add_argument("--provider", default="openai", choices=["openai", "ollama"], help="API the fake LLM is called through")
+    parser.add_argument("--weaviate-rtt-ms", type=float, default=WEAVIATE_ROUND_TRIP_MS)
+    parser.add_argument("--llm-ttft-ms", type=float, default=300.0)
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=80.0)
+    parser.add_argument("--llm-completion-tokens", type=int, default=150)
+    parser.add_argument("--local-index", action="store_true", help="Enable the local vector mirror (LOCAL_VECTOR_INDEX=1)")
+    parser.add_argument("--stages", help="Comma-separated subset of: embedding, ingest, retrieval, cli_requests, handler_requests")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs the baseline, as a fraction")
+    args = parser.parse_args()
+    args.stages = [s.strip() for s in args.stages.split(",")] if args.stages else None
+
+    results = run(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  • {line}")
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Compare embedding backends (torch / onnx / onnx-int8) on a synthetic C# corpus.
+
+Reports load time, texts/sec and cosine agreement with the fp32 torch vectors:
+
+    python -m benchmarks.embedding_backends --backends torch,onnx,onnx-int8 --files 40
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.corpus import sample_cs_corpus
+from cs_chunker import chunk_cs_source
+from embedding_backends import BACKENDS, load_model
+from ollama_config import DEFAULT_BATCH_SIZE, MODEL_NAME, _prepare_text
+
+
+def sample_texts(n_files):
+    texts = []
+    for source in sample_cs_corpus(n_files).values():
+        texts.extend(_prepare_text(chunk["code"]) for chunk in chunk_cs_source(source))
+    return texts
+
+
+def encode(model, texts, batch_size):
+    # Same length-sorted batching as ollama_config.get_embeddings, without the cache
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    vectors = np.empty((len(texts), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        vectors[idx] = np.asarray(model.encode([texts[i] for i in idx], batch_size=len(idx)), dtype=np.float32)
+    return vectors
+
+
+def run(backends, n_files, batch_size):
+    texts = sample_texts(n_files)
+    print(f"🧪 {len(texts)} chunk(s) from {n_files} synthetic C# file(s), batch size {batch_size}")
+    results = {}
+    reference = None
+
+    # torch always runs first: it is the fp32 reference for cosine agreement
+    for backend in ["torch"] + [b for b in backends if b != "torch"]:
+        started = time.perf_counter()
+        model = load_model(MODEL_NAME, backend)
+        load_seconds = time.perf_counter() - started
+
+        encode(model, texts[:batch_size], batch_size)  # warm-up
+        started = time.perf_counter()
+        vectors = encode(model, texts, batch_size)
+        seconds = time.perf_counter() - started
+
+        if reference is None:
+            reference = vectors
+        ref_norm = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+        vec_norm = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        cosine = np.sum(ref_norm * vec_norm, axis=1)
+
+        results[backend] = {
+            "load_seconds": round(load_seconds, 3),
+            "texts_per_sec": round(len(texts) / seconds, 1),
+            "cosine_mean": round(float(cosine.mean()), 5),
+            "cosine_min": round(float(cosine.min()), 5),
+        }
+
+    base = results["torch"]["texts_per_sec"]
+    print(f"\n{'backend':<10} {'load s':>8} {'texts/s':>9} {'speedup':>8} {'cos mean':>9} {'cos min':>9}")
+    for backend, r in results.items():
+        if backend in backends:
+            print(f"{backend:<10} {r['load_seconds']:>8.2f} {r['texts_per_sec']:>9.1f} {r['texts_per_sec'] / base:>7.2f}x "
+                  f"{r['cosine_mean']:>9.5f} {r['cosine_min']:>9.5f}")
+    return {backend: r for backend, r in results.items() if backend in backends}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends on a synthetic C# corpus")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="Comma-separated subset of: " + ", ".join(BACKENDS))
+    parser.add_argument("--files", type=int, default=40, help="Number of synthetic .cs files")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    results = run([b.strip() for b in args.backends.split(",")], args.files, args.batch_size)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
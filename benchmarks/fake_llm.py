@@ -0,0 +1,148 @@
+"""
+Deterministic fake LLM server speaking the two APIs llm_provider uses:
+OpenAI /chat/completions and Ollama /api/chat, streamed or not.
+
+The answer is pseudo-random C#-flavoured text seeded by the request's
+messages, so the same prompt always gets the same answer. Latency is
+time-to-first-token plus completion_tokens / tokens_per_sec; prompt tokens
+are estimated at 4 characters per token, as context_packer does without a
+local tokenizer. Run standalone to point the app at it:
+
+    python -m benchmarks.fake_llm --port 8099 --ttft-ms 400 --tokens-per-sec 60
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=fake python main.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from context_packer import CHARS_PER_TOKEN
+
+VOCABULARY = ["public", "async", "Task<bool>", "await", "_crud.SaveAsync(header);", "var", "result", "=", "if", "(result", "==",
+              "null)", "{", "}", "_logger.LogError(ex.Message);", "return", "true;", "false;", "try", "catch", "(Exception",
+              "ex)", "//", "Validate", "the", "header", "before", "saving.", "Use", "AppCRUD", "for", "the", "transaction."]
+
+
+class FakeLLMServer:
+    def __init__(self, host="127.0.0.1", port=0, ttft_ms=300.0, tokens_per_sec=80.0, completion_tokens=200):
+        self.ttft = ttft_ms / 1000
+        self.tokens_per_sec = tokens_per_sec
+        self.completion_tokens = completion_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def answer(self, messages):
+        """(tokens, prompt token estimate) for a message list; the same messages always give the same tokens."""
+        text = "".join(str(m.get("content", "")) for m in messages)
+        rng = random.Random(hashlib.sha256(text.encode("utf-8")).hexdigest())
+        tokens = [rng.choice(VOCABULARY) + " " for _ in range(self.completion_tokens)]
+        return tokens, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, as the real APIs; streams use chunked encoding
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                ollama = self.path.rstrip("/").endswith("/api/chat")
+                if not ollama and not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                tokens, prompt_tokens = server.answer(body.get("messages", []))
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                         "total_tokens": prompt_tokens + len(tokens)}
+                time.sleep(server.ttft)
+                if body.get("stream"):
+                    self._stream(tokens, usage, ollama)
+                else:
+                    time.sleep(len(tokens) / server.tokens_per_sec)
+                    content = "".join(tokens)
+                    if ollama:
+                        payload = {"message": {"role": "assistant", "content": content}, "done": True,
+                                   "prompt_eval_count": prompt_tokens, "eval_count": len(tokens)}
+                    else:
+                        payload = {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}], "usage": usage}
+                    data = json.dumps(payload).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+
+            def _chunk(self, line):
+                data = line.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _stream(self, tokens, usage, ollama):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson" if ollama else "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                interval = 1 / server.tokens_per_sec
+                for token in tokens:
+                    if ollama:
+                        self._chunk(json.dumps({"message": {"role": "assistant", "content": token}, "done": False}) + "\n")
+                    else:
+                        self._chunk("data: " + json.dumps({"choices": [{"index": 0, "delta": {"content": token}}]}) + "\n\n")
+                    time.sleep(interval)
+                if ollama:
+                    self._chunk(json.dumps({"message": {"role": "assistant", "content": ""}, "done": True,
+                                            "prompt_eval_count": usage["prompt_tokens"], "eval_count": usage["completion_tokens"]}) + "\n")
+                else:
+                    self._chunk("data: " + json.dumps({"choices": [], "usage": usage}) + "\n\n")
+                    self._chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake OpenAI/Ollama chat server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="Delay before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=80.0)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.host, args.port, args.ttft_ms, args.tokens_per_sec, args.completion_tokens)
+    print(f"🤖 Fake LLM on {server.url} (OpenAI base URL {server.url}/v1, Ollama URL {server.url})")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
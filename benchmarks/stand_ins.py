@@ -0,0 +1,148 @@
+"""
+Local stand-in for Weaviate Cloud, so benchmarks run without credentials or network.
+
+SimulatedWeaviate serves the VectorStore interface from an EmbeddedStore kept
+in memory (/dev/shm when available) and sleeps one round trip per request
+the real WeaviateStore would send: one per fetch page, per write batch, per
+query. It counts requests per operation, so a change that adds round trips
+shows up in the benchmark output even when latency is set to zero. Its
+operations are traced as weaviate.<operation>, like WeaviateStore's.
+
+HashingModel stands in for the embedding model; importing this module
+registers it as EMBEDDING_BACKEND=hash.
+"""
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+
+import tracing
+from embedding_backends import register_backend
+from vector_store import FETCH_PAGE_SIZE, WRITE_BATCH_SIZE, EmbeddedStore, VectorStore
+
+WEAVIATE_ROUND_TRIP_MS = 25.0  # typical Weaviate Cloud round trip from a nearby region
+
+
+class HashingModel:
+    """
+    Stand-in with SentenceTransformer's encode(): each word is hashed to a
+    signed dimension and the counts are L2-normalized. Texts sharing words
+    still land close together, so retrieval behaves plausibly without torch.
+    """
+
+    _WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+
+    def __init__(self, model_name=None, dim=384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _encode_one(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in self._WORD.findall(text.lower()):
+            h = zlib.crc32(word.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, sentences, batch_size=32, **kwargs):
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        return np.stack([self._encode_one(text) for text in sentences]) if sentences else np.zeros((0, self.dim), dtype=np.float32)
+
+
+register_backend("hash", HashingModel)
+
+
+class SimulatedWeaviate(VectorStore):
+    def __init__(self, round_trip_ms=WEAVIATE_ROUND_TRIP_MS):
+        self.round_trip = round_trip_ms / 1000
+        base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        self.directory = tempfile.mkdtemp(prefix="aioptimind-bench-", dir=base)
+        self._store = EmbeddedStore(self.directory)
+        self._lock = threading.Lock()
+        self.requests = Counter()
+
+    def _round_trips(self, operation, count=1):
+        with self._lock:
+            self.requests[operation] += count
+        if self.round_trip and count:
+            time.sleep(self.round_trip * count)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.requests)
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests.clear()
+
+    # ---------- VectorStore ----------
+    @tracing.traced("weaviate.list_collections")
+    def list_collections(self):
+        self._round_trips("list_collections")
+        return self._store.list_collections()
+
+    @tracing.traced("weaviate.create_collection")
+    def create_collection(self, name, properties, vectorized_property=None):
+        self._round_trips("create_collection")
+        return self._store.create_collection(name, properties, vectorized_property)
+
+    @tracing.traced("weaviate.insert")
+    def insert(self, name, uuid, properties, vector=None):
+        self._round_trips("insert")
+        return self._store.insert(name, uuid, properties, vector)
+
+    @tracing.traced("weaviate.upsert")
+    def upsert(self, name, objects):
+        objects = list(objects)
+        self._round_trips("upsert", math.ceil(len(objects) / WRITE_BATCH_SIZE))
+        return self._store.upsert(name, objects)
+
+    @tracing.traced("weaviate.fetch_by_ids")
+    def fetch_by_ids(self, name, uuids, include_vector=False):
+        uuids = list(uuids)
+        self._round_trips("fetch_by_ids", 1 if uuids else 0)
+        return self._store.fetch_by_ids(name, uuids, include_vector=include_vector)
+
+    @tracing.traced("weaviate.fetch")
+    def fetch(self, name, where=None, return_properties=None, include_vector=False, limit=None):
+        objects = self._store.fetch(name, where, return_properties, include_vector, limit)
+        # WeaviateStore pages through results; a full last page costs one more (empty) request
+        self._round_trips("fetch", len(objects) // FETCH_PAGE_SIZE + 1)
+        return objects
+
+    @tracing.traced("weaviate.delete_many")
+    def delete_many(self, name, where):
+        deleted = self._store.delete_many(name, where)
+        # WeaviateStore fetches the exact matches' ids (paged), then deletes them in batches
+        self._round_trips("delete_many", deleted // FETCH_PAGE_SIZE + 1 + math.ceil(deleted / FETCH_PAGE_SIZE))
+        return deleted
+
+    @tracing.traced("weaviate.delete_ids")
+    def delete_ids(self, name, uuids):
+        uuids = list(uuids)
+        self._round_trips("delete_ids", 1 if uuids else 0)
+        return self._store.delete_ids(name, uuids)
+
+    @tracing.traced("weaviate.near_vector")
+    def near_vector(self, name, vector, top_k=5, where=None, include_vector=False):
+        self._round_trips("near_vector")
+        return self._store.near_vector(name, vector, top_k, where, include_vector)
+
+    @tracing.traced("weaviate.hybrid")
+    def hybrid(self, name, query, vector, alpha=0.5, top_k=5, where=None):
+        self._round_trips("hybrid")
+        return self._store.hybrid(name, query, vector, alpha, top_k, where)
+
+    def close(self):
+        self._store.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,129 @@
+"""
+Recall vs memory of the local index's compact vector encodings.
+
+Each configuration builds a LocalVectorIndex over the same vectors and runs
+held-out queries through it (code shortlist + exact rescoring), reporting
+bytes per vector, compression against float32, recall@k of the codes alone
+and after rescoring, and query latency:
+
+    python -m benchmarks.vector_codecs --vectors .local_index/FXCodeEmbedding.npy
+    python -m benchmarks.vector_codecs --files 200 --configs int8,binary,pca128+int8
+    python -m benchmarks.vector_codecs --synthetic 50000
+"""
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+
+import local_index
+from local_index import LocalVectorIndex
+
+DEFAULT_CONFIGS = "int8,binary,pca192,pca128+int8,pca256+binary,pca128+binary"
+
+
+def parse_config(config):
+    """"pca128+int8" -> ("int8", 128); "pca192" -> ("float32", 192); "binary" -> ("binary", 0)."""
+    pca_dim, encoding = 0, "float32"
+    for part in config.split("+"):
+        if part.startswith("pca"):
+            pca_dim = int(part[3:])
+        else:
+            encoding = part
+    return encoding, pca_dim
+
+
+def corpus_vectors(n_files):
+    from benchmarks.embedding_backends import sample_texts
+    from ollama_config import get_embeddings
+
+    return np.asarray(get_embeddings(sample_texts(n_files)), dtype=np.float32)
+
+
+def synthetic_vectors(count, dim=384, clusters=200, seed=0):
+    """Unit vectors around random centroids: a stand-in with the clumpy structure of real embeddings."""
+    rng = np.random.default_rng(seed)
+    centroids = rng.normal(size=(clusters, dim))
+    vectors = centroids[rng.integers(0, clusters, count)] + 0.6 * rng.normal(size=(count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _unit(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def run(vectors, configs, n_queries, top_k):
+    rng = np.random.default_rng(1)
+    held_out = rng.choice(len(vectors), min(n_queries, len(vectors) // 10), replace=False)
+    queries = vectors[held_out]
+    base = np.delete(vectors, held_out, axis=0)
+    uuids = [str(i) for i in range(len(base))]
+    exact = np.argsort(-(_unit(base) @ _unit(queries).T), axis=0)[:top_k].T
+    print(f"🧪 {len(base)} vector(s) of dim {base.shape[1]}, {len(queries)} held-out quer(y/ies), top_k {top_k}, "
+          f"shortlist {max(local_index.SHORTLIST_FACTOR * top_k, local_index.SHORTLIST_MIN)}")
+
+    results = {}
+    for config in ["float32"] + configs:
+        encoding, pca_dim = parse_config(config)
+        with tempfile.TemporaryDirectory() as index_dir:
+            index = LocalVectorIndex("bench", index_dir=index_dir, encoding=encoding, pca_dim=pca_dim)
+            index.upsert_many(uuids, [{} for _ in uuids], base)
+            index.save()
+            index.query(queries[0], top_k)  # fits the codec and builds the codes
+
+            codes = index._compact_codes()
+            codes_only, rescored, seconds = 0, 0, 0.0
+            for query, truth in zip(queries, exact):
+                truth = set(truth.tolist())
+                if codes is not None:
+                    codes_only += len(truth & set(index.codec.shortlist(codes, _unit(query[None])[0], top_k).tolist()))
+                started = time.perf_counter()
+                hits = index.query(query, top_k)
+                seconds += time.perf_counter() - started
+                rescored += len(truth & {int(hit.uuid) for hit in hits})
+
+            bytes_per_vector = index.codec.bytes_per_vector() if index.codec is not None else base.shape[1] * 4
+            total = len(queries) * top_k
+            results[config] = {
+                "bytes_per_vector": bytes_per_vector,
+                "compression": round(base.shape[1] * 4 / bytes_per_vector, 1),
+                "resident_mib": round(len(base) * bytes_per_vector / 2**20, 2),
+                "recall_codes": round(codes_only / total, 4) if codes is not None else 1.0,
+                "recall_rescored": round(rescored / total, 4),
+                "query_ms": round(seconds / len(queries) * 1000, 3),
+            }
+
+    print(f"\n{'encoding':<16} {'B/vec':>6} {'smaller':>8} {'RAM MiB':>8} {'recall codes':>13} {'recall rescored':>16} {'ms/query':>9}")
+    for config, r in results.items():
+        print(f"{config:<16} {r['bytes_per_vector']:>6} {r['compression']:>7.1f}x {r['resident_mib']:>8.2f} "
+              f"{r['recall_codes']:>13.4f} {r['recall_rescored']:>16.4f} {r['query_ms']:>9.3f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs memory of compact local-index vector encodings")
+    parser.add_argument("--configs", default=DEFAULT_CONFIGS,
+                        help="Comma-separated encodings: int8, binary, pcaN, pcaN+int8, pcaN+binary")
+    parser.add_argument("--vectors", help="A .npy matrix of stored vectors, e.g. .local_index/FXCodeEmbedding.npy")
+    parser.add_argument("--files", type=int, default=200, help="Synthetic .cs files to embed when --vectors is not given")
+    parser.add_argument("--synthetic", type=int, help="Use this many clustered random vectors instead of embeddings")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+    elif args.synthetic:
+        vectors = synthetic_vectors(args.synthetic)
+    else:
+        vectors = corpus_vectors(args.files)
+    results = run(vectors, [c.strip() for c in args.configs.split(",") if c.strip()], args.queries, args.top_k)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
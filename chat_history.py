@@ -0,0 +1,158 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from utils import compute_hash
+
+CHAT_HISTORY_PATH = os.getenv("CHAT_HISTORY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".chat_history", "history.db"))
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "1000"))  # per user; older messages go at compaction
+COMPACT_EVERY_BATCHES = 200
+WRITE_BATCH_SIZE = 256
+ANONYMOUS = "anonymous"
+
+
+def _message_hash(message):
+    return compute_hash(json.dumps(message, sort_keys=True, default=str))
+
+
+class ChatHistoryStore:
+    """
+    Per-user chat history in SQLite (WAL), one row per message.
+
+    save() diffs the handler's message list against what this process last
+    saw for the user, so a turn queues only its new messages (or a truncate
+    when a handler dropped a marker message) instead of rewriting everything.
+    A background thread applies queued writes in batched transactions and
+    every COMPACT_EVERY_BATCHES batches trims each user to the newest
+    max_messages and checkpoints the WAL.
+    """
+
+    def __init__(self, path=CHAT_HISTORY_PATH, max_messages=CHAT_HISTORY_MAX_MESSAGES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_messages = max_messages
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                email TEXT, seq INTEGER, message TEXT, created_at REAL, PRIMARY KEY (email, seq)
+            ) WITHOUT ROWID
+        """)
+        self._db_lock = threading.Lock()
+        # email -> (seq of the first message in the user's list, hash of every message after it)
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._batches = 0
+        self._thread = threading.Thread(target=self._run, name="chat-history-writes", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    # ---------- request path ----------
+    def load(self, email):
+        """The user's messages, oldest first (after any queued writes have landed)."""
+        email = email or ANONYMOUS
+        self.flush()
+        with self._db_lock:
+            rows = self._db.execute("SELECT seq, message FROM messages WHERE email = ? ORDER BY seq", (email,)).fetchall()
+        messages = [json.loads(message) for _, message in rows]
+        with self._sessions_lock:
+            self._sessions[email] = (rows[0][0] if rows else 0, [_message_hash(m) for m in messages])
+        return messages
+
+    def save(self, email, history):
+        """Queue whatever changed in history since the last save/load for this user."""
+        email = email or ANONYMOUS
+        with self._sessions_lock:
+            base, known = self._sessions.get(email, (0, []))
+            count = len(known)
+            if len(history) >= count and (count == 0 or _message_hash(history[count - 1]) == known[-1]):
+                keep = count  # common case: the list only grew
+            else:
+                keep = 0
+                for keep, message in enumerate(history[:count]):
+                    if _message_hash(message) != known[keep]:
+                        break
+                else:
+                    keep = min(len(history), count)
+                self._queue.put(("truncate", email, base + keep))
+            added = history[keep:]
+            if added:
+                now = time.time()
+                self._queue.put(("append", email, [(base + keep + i, json.dumps(message, default=str), now)
+                                                   for i, message in enumerate(added)]))
+            self._sessions[email] = (base, known[:keep] + [_message_hash(m) for m in added])
+
+    def clear(self, email):
+        email = email or ANONYMOUS
+        with self._sessions_lock:
+            base, known = self._sessions.get(email, (0, []))
+            # Keep numbering after the cleared messages so a queued append can't land under an old seq
+            self._sessions[email] = (base + len(known), [])
+        self._queue.put(("clear", email, None))
+
+    # ---------- background writer ----------
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._apply(batch)
+            except Exception as e:
+                print(f"❌ chat history: batch of {len(batch)} write(s) failed: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _apply(self, batch):
+        with self._db_lock, self._db:
+            for op, email, payload in batch:
+                if op == "append":
+                    self._db.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)",
+                                         [(email, seq, message, created_at) for seq, message, created_at in payload])
+                elif op == "truncate":
+                    self._db.execute("DELETE FROM messages WHERE email = ? AND seq >= ?", (email, payload))
+                elif op == "clear":
+                    self._db.execute("DELETE FROM messages WHERE email = ?", (email,))
+        self._batches += 1
+        if self._batches % COMPACT_EVERY_BATCHES == 0:
+            self.compact()
+
+    def compact(self):
+        """Drop all but each user's newest max_messages and fold the WAL back into the database file."""
+        with self._db_lock:
+            with self._db:
+                removed = self._db.execute("""
+                    DELETE FROM messages WHERE (email, seq) IN (
+                        SELECT email, seq FROM (
+                            SELECT email, seq, ROW_NUMBER() OVER (PARTITION BY email ORDER BY seq DESC) AS newest
+                            FROM messages
+                        ) WHERE newest > ?
+                    )""", (self.max_messages,)).rowcount
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if removed:
+            print(f"🧹 Chat history compacted: {removed} old message(s) removed")
+
+    def flush(self):
+        self._queue.join()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChatHistoryStore()
+    return _store
@@ -0,0 +1,151 @@
+import os
+from functools import lru_cache
+
+import tracing
+from utils import compute_hash
+
+try:
+    import tiktoken  # optional: exact token counts for OpenAI models
+except ImportError:
+    tiktoken = None
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_MAX_DISTANCE = float(os.getenv("CONTEXT_MAX_DISTANCE", "0.5"))  # cosine distance; farther hits are dropped
+CHARS_PER_TOKEN = 4  # estimate when the model has no local tokenizer (e.g. Ollama models)
+
+
+@lru_cache(maxsize=8)
+def _encoding(model):
+    """
+    tiktoken encoding for model, or None for the chars/4 estimate. tiktoken
+    downloads its BPE file on first use; when that fails (offline host) the
+    None is cached like an unknown model, so the download is not retried per call.
+    """
+    if tiktoken is None or not model:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return None
+    except Exception as e:
+        print(f"⚠️ tiktoken unavailable for {model}, estimating tokens at {CHARS_PER_TOKEN} chars each: {str(e)}")
+        return None
+
+
+def count_tokens(text, model=None):
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _distance(obj):
+    metadata = getattr(obj, "metadata", None)
+    return getattr(metadata, "distance", None) if metadata is not None else None
+
+
+def _score(obj):
+    metadata = getattr(obj, "metadata", None)
+    return getattr(metadata, "score", None) if metadata is not None else None
+
+
+def _overlaps(a, b):
+    """
+    Two chunks of the same file sharing more than half of the shorter one's
+    lines. Neighbouring chunks repeat a few lines on purpose (cs_chunker's
+    leading context, doc_chunker's overlap), so any intersection is too strict.
+    """
+    if a.get("file_name") != b.get("file_name") or a.get("start_line") is None or b.get("start_line") is None:
+        return False
+    a_end, b_end = a.get("end_line") or a["start_line"], b.get("end_line") or b["start_line"]
+    shared = min(a_end, b_end) - max(a["start_line"], b["start_line"]) + 1
+    return shared > 0 and shared * 2 > min(a_end - a["start_line"], b_end - b["start_line"]) + 1
+
+
+def _render(props, body):
+    if "code" in props and props.get("code"):
+        header = props.get("file_name") or "framework"
+        if props.get("symbol_path"):
+            header += f" · {props['symbol_path']}"
+        if props.get("start_line"):
+            header += f" (lines {props['start_line']}-{props.get('end_line')})"
+        return f"// {header}\n```csharp\n{body}\n```"
+    header = props.get("file_name") or "document"
+    if props.get("section"):
+        header += f" · {props['section']}"
+    return f"From {header}:\n```text\n{body}\n```"
+
+
+def _truncate(body, max_tokens, model):
+    """Keep whole leading lines of body within max_tokens (a single overlong line is cut by length)."""
+    kept, used = [], 0
+    for line in body.splitlines():
+        cost = count_tokens(line + "\n", model)
+        if used + cost > max_tokens:
+            if not kept and max_tokens > 0:
+                kept.append(line[:max_tokens * CHARS_PER_TOKEN])
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept)
+
+
+def pack_context(results, model=None, budget=CONTEXT_TOKEN_BUDGET, max_distance=CONTEXT_MAX_DISTANCE, fields=("code", "text")):
+    """
+    Turn retrieval hits into the prompt's context section.
+
+    Hits farther than max_distance are dropped, the rest are ordered by
+    distance (hybrid hits, which carry a fused score, keep the fusion's order
+    and are exempt from the cutoff so keyword-only matches survive), exact duplicates and chunks overlapping an already chosen chunk
+    of the same file are skipped, and fenced blocks are added until the token
+    budget is full (the block that crosses it is cut at a line boundary).
+    Logs how many tokens this saved compared with sending every hit.
+    """
+    with tracing.span("context") as record:
+        context, blocks, used = _pack(list(results or []), model, budget, max_distance, fields)
+        record.set(tokens_in=used, objects=blocks, bytes=len(context.encode("utf-8")))
+    return context
+
+
+def _pack(results, model, budget, max_distance, fields):
+    if results and all(_score(obj) is not None for obj in results):
+        order = sorted(range(len(results)), key=lambda i: (-_score(results[i]), i))
+    else:
+        order = sorted(range(len(results)), key=lambda i: (_distance(results[i]) is None, _distance(results[i]) or 0.0, i))
+
+    blocks, chosen, seen_hashes = [], [], set()
+    used = 0
+    unpacked = 0
+    for i in order:
+        props = results[i].properties or {}
+        body = "\n".join(str(props[f]).strip() for f in fields if props.get(f))
+        if not body:
+            continue
+        unpacked += count_tokens(body, model)
+        distance = _distance(results[i])
+        if distance is not None and distance > max_distance and _score(results[i]) is None:
+            continue
+        body_hash = compute_hash(body)
+        if body_hash in seen_hashes or any(_overlaps(props, other) for other in chosen):
+            continue
+        if used >= budget:
+            continue
+
+        block = _render(props, body)
+        cost = count_tokens(block, model) + 1
+        if used + cost > budget:
+            overhead = cost - count_tokens(body, model)
+            body = _truncate(body, budget - used - overhead, model)
+            if not body:
+                continue
+            block = _render(props, body)
+            cost = count_tokens(block, model) + 1
+        seen_hashes.add(body_hash)
+        chosen.append(props)
+        blocks.append(block)
+        used += cost
+
+    context = "\n\n".join(blocks)
+    print(f"🧮 Context: {len(blocks)}/{len(results)} snippet(s), {used} token(s) of {budget}; "
+          f"saved {max(unpacked - used, 0)} token(s)")
+    return context, len(blocks), used
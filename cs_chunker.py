@@ -0,0 +1,273 @@
+import re
+from bisect import bisect_right
+
+MAX_CHUNK_LINES = 80  # Keeps a chunk comfortably under e5-small-v2's 512 token window
+OVERLAP_LINES = 3
+
+_NAMESPACE_RE = re.compile(r"^namespace\s+([\w.]+)")
+_TYPE_RE = re.compile(r"\b(class|struct|interface|record|enum)\s+(\w+)")
+# Name right before the parameter list, with its own (possibly nested) type parameters only, so the
+# generic return type of `Task<bool> SaveAsync<T>(` is not taken for the name
+_METHOD_RE = re.compile(r"(\w+)\s*(?:<[^<>()]*(?:<[^<>()]*>[^<>()]*)*>)?\s*\($")
+_TRAILING_IDENT_RE = re.compile(r"(\w+)\s*$")
+_ATTRIBUTE_RE = re.compile(r"^\s*\[[^\]]*\]\s*", re.MULTILINE)
+_COMMENT_RE = re.compile(r"//[^\n]*|/\*.*?\*/", re.DOTALL)
+
+
+def _skip_string(source, i):
+    """Return the index just past the string/char literal starting at i."""
+    n = len(source)
+    if source.startswith('"""', i):
+        end = source.find('"""', i + 3)
+        return n if end == -1 else end + 3
+    verbatim = False
+    while source[i] in "@$":
+        verbatim = verbatim or source[i] == "@"
+        i += 1
+    i += 1  # opening quote
+    while i < n:
+        c = source[i]
+        if verbatim:
+            if c == '"':
+                if i + 1 < n and source[i + 1] == '"':
+                    i += 2
+                    continue
+                return i + 1
+        else:
+            if c == "\\":
+                i += 2
+                continue
+            if c == '"' or c == "\n":
+                return i + 1
+        i += 1
+    return n
+
+
+def _skip_char(source, i):
+    end = source.find("'", i + 2 if source[i + 1:i + 2] == "\\" else i + 1)
+    return len(source) if end == -1 else end + 1
+
+
+def _clean_header(header):
+    header = _COMMENT_RE.sub(" ", header)
+    header = _ATTRIBUTE_RE.sub(" ", header)
+    header = re.sub(r"^\s*#[^\n]*", " ", header, flags=re.MULTILINE)
+    return " ".join(header.split())
+
+
+def _classify(signature):
+    """Return (kind, name) for the text preceding a '{'."""
+    match = _NAMESPACE_RE.match(signature)
+    if match:
+        return "namespace", match.group(1)
+    match = _TYPE_RE.search(signature)
+    if match and "(" not in signature.split(match.group(0))[0]:
+        return "type", match.group(2)
+    outside_parens = signature
+    while True:
+        stripped = re.sub(r"\([^()]*\)", "", outside_parens)
+        if stripped == outside_parens:
+            break
+        outside_parens = stripped
+    if "=" in outside_parens.replace("=>", ""):
+        return "other", None  # field/array/object initializer
+    match = _METHOD_RE.search(signature[:signature.find("(") + 1]) if "(" in signature else None
+    if match:
+        return "member", match.group(1)
+    match = _TRAILING_IDENT_RE.search(signature)
+    if match:
+        return "member", match.group(1)  # property, indexer, event
+    return "other", None
+
+
+def _scan_blocks(source):
+    """
+    Find every {...} block, its header text and nesting, skipping strings and comments.
+
+    Returns (blocks, file_namespace). Each block is a dict with kind, name,
+    signature, header_start, open, close and children.
+    """
+    root = {"kind": "root", "name": None, "children": []}
+    stack = [root]
+    header_start = 0
+    file_namespace = None
+    i, n = 0, len(source)
+
+    while i < n:
+        c = source[i]
+        if source.startswith("//", i):
+            end = source.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        if source.startswith("/*", i):
+            end = source.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        if c == '"' or (c in "@$" and re.match(r'[@$]{1,2}"', source[i:i + 3])):
+            i = _skip_string(source, i)
+            continue
+        if c == "'" and i + 2 < n:
+            i = _skip_char(source, i)
+            continue
+
+        if c == "{":
+            parent = stack[-1]
+            if parent["kind"] in ("root", "namespace", "type"):
+                signature = _clean_header(source[header_start:i])
+                kind, name = _classify(signature)
+            else:
+                signature, kind, name = "", "body", None
+            block = {"kind": kind, "name": name, "signature": signature,
+                     "header_start": header_start, "open": i, "close": n - 1, "children": []}
+            parent["children"].append(block)
+            stack.append(block)
+            header_start = i + 1
+        elif c == "}":
+            if len(stack) > 1:
+                stack.pop()["close"] = i
+            header_start = i + 1
+        elif c == ";":
+            if len(stack) == 1 and file_namespace is None:
+                match = _NAMESPACE_RE.match(_clean_header(source[header_start:i]))
+                if match:
+                    file_namespace = match.group(1)
+            header_start = i + 1
+        i += 1
+
+    return root["children"], file_namespace
+
+
+class _Lines:
+    def __init__(self, source):
+        self.source = source
+        self.lines = source.split("\n")
+        self.starts = [0]
+        for line in self.lines[:-1]:
+            self.starts.append(self.starts[-1] + len(line) + 1)
+
+    def line_of(self, offset):
+        """1-based line number of a character offset."""
+        return bisect_right(self.starts, offset)
+
+    def first_code_line(self, start, end):
+        """Line of the first non-whitespace character in [start, end]."""
+        while start < end and self.source[start].isspace():
+            start += 1
+        return self.line_of(start)
+
+    def text(self, start_line, end_line):
+        return "\n".join(self.lines[start_line - 1:end_line])
+
+
+def _windows(start_line, end_line, max_lines, overlap):
+    """Split [start_line, end_line] into windows of max_lines sharing overlap lines."""
+    if end_line - start_line + 1 <= max_lines:
+        return [(start_line, end_line)]
+    step = max(1, max_lines - overlap)
+    windows = []
+    line = start_line
+    while line <= end_line:
+        windows.append((line, min(end_line, line + max_lines - 1)))
+        if line + max_lines - 1 >= end_line:
+            break
+        line += step
+    return windows
+
+
+def _make_chunks(lines, symbol_path, signature, start_line, end_line, max_lines, overlap, keep=None):
+    chunks = []
+    for part, (first, last) in enumerate(_windows(start_line, end_line, max_lines, overlap)):
+        if keep is None:
+            body = lines.text(first, last)
+        else:
+            kept = [lines.lines[ln - 1] for ln in range(first, last + 1) if ln in keep]
+            # Collapse the blank runs left behind where member bodies were cut out
+            body = "\n".join(line for i, line in enumerate(kept) if line.strip() or (i and kept[i - 1].strip()))
+        if not body.strip():
+            continue
+        header = f"// {symbol_path}"
+        if part > 0 and signature:
+            header += f"\n// (continued) {signature}"
+        chunks.append({
+            "symbol_path": symbol_path,
+            "signature": signature,
+            "start_line": first,
+            "end_line": last,
+            "code": f"{header}\n{body}",
+        })
+    return chunks
+
+
+def chunk_cs_source(source, max_lines=MAX_CHUNK_LINES, overlap=OVERLAP_LINES):
+    """
+    Split C# source into namespace/class/method-level chunks.
+
+    Every method, constructor and property body becomes its own chunk (with
+    `overlap` lines of leading context such as attributes and doc comments);
+    fields and the type signature form a separate chunk per type. Anything
+    longer than max_lines is windowed with overlap and repeats its signature.
+
+    Returns a list of dicts: symbol_path, signature, start_line, end_line
+    (1-based, inclusive) and code.
+    """
+    source = source.replace("\r\n", "\n").replace("\ufeff", "")
+    lines = _Lines(source)
+    total_lines = len(lines.lines)
+    blocks, file_namespace = _scan_blocks(source)
+    chunks = []
+    covered = set()
+
+    def block_range(block, with_overlap):
+        start = lines.first_code_line(block["header_start"], block["open"])
+        if with_overlap:
+            start = max(1, start - overlap)
+        return start, lines.line_of(block["close"])
+
+    def visit(block_list, prefix):
+        for block in block_list:
+            if block["kind"] == "namespace":
+                visit(block["children"], f"{prefix}{block['name']}.")
+            elif block["kind"] == "type":
+                type_path = f"{prefix}{block['name']}"
+                start, end = block_range(block, with_overlap=False)
+                member_lines = set()
+                for child in block["children"]:
+                    if child["kind"] == "member":
+                        m_start, m_end = block_range(child, with_overlap=True)
+                        chunks.extend(_make_chunks(lines, f"{type_path}.{child['name']}", child["signature"],
+                                                   m_start, m_end, max_lines, overlap))
+                        member_lines.update(range(block_range(child, with_overlap=False)[0], m_end + 1))
+                    elif child["kind"] in ("type", "namespace"):
+                        c_start, c_end = block_range(child, with_overlap=False)
+                        member_lines.update(range(c_start, c_end + 1))
+                visit([c for c in block["children"] if c["kind"] in ("type", "namespace")], f"{type_path}.")
+                # Type signature, fields and expression-bodied members
+                keep = set(range(start, end + 1)) - member_lines
+                chunks.extend(_make_chunks(lines, type_path, block["signature"], start, end, max_lines, overlap, keep=keep))
+                covered.update(range(start, end + 1))
+            elif block["kind"] == "member":
+                # Member outside any type (e.g. local function in top-level statements)
+                start, end = block_range(block, with_overlap=True)
+                chunks.extend(_make_chunks(lines, f"{prefix}{block['name']}", block["signature"], start, end, max_lines, overlap))
+                covered.update(range(start, end + 1))
+
+    namespace_prefix = f"{file_namespace}." if file_namespace else ""
+    visit(blocks, namespace_prefix)
+
+    # Top-level statements and anything the scanner could not attribute to a type
+    leftover = {
+        ln for ln in range(1, total_lines + 1)
+        if ln not in covered and not _is_boilerplate(lines.lines[ln - 1])
+    }
+    if leftover:
+        symbol = file_namespace or "(top-level)"
+        chunks.extend(_make_chunks(lines, symbol, "", min(leftover), max(leftover), max_lines, overlap, keep=leftover))
+
+    chunks.sort(key=lambda chunk: (chunk["start_line"], chunk["end_line"]))
+    return chunks
+
+
+def _is_boilerplate(line):
+    stripped = line.strip()
+    return (not stripped or stripped in ("{", "}", "};")
+            or stripped.startswith(("using ", "namespace ", "#region", "#endregion", "//")))
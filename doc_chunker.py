@@ -0,0 +1,140 @@
+import re
+
+MAX_CHUNK_CHARS = 1500  # ~375 tokens: with the section prefix still inside e5-small-v2's 512 token window
+MIN_CHUNK_CHARS = 300  # a heading only closes the current chunk once it holds this much
+OVERLAP_CHARS = 200
+
+_MARKDOWN_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_NUMBERED_HEADING_RE = re.compile(r"^(\d+(?:\.\d+){0,4})\.?\s+([A-Za-z][^.!?]{0,60})$")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _heading(line):
+    """(level, title) when a line looks like a heading: markdown, "2.1 Title" numbering or a short ALL CAPS line."""
+    line = line.strip()
+    match = _MARKDOWN_HEADING_RE.match(line)
+    if match:
+        return len(match.group(1)), match.group(2)
+    match = _NUMBERED_HEADING_RE.match(line)
+    if match:
+        return match.group(1).count(".") + 1, line
+    letters = [c for c in line if c.isalpha()]
+    if 3 <= len(letters) and len(line) <= 60 and line.upper() == line and not line.endswith((".", ",", ";")):
+        return 1, line
+    return None
+
+
+def _blocks(text):
+    """Paragraphs and headings as (kind, start_line, end_line, text), 1-based inclusive lines."""
+    blocks, paragraph, start = [], [], None
+    for number, line in enumerate(text.split("\n"), start=1):
+        heading = _heading(line) if line.strip() else None
+        if not line.strip() or heading:
+            if paragraph:
+                blocks.append(("paragraph", start, number - 1, "\n".join(paragraph)))
+                paragraph = []
+            if heading:
+                blocks.append(("heading", number, number, heading))
+            continue
+        if not paragraph:
+            start = number
+        paragraph.append(line.rstrip())
+    if paragraph:
+        blocks.append(("paragraph", start, start + len(paragraph) - 1, "\n".join(paragraph)))
+    return blocks
+
+
+def _split_long(text, max_chars):
+    """Cut an overlong paragraph at sentence (or, failing that, word) boundaries."""
+    pieces, current = [], ""
+    for sentence in _SENTENCE_END_RE.split(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _tail(text, overlap):
+    """The last ~overlap characters of text, starting at a word boundary."""
+    if len(text) <= overlap:
+        return text
+    cut = text.find(" ", len(text) - overlap)
+    return text[cut + 1:] if cut != -1 else text[-overlap:]
+
+
+def chunk_document(text, max_chars=MAX_CHUNK_CHARS, overlap=OVERLAP_CHARS):
+    """
+    Split extracted document text (PDF/DOCX via textract) into section-aware chunks.
+
+    Paragraphs are packed into chunks of up to max_chars. A heading starts a
+    new chunk (once the current one holds MIN_CHUNK_CHARS) and a chunk closed
+    for size hands its last ~overlap characters to the next one. Chunks that
+    do not start at their own heading are prefixed with the section path so
+    they still embed in context.
+
+    Returns a list of dicts: section, start_line, end_line (1-based, inclusive)
+    and text.
+    """
+    text = text.replace("\r\n", "\n").replace("\ufeff", "")
+    chunks = []
+    path = []  # [(level, title)] of the enclosing headings
+    parts, start, end, size = [], None, None, 0
+    section = ""
+    has_body = False  # whether the open chunk holds more than headings
+
+    def close(carry=None):
+        nonlocal parts, start, end, size, has_body
+        if parts:
+            body = "\n\n".join(parts)
+            chunks.append({"section": section, "start_line": start, "end_line": end, "text": body})
+        parts, size = ([carry[2]], len(carry[2])) if carry else ([], 0)
+        has_body = bool(carry)
+        start = carry[0] if carry else None
+        end = carry[1] if carry else None
+
+    for kind, first, last, content in _blocks(text):
+        if kind == "heading":
+            level, title = content
+            if size >= MIN_CHUNK_CHARS:
+                close()
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, title))
+            if not has_body:
+                section = " > ".join(t for _, t in path)
+            parts.append(title)
+            size += len(title)
+            start = start or first
+            end = last
+            continue
+
+        for piece in _split_long(content, max_chars) if len(content) > max_chars else [content]:
+            if size >= MIN_CHUNK_CHARS and size + len(piece) > max_chars:
+                carry = _tail(parts[-1], overlap)
+                close((end, end, carry) if carry != parts[-1] or len(parts) > 1 else None)
+            if not parts:
+                section = " > ".join(t for _, t in path)
+            parts.append(piece)
+            size += len(piece)
+            has_body = True
+            start = start or first
+            end = last
+    close()
+
+    for chunk in chunks:
+        # Chunks opening with their own heading already carry it
+        if chunk["section"] and chunk["section"].split(" > ")[-1] not in chunk["text"][:MIN_CHUNK_CHARS]:
+            chunk["text"] = f"[{chunk['section']}]\n{chunk['text']}"
+    return chunks or [{"section": "", "start_line": 1, "end_line": text.count("\n") + 1, "text": text}]
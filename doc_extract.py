@@ -0,0 +1,46 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# textract shells out for PDF/DOCX and parses the rest in Python; separate processes keep both off the server's GIL
+DOC_EXTRACT_WORKERS = int(os.getenv("DOC_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def extract_text(path):
+    import textract  # imported lazily: it pulls in heavy converters
+
+    return textract.process(path).decode("utf-8")
+
+
+def _get_pool():
+    """Long-lived pool, started on the first upload so workers import textract once."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=DOC_EXTRACT_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def _extract(pool, path):
+    try:
+        return path, await asyncio.get_running_loop().run_in_executor(pool, extract_text, path), None
+    except Exception as e:
+        return path, None, e
+
+
+async def extract_documents(paths):
+    """
+    Extract every file concurrently on the process pool (at most
+    DOC_EXTRACT_WORKERS at a time) and yield (path, text, error) as each
+    finishes, so the caller can report progress in completion order.
+    """
+    pool = _get_pool()
+    for finished in asyncio.as_completed([_extract(pool, path) for path in paths]):
+        yield await finished
@@ -0,0 +1,98 @@
+import os
+import re
+
+# torch: full-precision PyTorch (default)
+# onnx: exported ONNX graph run by onnxruntime
+# onnx-int8: dynamically quantized int8 ONNX graph, the fastest option on CPU-only hosts
+BACKENDS = ("torch", "onnx", "onnx-int8")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".onnx_models"))
+QUANTIZATION_CONFIG = os.getenv("EMBEDDING_QUANTIZATION", "avx2")  # arm64 | avx2 | avx512 | avx512_vnni
+
+
+_registered = {}  # name -> factory(model_name), added by register_backend
+_intra_op_threads = None  # set in embedding pool workers; None lets each runtime use every core
+
+
+def register_backend(name, factory):
+    """Make factory(model_name) loadable as EMBEDDING_BACKEND=name; benchmarks register their stand-ins here."""
+    _registered[name] = factory
+
+
+def registered_backends():
+    return dict(_registered)
+
+
+def set_intra_op_threads(threads, backend=EMBEDDING_BACKEND):
+    """
+    Cap the threads one model uses per call, so N embedding workers share the
+    cores instead of each claiming all of them: torch.set_num_threads for
+    torch, SessionOptions.intra_op_num_threads for models loaded afterwards on ONNX.
+    """
+    global _intra_op_threads
+    _intra_op_threads = threads
+    if backend == "torch":
+        import torch
+
+        torch.set_num_threads(threads)
+
+
+def _onnx_model_kwargs(**kwargs):
+    if _intra_op_threads:
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = _intra_op_threads
+        options.inter_op_num_threads = 1
+        kwargs["session_options"] = options
+    return kwargs
+
+
+def backend_identity(model_name, backend=EMBEDDING_BACKEND):
+    """Name used to key cached vectors; non-torch backends get their own namespace."""
+    return model_name if backend == "torch" else f"{model_name}:{backend}"
+
+
+def _local_dir(model_name):
+    return os.path.join(ONNX_DIR, re.sub(r"[^\w.-]", "_", model_name))
+
+
+def _export_onnx(model_name):
+    """Export the model to ONNX once and keep it on disk so later starts skip the export."""
+    from sentence_transformers import SentenceTransformer
+
+    local_dir = _local_dir(model_name)
+    if not os.path.exists(os.path.join(local_dir, "onnx", "model.onnx")):
+        print(f"📦 Exporting {model_name} to ONNX in {local_dir}...")
+        SentenceTransformer(model_name, backend="onnx").save_pretrained(local_dir)
+    return local_dir
+
+
+def load_model(model_name, backend=EMBEDDING_BACKEND):
+    """Load model_name with the selected backend; every backend exposes the same encode()."""
+    if backend in _registered:
+        return _registered[backend](model_name)
+    if backend not in BACKENDS:
+        raise ValueError(f"❌ Unknown EMBEDDING_BACKEND '{backend}'. Choose one of: {', '.join(BACKENDS + tuple(_registered))}")
+
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+
+    try:
+        local_dir = _export_onnx(model_name)
+        if backend == "onnx":
+            return SentenceTransformer(local_dir, backend="onnx", model_kwargs=_onnx_model_kwargs())
+
+        quantized_file = f"model_qint8_{QUANTIZATION_CONFIG}.onnx"
+        if not os.path.exists(os.path.join(local_dir, "onnx", quantized_file)):
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+
+            print(f"📦 Quantizing {model_name} to int8 ({QUANTIZATION_CONFIG})...")
+            export_dynamic_quantized_onnx_model(SentenceTransformer(local_dir, backend="onnx"), QUANTIZATION_CONFIG, local_dir)
+        return SentenceTransformer(local_dir, backend="onnx", model_kwargs=_onnx_model_kwargs(file_name=f"onnx/{quantized_file}"))
+    except ImportError as e:
+        raise ImportError(
+            f"❌ EMBEDDING_BACKEND={backend} needs ONNX Runtime: pip install \"sentence-transformers[onnx]\" ({e})"
+        ) from e
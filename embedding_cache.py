@@ -0,0 +1,169 @@
+import atexit
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from filelock import FileLock
+
+from utils import compute_hash
+
+CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_cache"))
+CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "1") != "0"
+FLUSH_EVERY = 256  # Persist the LRU order after this many new entries
+KEY_BYTES = 32  # sha256 digest; an all-zero row marks an empty slot
+
+
+def cache_key(model_name, formatted_text):
+    """Content address of an embedding: hash of model name + the normalized "passage: ..." text."""
+    return compute_hash(f"{model_name}\n{formatted_text}")
+
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed embedding cache, shared by every process that opens cache_dir.
+
+    Vectors live in a fixed-size memory-mapped float32 matrix (one row per slot) and
+    keys.bin records the key held by each slot; a small JSON index only keeps LRU
+    order. When the cache is full the least recently used slot is reused.
+
+    Slots are allocated and written under a file lock, and a slot's key is cleared
+    before its vector is overwritten. Reads check the slot's key before and after
+    copying the vector, so a slot taken over by another process, or a write cut
+    short by a crash, is a miss rather than another text's vector.
+    """
+
+    def __init__(self, cache_dir, dim, max_entries=CACHE_MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.dim = dim
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self._keys_path = os.path.join(cache_dir, "keys.bin")
+        self._file_lock = FileLock(os.path.join(cache_dir, "cache.lock"))
+        self._slots = OrderedDict()  # key -> slot, oldest first
+        self._free = []
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._file_lock:
+            self._load()
+
+    def _load(self):
+        meta = None
+        if all(os.path.exists(path) for path in (self._index_path, self._vectors_path, self._keys_path)):
+            try:
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                meta = None
+
+        if meta and meta.get("dim") == self.dim and meta.get("max_entries") == self.max_entries:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(self.max_entries, self.dim))
+            self._keys = np.memmap(self._keys_path, dtype=np.uint8, mode="r+", shape=(self.max_entries, KEY_BYTES))
+        else:
+            # Missing, corrupt or created with a different model/size: start fresh
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="w+", shape=(self.max_entries, self.dim))
+            self._keys = np.memmap(self._keys_path, dtype=np.uint8, mode="w+", shape=(self.max_entries, KEY_BYTES))
+            meta = {}
+            self._write_index()
+
+        # keys.bin is the source of truth for key -> slot; the index only restores LRU order
+        held = {bytes(self._keys[slot]).hex(): int(slot) for slot in np.flatnonzero(self._keys.any(axis=1))}
+        recent = [key for key in meta.get("order", []) if key in held]
+        recent_set = set(recent)
+        self._slots = OrderedDict((key, held[key]) for key in held if key not in recent_set)
+        self._slots.update((key, held[key]) for key in recent)
+        used = set(held.values())
+        self._free = [slot for slot in range(self.max_entries - 1, -1, -1) if slot not in used]
+
+    def get(self, key):
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is not None:
+                digest = bytes.fromhex(key)
+                # Another process may have reused the slot since we mapped it, or be rewriting it now
+                if bytes(self._keys[slot]) == digest:
+                    vector = np.array(self._vectors[slot], dtype=np.float32)
+                    if bytes(self._keys[slot]) == digest:
+                        self._slots.move_to_end(key)
+                        self.hits += 1
+                        return vector
+                del self._slots[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, vector):
+        digest = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+        with self._lock, self._file_lock:
+            slot = self._slots.get(key)
+            if slot is not None and bytes(self._keys[slot]) != digest.tobytes():
+                del self._slots[key]
+                slot = None
+            if slot is None:
+                slot = self._allocate_locked()
+            # Clear the key first so a crash mid-write leaves an empty slot, not a wrong vector
+            self._keys[slot] = 0
+            self._vectors[slot] = vector
+            self._keys[slot] = digest
+            self._slots[key] = slot
+            self._slots.move_to_end(key)
+            self._dirty += 1
+            if self._dirty >= FLUSH_EVERY:
+                self._flush_locked()
+
+    def _allocate_locked(self):
+        while self._free:
+            slot = self._free.pop()
+            if not self._keys[slot].any():
+                return slot
+            # Filled by another process: keep its entry instead of overwriting it
+            other = bytes(self._keys[slot]).hex()
+            self._slots[other] = slot
+            self._slots.move_to_end(other, last=False)
+        _, slot = self._slots.popitem(last=False)
+        self.evictions += 1
+        return slot
+
+    def flush(self):
+        with self._lock, self._file_lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._vectors.flush()
+        self._keys.flush()
+        self._write_index()
+        self._dirty = 0
+
+    def _write_index(self):
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "max_entries": self.max_entries, "order": list(self._slots)}, f)
+        os.replace(tmp_path, self._index_path)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._slots),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def open_cache(model_name, dim):
+    """Return the process-wide cache for model_name, or None when disabled via EMBEDDING_CACHE=0."""
+    if not CACHE_ENABLED:
+        return None
+    cache_dir = os.path.join(CACHE_DIR, compute_hash(model_name)[:16])
+    cache = EmbeddingCache(cache_dir, dim)
+    atexit.register(cache.flush)
+    return cache
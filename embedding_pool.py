@@ -0,0 +1,80 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from embedding_backends import register_backend, registered_backends, set_intra_op_threads
+from ollama_config import DEFAULT_BATCH_SIZE, _prepare_text, get_embedding_cache, get_embeddings, lookup_cached
+
+# Below this many texts the pool start-up (one model load per worker) costs more than it saves
+MIN_TEXTS_PER_WORKER = 16
+
+
+def _init_worker(threads, backends):
+    # Spawned workers start clean: re-register backends the parent added at runtime
+    for name, factory in backends.items():
+        register_backend(name, factory)
+    # Pin intra-op threads so N workers don't oversubscribe the cores; torch is only imported for the torch backend
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    set_intra_op_threads(threads)
+    # Workers don't touch the shared on-disk cache; the parent fills it after merging
+    os.environ["EMBEDDING_CACHE"] = "0"
+    import embedding_cache
+
+    embedding_cache.CACHE_ENABLED = False
+
+
+def _embed_shard(shard_index, texts, batch_size):
+    started = time.perf_counter()
+    vectors = get_embeddings(texts, batch_size=batch_size)
+    return shard_index, os.getpid(), vectors, time.perf_counter() - started
+
+
+def embed_parallel(texts, workers, batch_size=DEFAULT_BATCH_SIZE, threads_per_worker=None):
+    """
+    Embed texts across `workers` processes, each holding its own model copy.
+
+    Texts are sharded into contiguous slices and merged back in input order,
+    so row i of the result is always the embedding of texts[i]. Falls back to
+    get_embeddings in-process for a single worker or a small input. Prints
+    per-worker throughput.
+    """
+    texts = list(texts)
+    workers = max(1, min(workers, len(texts) // MIN_TEXTS_PER_WORKER or 1))
+    if workers == 1:
+        return get_embeddings(texts, batch_size=batch_size)
+
+    # Serve cache hits here; only misses are shipped to the workers
+    result, keys, missing = lookup_cached([_prepare_text(text) for text in texts])
+    if len(missing) < workers * MIN_TEXTS_PER_WORKER:
+        if missing:
+            result[missing] = get_embeddings([texts[i] for i in missing], batch_size=batch_size)
+        return result
+    cache = get_embedding_cache()
+
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    shards = np.array_split(np.array(missing), workers)
+    print(f"🧵 Embedding {len(missing)} text(s) on {workers} worker(s) x {threads} thread(s)...")
+
+    started = time.perf_counter()
+    context = multiprocessing.get_context("spawn")  # torch is not fork-safe
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(threads, registered_backends())) as pool:
+        futures = [pool.submit(_embed_shard, n, [texts[i] for i in shard], batch_size)
+                   for n, shard in enumerate(shards) if len(shard)]
+        for future in futures:
+            shard_index, pid, vectors, seconds = future.result()
+            shard = shards[shard_index]
+            result[shard] = vectors
+            print(f"  • worker {shard_index} (pid {pid}): {len(shard)} text(s) in {seconds:.2f}s "
+                  f"= {len(shard) / seconds:.1f} texts/s")
+            if cache is not None:
+                for i, vector in zip(shard, vectors):
+                    cache.put(keys[i], vector)
+
+    total = time.perf_counter() - started
+    print(f"⚡ Pool total: {len(missing)} text(s) in {total:.2f}s = {len(missing) / total:.1f} texts/s")
+    return result
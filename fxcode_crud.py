@@ -1,77 +1,123 @@
 # fxcode_crud.py
 
+import startup  # first, so startup timings cover the imports below
 import argparse
-from weaviate_config import get_weaviate_client, store_framework_embedding
-from weaviate_agent import parse_csproj_and_extract_code
+from weaviate_config import get_vector_store, store_framework_embeddings, fetch_by_file_names, delete_by_file_names
+from weaviate_agent import parse_csproj_and_extract_code, get_all_cs_files_from_csproj
+from ingest_manifest import load_manifest, save_manifest, diff_project
 from utils import compute_hash
-from ollama_config import get_embedding
-from weaviate.classes.query import Filter
+from ollama_config import get_model, get_embedding_cache
 
 USE_MANUAL_EMBEDDING = True  # Keep this aligned with weaviate_config
 
-def create_or_update_framework_embeddings(client, snippets):
+def create_or_update_framework_embeddings(client, snippets, workers=1):
     """
     Given a dict of {filename: code}, embed and store them into FXCodeEmbedding.
+    All new/changed files are embedded in one batched call, sharded over `workers` processes.
     """
-    result_summary = {}
-    for fname, code in snippets.items():
-        try:
-            result = store_framework_embedding(client, fname, code)
-            result_summary[fname] = result
-        except Exception as e:
-            print(f"❌ Error embedding {fname}: {str(e)}")
-            result_summary[fname] = "error"
-    return result_summary
+    return store_framework_embeddings(client, snippets, "FXCodeEmbedding", workers=workers)
+
+def sync_framework_embeddings(client, csproj_path, workers=1):
+    """
+    Incrementally ingest every Compile item of a project using the local manifest.
+
+    Unchanged files (same mtime/size, or same hash) are never embedded or
+    queried; files that left the project are deleted from FXCodeEmbedding.
+    """
+    cs_files = get_all_cs_files_from_csproj(csproj_path)
+    manifest = load_manifest(csproj_path)
+    changed, current, removed = diff_project(csproj_path, cs_files, manifest)
+    print(f"🔎 {len(cs_files)} file(s) in project: {len(changed)} new/changed, "
+          f"{len(current) - len(changed)} unchanged, {len(removed)} removed")
+
+    live_names = {entry["file_name"] for entry in current.values()}
+    removed_names = sorted({entry["file_name"] for entry in removed} - live_names)
+    if removed_names:
+        deleted = delete_by_file_names(client, "FXCodeEmbedding", removed_names)
+        print(f"🗑️ Deleted {deleted} object(s) for {len(removed_names)} removed file(s)")
+
+    results = {}
+    if changed:
+        snippets = {current[rel_path]["file_name"]: content for rel_path, content in changed.items()}
+        results = create_or_update_framework_embeddings(client, snippets, workers=workers)
+        # Failed files keep their old manifest entry (or none) so the next sync retries them
+        for rel_path in changed:
+            if results.get(current[rel_path]["file_name"]) == "error":
+                if rel_path in manifest:
+                    current[rel_path] = manifest[rel_path]
+                else:
+                    del current[rel_path]
+
+    save_manifest(csproj_path, current)
+    return results
 
 def read_framework_embeddings(client, file_names):
     """
-    Read and print metadata for one or more embedded files.
+    Read and print metadata for one or more embedded files (one query for all of them).
     """
-    collection = client.collections.get("FXCodeEmbedding")
+    try:
+        objects = fetch_by_file_names(client, "FXCodeEmbedding", file_names, return_properties=[
+            "file_name", "code_hash", "symbol_path", "start_line", "end_line", "chunk_index"
+        ])
+    except Exception as e:
+        print(f"❌ Error reading {', '.join(file_names)}: {str(e)}")
+        return
+
+    by_file = {}
+    for obj in objects:
+        by_file.setdefault(obj.properties.get("file_name"), []).append(obj)
+
     for fname in file_names:
-        try:
-            result = collection.query.fetch_objects(
-                filters=Filter.by_property("file_name").equal(fname)
-            )
-            if result.objects:
-                print(f"\n📄 {fname}:")
-                print(result.objects[0].properties)
-            else:
-                print(f"\n❌ No embedding found for: {fname}")
-        except Exception as e:
-            print(f"❌ Error reading {fname}: {str(e)}")
+        if fname in by_file:
+            chunks = sorted(by_file[fname], key=lambda o: o.properties.get("chunk_index") or 0)
+            props = chunks[0].properties
+            print(f"\n📄 {fname}: {len(chunks)} chunk(s), code_hash={props.get('code_hash')}")
+            for obj in chunks:
+                p = obj.properties
+                print(f"  • {p.get('symbol_path') or '(file)'} [lines {p.get('start_line')}-{p.get('end_line')}]")
+        else:
+            print(f"\n❌ No embedding found for: {fname}")
 
 def delete_framework_embeddings(client, file_names):
     """
-    Delete one or more embeddings based on file names.
+    Delete one or more embeddings based on file names (one request for all of them).
     """
-    collection = client.collections.get("FXCodeEmbedding")
-    for fname in file_names:
-        try:
-            deleted = collection.data.delete_many(where=Filter.by_property("file_name").equal(fname))
-            if deleted.matches == 0:
-                print(f"⚠️ No match found for: {fname}")
-            else:
-                print(f"🗑️ Deleted: {fname}")
-
-        except Exception as e:
-            print(f"❌ Error deleting {fname}: {str(e)}")
+    try:
+        deleted = delete_by_file_names(client, "FXCodeEmbedding", file_names)
+        if deleted == 0:
+            print(f"⚠️ No match found for: {', '.join(file_names)}")
+        else:
+            print(f"🗑️ Deleted {deleted} object(s) for: {', '.join(file_names)}")
+    except Exception as e:
+        print(f"❌ Error deleting {', '.join(file_names)}: {str(e)}")
 
 def main():
     parser = argparse.ArgumentParser(description="CRUD for FXCodeEmbedding collection in Weaviate")
-    parser.add_argument("operation", choices=["create", "read", "delete"], help="CRUD operation to perform")
-    parser.add_argument("--csproj", help="Path to the .csproj file (required for create)")
-    parser.add_argument("--files", required=True, help="Comma-separated list of .cs file names (e.g., A.cs,B.cs)")
+    parser.add_argument("operation", choices=["create", "read", "delete", "sync"], help="CRUD operation to perform (sync = incremental ingest of the whole project)")
+    parser.add_argument("--csproj", help="Path to the .csproj file (required for create and sync)")
+    parser.add_argument("--files", help="Comma-separated list of .cs file names (e.g., A.cs,B.cs); required except for sync")
+    parser.add_argument("--workers", type=int, default=1, help="Embedding worker processes for create (each loads its own model copy)")
 
     args = parser.parse_args()
-    file_list = [f.strip() for f in args.files.split(",")]
+    if args.operation != "sync" and not args.files:
+        parser.error("--files is required for create, read and delete")
+    if args.operation == "sync" and not args.csproj:
+        parser.error("--csproj is required for sync")
+    file_list = [f.strip() for f in args.files.split(",")] if args.files else []
+    startup.mark("imports")
+
+    if args.operation in ("create", "sync") and args.workers <= 1:
+        # Load the embedding model while we connect to Weaviate and parse the project
+        startup.warm_up("model", get_model)
 
     try:
-        client = get_weaviate_client()
+        client = get_vector_store()
+        startup.mark("vector store")
     except Exception as e:
-        print(f"❌ Failed to connect to Weaviate: {str(e)}")
+        print(f"❌ Failed to open the vector store: {str(e)}")
         return
-    
+    startup.report()
+
     try:
         if args.operation == "create":
             if not args.csproj:
@@ -86,11 +132,22 @@ def main():
                 return
 
             print(f"📦 Embedding {len(snippets)} file(s)...")
-            results = create_or_update_framework_embeddings(client, snippets)
+            results = create_or_update_framework_embeddings(client, snippets, workers=args.workers)
 
             print("\n📊 Embedding Summary:")
             for fname, status in results.items():
                 print(f"• {fname}: {status}")
+            embedding_cache = get_embedding_cache()
+            if embedding_cache is not None:
+                print(f"🧠 Embedding cache: {embedding_cache.stats()}")
+
+        elif args.operation == "sync":
+            print(f"📁 Syncing project: {args.csproj}")
+            results = sync_framework_embeddings(client, args.csproj, workers=args.workers)
+            if results:
+                print("\n📊 Embedding Summary:")
+                for fname, status in results.items():
+                    print(f"• {fname}: {status}")
 
         elif args.operation == "read":
             read_framework_embeddings(client, file_list)
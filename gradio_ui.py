@@ -1,20 +1,31 @@
+import startup  # first, so startup timings cover the imports below
 import gradio as gr
-import json
 import os
 import atexit
 import warnings
 import asyncio
 import re
-import textract
+import threading
 import requests
-from weaviate.classes.query import Filter
 
 
 from weaviate_config import (
-    get_weaviate_client, store_framework_embedding, store_user_embedding,
-    retrieve_framework_context, generate_code_suggestion,retrieve_Fun_framework_context,generate_FN_code_Testcase_suggestion,SuggestFxCode_Based_on_user_input
+    get_vector_store, store_framework_embeddings, store_document_embeddings, store_user_embedding_with_vector, user_code_writes,
+    retrieve_framework_context, generate_code_suggestion,retrieve_Fun_framework_context,generate_FN_code_Testcase_suggestion,SuggestFxCode_Based_on_user_input,
+    fetch_document_chunks, document_vector, document_text
 )
 from weaviate_agent import parse_csproj_and_extract_code
+from ollama_config import get_embedding, get_model
+from local_index import start_periodic_sync
+from keyword_index import sync_keyword_indexes
+from response_cache import print_usage_report
+from chat_history import get_history_store
+from doc_extract import extract_documents
+from tracing import start_metrics_server
+from serving import (
+    DEFAULT_CONCURRENCY, INGEST_CONCURRENCY, LLM_CONCURRENCY, QUEUE_MAX_SIZE,
+    blocking_executor, embedding_executor, metrics, tracked
+)
 
 # ========== Environment Setup ==========
 try:
@@ -24,26 +35,43 @@ except RuntimeError:
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
-client = get_weaviate_client()
-atexit.register(lambda: client.close())
+_client = None
+_client_lock = threading.Lock()
+
+def _close_client():
+    # Queued UserCodeEmbeddings writes must land before the connection goes away
+    user_code_writes.flush()
+    _client.close()
+    print_usage_report()
+
+def get_client():
+    """Open the vector store on first use (or from the startup warm-up) instead of at import."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = get_vector_store()
+                atexit.register(_close_client)
+    return _client
+
+async def aget_client():
+    """get_client() for async handlers: the first connect runs off the event loop."""
+    return _client if _client is not None else await blocking_executor.run(get_client)
 
 # ========== History Utils ==========
-HISTORY_FILE = "chat_history.json"
+WELCOME_MESSAGE = {"role": "assistant", "content": "👋 Welcome! What would you like to do?"}
 
-def load_history():
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)        
-    return [{"role": "assistant", "content": "👋 Welcome! What would you like to do?"}]
+def load_history(email):
+    """The logged-in user's saved conversation (see chat_history.ChatHistoryStore)."""
+    return get_history_store().load(email) or [dict(WELCOME_MESSAGE)]
 
-def save_history(history):
-    with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(history, f)
+def save_history(state, history):
+    # Queues only the messages added since the last save; written off the request path
+    get_history_store().save(state.get("email") if state else None, history)
 
 def clear_chat(preserve_docs=False, state=None):
-    if os.path.exists(HISTORY_FILE):
-        os.remove(HISTORY_FILE)
     email = state.get("email") if state else None
+    get_history_store().clear(email)
     # Keep uploaded function docs if preserve_docs=True
     if preserve_docs and state:
         func_doc_text = state["inputs"].get("func_doc_text", None)
@@ -71,7 +99,27 @@ def clear_chat(preserve_docs=False, state=None):
 #     gr.update(value=None,visible=False)  # 👈 this clears the uploaded function document(s)
 # )
 # ========== Chat Logic ==========
-def chat_interaction(user_input, history, state):
+async def _suggestion(generate, *args):
+    """
+    Run a generate_* function on the blocking pool with stream="async": the
+    prompt building (context packing, token counts, cache key) is CPU work
+    that would otherwise stall the event loop. Returns the reply stream.
+    """
+    return await blocking_executor.run(generate, *args, stream="async")
+
+async def _stream_reply(chat_history, stream, state):
+    """
+    Append an assistant message and grow it as tokens arrive from the async
+    stream, yielding the handler outputs after each chunk (input disabled,
+    radios untouched). The final text is left in chat_history[-1].
+    """
+    chat_history.append({"role": "assistant", "content": ""})
+    async for result, usage in stream:
+        chat_history[-1] = {"role": "assistant", "content": result}
+        yield gr.update(interactive=False), gr.update(interactive=False), chat_history, state, gr.update(), gr.update()
+
+@tracked("chat")
+async def chat_interaction(user_input, history, state):
     text_Space = False
     show_option_radio = False
     show_task_radio = False
@@ -88,7 +136,8 @@ def chat_interaction(user_input, history, state):
         if user_input == None or (user_input.lower() != "Framework Embedding" and user_input.lower() !="Optimize Code") : 
             chat_history.append({"role": "user", "content": user_input})
             chat_history.append({"role": "assistant", "content": "Hi! Please select any of the options below."})
-        return gr.update(interactive = text_Space,value = None),gr.update(interactive = text_Space), chat_history, state, gr.update(visible=False), gr.update(visible=True)
+        yield gr.update(interactive = text_Space,value = None),gr.update(interactive = text_Space), chat_history, state, gr.update(visible=False), gr.update(visible=True)
+        return
 
     if task == "embedding":
         if step == 1:
@@ -97,7 +146,8 @@ def chat_interaction(user_input, history, state):
             if not match:                
                 chat_history.append({"role": "user", "content": user_input})
                 chat_history.append({"role": "assistant", "content": "⚠️ Invalid path. Please enter the full path to your `.csproj` file."})                
-                return gr.update(interactive = True,value = ""),gr.update(interactive = True), chat_history, state, gr.update(visible=False), gr.update(visible=False)            
+                yield gr.update(interactive = True,value = ""),gr.update(interactive = True), chat_history, state, gr.update(visible=False), gr.update(visible=False)            
+                return
             csproj_path = match.group()
             state["inputs"]["csproj"] = csproj_path
             state["step"] = 2
@@ -112,14 +162,15 @@ def chat_interaction(user_input, history, state):
             try:
                 csproj_path = state["inputs"]["csproj"]
                 file_names = [f.strip() for f in user_input.split(",")]
-                snippets = parse_csproj_and_extract_code(csproj_path, file_names)                
+                snippets = await blocking_executor.run(parse_csproj_and_extract_code, csproj_path, file_names)                
                 if not snippets:
                     chat_history.append({"role": "assistant", "content": "⚠️ No valid C# files found. Enter the Correct File Name."})                     
-                    return gr.update(interactive = text_Space,value = None),gr.update(interactive = text_Space), chat_history, state, gr.update(visible=False), gr.update(visible=False)
+                    yield gr.update(interactive = text_Space,value = None),gr.update(interactive = text_Space), chat_history, state, gr.update(visible=False), gr.update(visible=False)
+                    return
                 else:
-                    for fname, code in snippets.items():
-                        result_state = store_framework_embedding(client, fname, code, "FXCodeEmbedding")
-                        if result_state == "changed":
+                    results = await embedding_executor.run(store_framework_embeddings, await aget_client(), snippets, "FXCodeEmbedding")
+                    for fname, result_state in results.items():
+                        if result_state in ("new", "changed"):
                             chat_history.append({"role": "assistant", "content": f"✅ Stored: {fname}"})
                         elif result_state == "unchanged":
                             chat_history.append({"role": "assistant", "content": f"The File {fname} is already stored."})                        
@@ -161,15 +212,14 @@ def chat_interaction(user_input, history, state):
             chat_history.append({"role": "user", "content": user_input})
             try:
                 code = state["inputs"]["code"]
-                Usercode_id = state["inputs"]["code_id"]
-                userCode_obj = client.collections.get("UserCodeEmbeddings").query.fetch_object_by_id(Usercode_id, include_vector=True)
-                if not hasattr(userCode_obj, 'vector') or userCode_obj.vector is None:
-                    raise ValueError("❌ Vector not generated for user code")
-                user_vector = userCode_obj.vector['default']
-                FXcontext = retrieve_framework_context(client, user_vector,user_input)
+                # Vector computed when the option was picked; no read-back from Weaviate
+                user_vector = state["inputs"].get("code_vector")
+                if user_vector is None:
+                    _, user_vector = await embedding_executor.run(store_user_embedding_with_vector, await aget_client(), code)
+                FXcontext = await blocking_executor.run(retrieve_framework_context, await aget_client(), user_vector, user_input)
                 prompt = f"Optimize the following code with the given user input: {user_input}"
-                result, usage = generate_code_suggestion(code, prompt, FXcontext, state)
-                chat_history.append({"role": "assistant", "content": result})
+                async for update in _stream_reply(chat_history, await _suggestion(generate_code_suggestion, code, prompt, FXcontext, state), state):
+                    yield update
                 show_task_radio = True
                 show_option_radio = False                
             except Exception as e:
@@ -179,12 +229,10 @@ def chat_interaction(user_input, history, state):
         if step == 1:
             chat_history.append({"role": "user", "content": user_input})
             try:
-                code_id = store_user_embedding(client, user_input)
-                user_obj = client.collections.get("UserCodeEmbeddings").query.fetch_object_by_id(code_id, include_vector=True)
-                user_vector = user_obj.vector['default']
-                context = retrieve_framework_context(client, user_vector,user_input)
-                result, usage = SuggestFxCode_Based_on_user_input(user_input, context)
-                chat_history.append({"role": "assistant", "content": result})
+                code_id, user_vector = await embedding_executor.run(store_user_embedding_with_vector, await aget_client(), user_input)
+                context = await blocking_executor.run(retrieve_framework_context, await aget_client(), user_vector, user_input)
+                async for update in _stream_reply(chat_history, await _suggestion(SuggestFxCode_Based_on_user_input, user_input, context), state):
+                    yield update
                 show_task_radio = True
                 show_option_radio = False                
             except Exception as e:
@@ -200,16 +248,17 @@ def chat_interaction(user_input, history, state):
             code_id = state["inputs"].get("func_doc_code_id")
             chat_history.append({"role": "user", "content": prompt})
 
-            user_obj = client.collections.get("FunctionDocsEmbedding").query.fetch_object_by_id(code_id, include_vector=True)
-
-            if not hasattr(user_obj, 'vector') or user_obj.vector is None:
-                raise ValueError("❌ Vector not generated for user code")
+            client = await aget_client()
+            chunks = await blocking_executor.run(fetch_document_chunks, client, "FunctionDocsEmbedding", code_id, state.get("email"))
+            user_vector = await blocking_executor.run(document_vector, chunks)
+            context = await blocking_executor.run(retrieve_Fun_framework_context, client, user_vector, user_prompt=prompt)
+            # Only the sections this request is about go into the prompt
+            prompt_vector = await embedding_executor.run(get_embedding, prompt)
+            func_doc_text = await blocking_executor.run(document_text, func_doc_text, chunks, prompt_vector)
 
-            user_vector = user_obj.vector['default']
-            context = retrieve_Fun_framework_context(client, user_vector)
+            async for update in _stream_reply(chat_history, await _suggestion(generate_FN_code_Testcase_suggestion, func_doc_text, prompt, context, state), state):
 
-            result, _ = generate_FN_code_Testcase_suggestion(func_doc_text, prompt, context, state)
-            chat_history.append({"role": "assistant", "content": result})
+                yield update
 
         except Exception as e:
             chat_history.append({"role": "assistant", "content": f"❌ Error: {str(e)}"})
@@ -220,9 +269,9 @@ def chat_interaction(user_input, history, state):
     
     #show_task_radio = any(m["content"] == "__task_radio__" for m in chat_history)
     #show_option_radio = any(m["content"] == "__option_radio__" for m in chat_history)
-    save_history(chat_history)
+    save_history(state, chat_history)
     #return "", chat_history, state, gr.update(visible=False), gr.update(visible=show_task_radio)
-    return gr.update(interactive = text_Space,value = None),gr.update(interactive = text_Space), chat_history, state, gr.update(visible=show_option_radio,value = None), gr.update(visible=show_task_radio,value = None)
+    yield gr.update(interactive = text_Space,value = None),gr.update(interactive = text_Space), chat_history, state, gr.update(visible=show_option_radio,value = None), gr.update(visible=show_task_radio,value = None)
 def handle_task_selection(task_choice, state, history):
     text_Space = False
     chat_history = history or []
@@ -252,14 +301,16 @@ def handle_task_selection(task_choice, state, history):
         state["step"] = 1
         chat_history.append({"role": "assistant", "content": "📝 Please enter what do you need to know about the Framework."})
 
-    save_history(chat_history)
+    save_history(state, chat_history)
     return gr.update(interactive = True,value = ""),gr.update(interactive = True), chat_history, state, gr.update(visible=False), gr.update(visible=False),gr.update(visible=(state["task"] == "function_doc"))
 
-def handle_radio_selection(selected_option, state, history):
+@tracked("option")
+async def handle_radio_selection(selected_option, state, history):
     text_Space = False
     chat_history = [msg for msg in (history or []) if msg["content"] != "__option_radio__"]
     if not selected_option:
-        return gr.update(interactive = text_Space,value = None),gr.update(interactive = text_Space),chat_history, state, gr.update(visible=True), gr.update(visible=False)    
+        yield gr.update(interactive = text_Space,value = None),gr.update(interactive = text_Space),chat_history, state, gr.update(visible=True), gr.update(visible=False)    
+        return
     chat_history.append({"role": "user", "content": selected_option})
     Optimize_From = ""    
     if not state or not isinstance(state, dict):
@@ -273,33 +324,30 @@ def handle_radio_selection(selected_option, state, history):
 
     try:
         code = state["inputs"]["code"]
-        code_id = store_user_embedding(client, code)
+        code_id, user_vector = await embedding_executor.run(store_user_embedding_with_vector, await aget_client(), code)
         state["inputs"]["code_id"] = code_id
-        if not flags["optimize"]:
-            user_obj = client.collections.get("UserCodeEmbeddings").query.fetch_object_by_id(code_id, include_vector=True)
-
-            if not hasattr(user_obj, 'vector') or user_obj.vector is None:
-                raise ValueError("❌ Vector not generated for user code")
-
-            user_vector = user_obj.vector['default']
-            context = retrieve_framework_context(client, user_vector)  
+        state["inputs"]["code_vector"] = user_vector
+        context = await blocking_executor.run(retrieve_framework_context, await aget_client(), user_vector, selected_option)
         if flags["bug"]:
             bug_prompt = "Find bugs for the code based on the internal framework patterns and explain them.\n"
-            result, _ = generate_code_suggestion(code, bug_prompt, context, state)
+            async for update in _stream_reply(chat_history, await _suggestion(generate_code_suggestion, code, bug_prompt, context, state), state):
+                yield update
+            result = chat_history[-1]["content"]
             state["inputs"]["last_bug_result"] = result
-            chat_history.append({"role": "assistant", "content": result})
             chat_history.append({"role": "assistant", "content": "Want to fix it? Or optimize it?"})
             state["step"] = 2
         elif flags["optimize"]:
             if "last_bug_result" in state["inputs"] and state["inputs"]["last_bug_result"]:
                 prompt = "Optimize the code based on the following bugs and return fixes for each bug:\n" + state["inputs"]["last_bug_result"] 
-                result, _ = generate_code_suggestion(code, prompt, context, state)
-                chat_history.append({"role": "assistant", "content": result})
+                async for update in _stream_reply(chat_history, await _suggestion(generate_code_suggestion, code, prompt, context, state), state):
+                    yield update
+                result = chat_history[-1]["content"]
                 Optimize_From = "last_bug_result"
             elif "last_test_result" in state["inputs"] and state["inputs"]["last_test_result"]:
                 prompt = "Optimize the code based on the following test cases and return fixes for each test case and expalin them how its passed those test cases:\n" + state["inputs"]["last_test_result"] 
-                result, _ = generate_code_suggestion(code, prompt, context, state)
-                chat_history.append({"role": "assistant", "content": result})
+                async for update in _stream_reply(chat_history, await _suggestion(generate_code_suggestion, code, prompt, context, state), state):
+                    yield update
+                result = chat_history[-1]["content"]
                 Optimize_From = "last_test_result"
             else:
                 chat_history.append({"role": "assistant", "content": "🔍 What exactly do you want to optimize?"})
@@ -307,9 +355,10 @@ def handle_radio_selection(selected_option, state, history):
                 Optimize_From = "User_Prompt"
         elif flags["test"]:
             prompt = "Write the Unit test cases for the code and explain the scenarios for those cases.\n"
-            result, _ = generate_code_suggestion(code, prompt, context, state)
+            async for update in _stream_reply(chat_history, await _suggestion(generate_code_suggestion, code, prompt, context, state), state):
+                yield update
+            result = chat_history[-1]["content"]
             state["inputs"]["last_test_result"] = result
-            chat_history.append({"role": "assistant", "content": result})
         if flags["bug"] :
             show_task_radio = False
             show_option_radio = True            
@@ -330,10 +379,11 @@ def handle_radio_selection(selected_option, state, history):
         state["step"] = 2
     else:
         state["step"] = 0   
-    save_history(chat_history)
-    return gr.update(interactive = text_Space,value = None),gr.update(interactive = text_Space),chat_history, state, gr.update(visible = show_task_radio,value=None),gr.update(visible = show_option_radio,value=None)
+    save_history(state, chat_history)
+    yield gr.update(interactive = text_Space,value = None),gr.update(interactive = text_Space),chat_history, state, gr.update(visible = show_task_radio,value=None),gr.update(visible = show_option_radio,value=None)
 
-def handle_func_doc_upload(file_objs, state, history):
+@tracked("upload")
+async def handle_func_doc_upload(file_objs, state, history):
     text_Space = False
     chat_history = history or []
     result_log = []
@@ -346,37 +396,48 @@ def handle_func_doc_upload(file_objs, state, history):
     #     return gr.update(interactive=text_Space, value=None), gr.update(interactive=text_Space), chat_history, state, gr.update(visible=True)
 
     # file_obj = file_objs[0]  # Only process the first (and only) file
-    for file_obj in file_objs: # Multiple document  upload 
-        try:
-            file_path = file_obj.name
-            file_name = os.path.basename(file_path)
-
-            # Extract content using textract
-            content = textract.process(file_path).decode("utf-8")
-            state["inputs"]["func_doc_text"] = content
-
-            # Store in Weaviate
-            result_Fn,code_id = store_framework_embedding(client, file_name, content, "FunctionDocsEmbedding",user_email)
-            state["inputs"]["func_doc_code_id"] = code_id
-            chat_history.append({"role": "user", "content": f"{file_name}"})
-            if result_Fn == "changed":
-                chat_history.append({"role": "assistant", "content": f"✅ Stored: {file_name}"})
-            elif result_Fn == "unchanged":
-                chat_history.append({"role": "assistant", "content": f"The file {file_name} is already stored."})
-
-            chat_history.append({"role": "assistant", "content": "🎉 Done! What would you like to do next?"})
-            chat_history.append({"role": "assistant", "content": "__func_doc_option_radio__"})
-
-        except Exception as e:
-            result_log.append(f"❌ Failed to embed document `{file_name}`: {str(e)}")
+    documents = {}
+    file_objs = file_objs or []
+    # Multiple document upload: extracted concurrently, reported as each file finishes
+    async for path, text, error in extract_documents([file_obj.name for file_obj in file_objs]):
+        file_name = os.path.basename(path)
+        if error is not None:
+            result_log.append(f"❌ Failed to embed document `{file_name}`: {str(error)}")
+            chat_history.append({"role": "assistant", "content": result_log[-1]})
+        else:
+            documents[file_name] = text
+            chat_history.append({"role": "assistant", "content": f"📄 Extracted `{file_name}` ({len(documents) + len(result_log)}/{len(file_objs)})"})
+        yield gr.update(interactive=False), gr.update(interactive=False), chat_history, state, gr.update()
+
+    # Embed every extracted document in one batch, then store them in one bulk write
+    if documents:
+        chat_history.append({"role": "assistant", "content": f"📦 Embedding and storing {len(documents)} document(s)..."})
+        yield gr.update(interactive=False), gr.update(interactive=False), chat_history, state, gr.update()
+    results = await embedding_executor.run(store_document_embeddings, await aget_client(), documents, "FunctionDocsEmbedding", user_email) if documents else {}
+    for file_name in documents:
+        result_Fn, code_id = results[file_name]
+        chat_history.append({"role": "user", "content": f"{file_name}"})
+        if result_Fn == "error":
+            result_log.append(f"❌ Failed to embed document `{file_name}`")
             chat_history.append({"role": "assistant", "content": result_log[-1]})
+            continue
+        state["inputs"]["func_doc_text"] = documents[file_name]
+        state["inputs"]["func_doc_code_id"] = code_id
+        if result_Fn in ("new", "changed"):
+            chat_history.append({"role": "assistant", "content": f"✅ Stored: {file_name}"})
+        elif result_Fn == "unchanged":
+            chat_history.append({"role": "assistant", "content": f"The file {file_name} is already stored."})
+
+        chat_history.append({"role": "assistant", "content": "🎉 Done! What would you like to do next?"})
+        chat_history.append({"role": "assistant", "content": "__func_doc_option_radio__"})
 
     state["step"] = 0
-    save_history(chat_history)
-    return gr.update(interactive=text_Space, value=None), gr.update(interactive=text_Space), chat_history, state, gr.update(visible=True,value=None)
+    save_history(state, chat_history)
+    yield gr.update(interactive=text_Space, value=None), gr.update(interactive=text_Space), chat_history, state, gr.update(visible=True,value=None)
 
 
-def handle_Fnradio_selection(selected_option, state, history):
+@tracked("function_doc")
+async def handle_Fnradio_selection(selected_option, state, history):
     show_task_radio = False
     func_doc_option_radio = False
     text_Space = False
@@ -398,7 +459,8 @@ def handle_Fnradio_selection(selected_option, state, history):
         }
 
     if not selected_option:
-        return gr.update(interactive=text_Space, value=None), gr.update(interactive=text_Space), chat_history, state, gr.update(visible=show_task_radio, value=None), gr.update(visible=func_doc_option_radio, value=None)
+        yield gr.update(interactive=text_Space, value=None), gr.update(interactive=text_Space), chat_history, state, gr.update(visible=show_task_radio, value=None), gr.update(visible=func_doc_option_radio, value=None)
+        return
 
     FnRadio = {
         "test": "test" in selected_option.lower(),
@@ -412,38 +474,32 @@ def handle_Fnradio_selection(selected_option, state, history):
         code_id = state["inputs"]["func_doc_code_id"]
 
         if not FnRadio["generate"]:
-            collection = client.collections.get("FunctionDocsEmbedding")
+            client = await aget_client()
+            chunks = await blocking_executor.run(fetch_document_chunks, client, "FunctionDocsEmbedding", code_id, user_email)
 
-            filters = (
-                Filter.by_property("code_id").equal(code_id) &
-                Filter.by_property("user_name").equal(user_email)
-            )
-
-            result = collection.query.fetch_objects(filters=filters, include_vector=True)
-
-            if not result.objects:
+            if not chunks:
                 raise ValueError("❌ No matching document found for this user.")
-            user_obj = result.objects[0]
             # user_obj = client.collections.get("FunctionDocsEmbedding").query.fetch_object_by_id(code_id, include_vector=True)
-            if not hasattr(user_obj, 'vector') or user_obj.vector is None:
-                raise ValueError("❌ Vector not generated for user code")
-            user_vector = user_obj.vector['default']
-            context = retrieve_Fun_framework_context(client, user_vector)
+            user_vector = await blocking_executor.run(document_vector, chunks)
+            context = await blocking_executor.run(retrieve_Fun_framework_context, client, user_vector)
+            func_doc_text = await blocking_executor.run(document_text, func_doc_text, chunks, user_vector)
         
 
         if FnRadio["curd"]:
             prompt = "Generate CRUD operation code based on the function document.\n"
-            result, _ = generate_FN_code_Testcase_suggestion(func_doc_text, prompt, context, state)
-            chat_history.append({"role": "assistant", "content": result})
+            async for update in _stream_reply(chat_history, await _suggestion(generate_FN_code_Testcase_suggestion, func_doc_text, prompt, context, state), state):
+                yield update
+            result = chat_history[-1]["content"]
         elif FnRadio["generate"]:
             chat_history.append({"role": "assistant", "content": "🔍 What exactly do you want to optimize?"})
             state["step"] = 3
             text_Space = True
         elif FnRadio["test"]:
             prompt = "Write test cases for the uploaded function document based on internal functional patterns. Explain the purpose and coverage of each test case."
-            result, _ = generate_FN_code_Testcase_suggestion(func_doc_text, prompt, context, state)
+            async for update in _stream_reply(chat_history, await _suggestion(generate_FN_code_Testcase_suggestion, func_doc_text, prompt, context, state), state):
+                yield update
+            result = chat_history[-1]["content"]
             state["inputs"]["last_test_result"] = result
-            chat_history.append({"role": "assistant", "content": result})
 
         func_doc_option_radio = False
     except Exception as e:
@@ -452,10 +508,10 @@ def handle_Fnradio_selection(selected_option, state, history):
     if state["step"] != 3:
         state["step"] = 0
 
-    save_history(chat_history)
-    return gr.update(interactive=text_Space, value=None), gr.update(interactive=text_Space), chat_history, state, gr.update(visible=show_task_radio, value=None), gr.update(visible=func_doc_option_radio, value=None)
-def handle_login(username, password):
-    success, message, user_info = login_user(username, password)
+    save_history(state, chat_history)
+    yield gr.update(interactive=text_Space, value=None), gr.update(interactive=text_Space), chat_history, state, gr.update(visible=show_task_radio, value=None), gr.update(visible=func_doc_option_radio, value=None)
+async def handle_login(username, password):
+    success, message, user_info = await blocking_executor.run(login_user, username, password)
 
     if success:
         user_email = user_info.get("UserEmail")  # ⬅️ Get the email
@@ -465,6 +521,8 @@ def handle_login(username, password):
         user_email=None
         login_screen = gr.update(visible=True)
         chat_screen = gr.update(visible=False)
+    # Each user gets back their own conversation
+    history = await blocking_executor.run(load_history, user_email) if success else [dict(WELCOME_MESSAGE)]
 
     return (
         login_screen,
@@ -481,7 +539,8 @@ def handle_login(username, password):
             "FnRadio": {"test": False, "generate": False, "curd": False},
             "func_doc_text": None
         }
-    }
+    },
+        history
     )
 def login_user(username, password):
     try:
@@ -557,7 +616,7 @@ with gr.Blocks(title="AIOptimind", css="""
 
         gr.Markdown("## 🤖 AIOptimind - Chat with your MYHUB Code Assistant")
 
-        chatbot = gr.Chatbot(label="AI Chat", height=600, type="messages", avatar_images=("user.jpg", "chatbot.jpg"), value=load_history(),show_label=False)
+        chatbot = gr.Chatbot(label="AI Chat", height=600, type="messages", avatar_images=("user.jpg", "chatbot.jpg"), value=[dict(WELCOME_MESSAGE)],show_label=False)
         state_box = gr.State({"task": None, "step": 0,"email": None, "inputs": {"flags": {"test": False, "optimize": False, "bug": False},"last_bug_result":None ,"last_test_result":None,"FnRadio": {"test": False, "generate": False, "curd": False},"func_doc_text": None }})
 
         #task_radio = gr.Radio(["Framework Embedding", "Optimize Code"], visible=True, label="Choose task",value=None)
@@ -578,12 +637,18 @@ with gr.Blocks(title="AIOptimind", css="""
         # 🔥 NEW LOGOUT BUTTON 🔥
         logout_btn = gr.Button("Logout", elem_id="clear-btn")          
 
-        user_input.submit(chat_interaction, [user_input, chatbot, state_box], [user_input,send_btn, chatbot, state_box, option_radio,task_radio])
-        send_btn.click(chat_interaction, [user_input, chatbot, state_box], [user_input,send_btn, chatbot, state_box, option_radio,task_radio])
+        # Events that call the LLM share one concurrency slot pool; uploads (extract + embed) get their own
+        user_input.submit(chat_interaction, [user_input, chatbot, state_box], [user_input,send_btn, chatbot, state_box, option_radio,task_radio],
+                          concurrency_id="llm", concurrency_limit=LLM_CONCURRENCY)
+        send_btn.click(chat_interaction, [user_input, chatbot, state_box], [user_input,send_btn, chatbot, state_box, option_radio,task_radio],
+                       concurrency_id="llm", concurrency_limit=LLM_CONCURRENCY)
         task_radio.select(handle_task_selection, [task_radio, state_box, chatbot], [user_input,send_btn, chatbot, state_box, task_radio,option_radio,func_doc_upload])    
-        option_radio.select(handle_radio_selection, [option_radio, state_box, chatbot], [user_input,send_btn,chatbot, state_box, task_radio,option_radio])
-        func_doc_upload.upload(handle_func_doc_upload, [func_doc_upload, state_box, chatbot], [user_input,send_btn,chatbot, state_box, func_doc_option_radio])
-        func_doc_option_radio.select(handle_Fnradio_selection, [func_doc_option_radio, state_box, chatbot], [user_input,send_btn,chatbot, state_box, task_radio,func_doc_option_radio])
+        option_radio.select(handle_radio_selection, [option_radio, state_box, chatbot], [user_input,send_btn,chatbot, state_box, task_radio,option_radio],
+                            concurrency_id="llm", concurrency_limit=LLM_CONCURRENCY)
+        func_doc_upload.upload(handle_func_doc_upload, [func_doc_upload, state_box, chatbot], [user_input,send_btn,chatbot, state_box, func_doc_option_radio],
+                               concurrency_id="ingest", concurrency_limit=INGEST_CONCURRENCY)
+        func_doc_option_radio.select(handle_Fnradio_selection, [func_doc_option_radio, state_box, chatbot], [user_input,send_btn,chatbot, state_box, task_radio,func_doc_option_radio],
+                                     concurrency_id="llm", concurrency_limit=LLM_CONCURRENCY)
 
         gr.Button("Clear Chat", elem_id="clear-btn").click(
             fn=lambda chatbot, state_box: clear_chat(preserve_docs=True, state=state_box),
@@ -596,9 +661,22 @@ with gr.Blocks(title="AIOptimind", css="""
     login_btn.click(
         handle_login,
         inputs=[username, password],
-        outputs=[login_screen, chat_screen, login_message, state_box]
+        outputs=[login_screen, chat_screen, login_message, state_box, chatbot]
     )
 
+    # Executor queue depth / wait times, handler latencies and stage totals as JSON at /api/metrics (not shown in the UI);
+    # the same data in Prometheus text format is on METRICS_PORT
+    metrics_json = gr.JSON(visible=False)
+    gr.Button(visible=False).click(metrics, None, metrics_json, api_name="metrics", queue=False)
+
 
 if __name__ == "__main__":
+    startup.mark("imports")
+    # Load the embedding model and connect to Weaviate concurrently while the UI comes up
+    warmups = startup.warm_up_all(model=get_model, weaviate=get_client,
+                                  local_index=lambda: start_periodic_sync(get_client()),
+                                  keyword_index=lambda: sync_keyword_indexes(get_client()))
+    startup.report_when_done(warmups.values())
+    start_metrics_server()
+    demo.queue(max_size=QUEUE_MAX_SIZE, default_concurrency_limit=DEFAULT_CONCURRENCY)
     demo.launch()
@@ -0,0 +1,86 @@
+import json
+import os
+
+from utils import compute_hash, project_file_name
+
+MANIFEST_DIR = os.getenv("INGEST_MANIFEST_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ingest_manifests"))
+
+
+def manifest_path(csproj_path):
+    return os.path.join(MANIFEST_DIR, compute_hash(os.path.abspath(csproj_path))[:16] + ".json")
+
+
+def load_manifest(csproj_path):
+    """{relative_path: {"file_name", "mtime_ns", "size", "hash"}} from the last successful sync."""
+    path = manifest_path(csproj_path)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["files"]
+    except (OSError, ValueError, KeyError):
+        print(f"⚠️ Ignoring unreadable manifest {path}")
+        return {}
+
+
+def save_manifest(csproj_path, files):
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    path = manifest_path(csproj_path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"csproj": os.path.abspath(csproj_path), "files": files}, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def diff_project(csproj_path, cs_files, manifest):
+    """
+    Compare the project's current Compile items with the manifest.
+
+    Files whose mtime and size match the manifest are never opened. Returns
+    (changed, current, removed):
+      changed: {relative_path: content} for new or modified files
+      current: manifest entries for every file still in the project (hashes of
+               changed files included, to be saved once they are stored)
+      removed: manifest entries of files no longer in the project, and the
+               old entries of files stored under an outdated file_name (they
+               are stored again under the current one)
+    """
+    csproj_dir = os.path.dirname(os.path.abspath(csproj_path))
+    changed, current, renamed = {}, {}, []
+    names = {rel_path: project_file_name(rel_path) for rel_path in cs_files}
+    # Names an older version gave to files that now have another: whatever is stored under them is checked again
+    outdated = {manifest[rel_path]["file_name"] for rel_path, name in names.items()
+                if rel_path in manifest and manifest[rel_path]["file_name"] != name}
+
+    for rel_path in cs_files:
+        full_path = os.path.join(csproj_dir, rel_path)
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            print(f"⚠️ Skipped missing file: {rel_path}")
+            continue
+
+        entry = manifest.get(rel_path)
+        file_name = names[rel_path]
+        if entry and entry["file_name"] != file_name:
+            # Stored by an older version under its bare file name
+            renamed.append(entry)
+            entry = None
+        if entry and file_name not in outdated and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            current[rel_path] = entry
+            continue
+
+        with open(full_path, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+        code_hash = compute_hash(content)
+        current[rel_path] = {
+            "file_name": file_name,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": code_hash,
+        }
+        if not entry or entry["hash"] != code_hash or file_name in outdated:
+            changed[rel_path] = content
+
+    removed = [entry for rel_path, entry in manifest.items() if rel_path not in current] + renamed
+    return changed, current, removed
@@ -0,0 +1,225 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+import tracing
+from vector_store import ResultObject, as_store, where_matches
+
+KEYWORD_INDEX_ENABLED = os.getenv("KEYWORD_INDEX", "1") == "1"
+KEYWORD_INDEX_DIR = os.getenv("KEYWORD_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".keyword_index"))
+KEYWORD_COLLECTIONS = ("FXCodeEmbedding", "FunctionDocsEmbedding")
+TEXT_FIELDS = ("code", "text", "symbol_path", "file_name")
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60  # rank constant from the original RRF paper; larger flattens the head of each list
+FETCH_IDS_BATCH = 100
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_WORD_PART = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+
+def tokenize(text):
+    """
+    Identifier-aware terms: every identifier lowercased as a whole, plus its
+    camelCase / snake_case parts, so "AppCRUD.SaveAsync" yields appcrud, app,
+    crud, saveasync, save, async.
+    """
+    terms = []
+    for identifier in _IDENTIFIER.findall(text or ""):
+        terms.append(identifier.lower())
+        parts = [p.lower() for p in _WORD_PART.findall(identifier) if len(p) > 1]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+def symbols(text):
+    """Tokens of a query that look like code symbols (SaveAsync, app_crud, Get2) rather than words."""
+    return {identifier.lower() for identifier in _IDENTIFIER.findall(text or "")
+            if "_" in identifier or re.search(r"[a-z][A-Z]|[A-Z]{2}[a-z]|[0-9]", identifier)}
+
+
+def reciprocal_rank_fusion(ranked_lists, weights, k=RRF_K):
+    """
+    ranked_lists are lists of keys, best first; returns [(key, score)] best
+    first with score = sum(weight / (k + rank)) over the lists containing key.
+    """
+    scores = {}
+    for keys, weight in zip(ranked_lists, weights):
+        for rank, key in enumerate(keys, start=1):
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class KeywordIndex:
+    """
+    BM25 inverted index over the text properties of one collection.
+
+    Each object keeps its term counts and properties (so hits render without a
+    store round trip); postings are rebuilt from them on load. Persisted as
+    JSON, and reloaded when another process (fxcode_crud) has saved a newer file.
+    """
+
+    def __init__(self, name, index_dir=KEYWORD_INDEX_DIR):
+        self.name = name
+        self._path = os.path.join(index_dir, f"{name}.json")
+        self._lock = threading.RLock()
+        self._docs = {}      # uuid -> (properties, Counter of terms, length)
+        self._postings = {}  # term -> {uuid: term count}
+        self._total_length = 0
+        self._mtime = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    # ---------- persistence ----------
+    def load(self):
+        with self._lock:
+            self._docs, self._postings, self._total_length = {}, {}, 0
+            if os.path.exists(self._path):
+                with open(self._path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                for uuid, doc in saved.items():
+                    self._add(uuid, doc["properties"], Counter(doc["terms"]))
+                self._mtime = os.path.getmtime(self._path)
+        return self
+
+    def reload_if_changed(self):
+        with self._lock:
+            if os.path.exists(self._path) and os.path.getmtime(self._path) != self._mtime:
+                self.load()
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            tmp_path = self._path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({uuid: {"properties": props, "terms": terms} for uuid, (props, terms, _) in self._docs.items()}, f)
+            os.replace(tmp_path, self._path)
+            self._mtime = os.path.getmtime(self._path)
+
+    # ---------- writes ----------
+    def _add(self, uuid, properties, terms):
+        self._docs[uuid] = (properties, terms, sum(terms.values()))
+        self._total_length += self._docs[uuid][2]
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[uuid] = count
+
+    def _remove(self, uuid):
+        doc = self._docs.pop(uuid, None)
+        if doc is None:
+            return
+        self._total_length -= doc[2]
+        for term in doc[1]:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(uuid, None)
+                if not posting:
+                    del self._postings[term]
+
+    def upsert_many(self, uuids, properties):
+        with self._lock:
+            self.reload_if_changed()
+            for uuid, props in zip(uuids, properties):
+                uuid = str(uuid)
+                self._remove(uuid)
+                self._add(uuid, dict(props), Counter(tokenize(" ".join(str(props[f]) for f in TEXT_FIELDS if props.get(f)))))
+
+    def delete(self, uuids):
+        with self._lock:
+            self.reload_if_changed()
+            for uuid in uuids:
+                self._remove(str(uuid))
+
+    def delete_where(self, where):
+        with self._lock:
+            self.reload_if_changed()
+            for uuid in [u for u, (props, _, _) in self._docs.items() if where_matches(props, where)]:
+                self._remove(uuid)
+
+    # ---------- reads ----------
+    @tracing.traced("keyword_index.search")
+    def search(self, query, top_k=5, where=None):
+        """Top-k objects by BM25 score for the query's terms; metadata.score carries the score."""
+        terms = set(tokenize(query))
+        with self._lock:
+            self.reload_if_changed()
+            if not self._docs or not terms:
+                return []
+            count = len(self._docs)
+            average_length = self._total_length / count
+            scores = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for uuid, tf in posting.items():
+                    length = self._docs[uuid][2]
+                    scores[uuid] = scores.get(uuid, 0.0) + idf * tf * (BM25_K1 + 1) / (
+                        tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+            ranked = sorted(scores.items(), key=lambda item: -item[1])
+            hits = []
+            for uuid, score in ranked:
+                if where and not where_matches(self._docs[uuid][0], where):
+                    continue
+                hits.append(ResultObject(uuid, dict(self._docs[uuid][0]), score=score))
+                if len(hits) >= top_k:
+                    break
+            return hits
+
+    def has_terms(self, uuid, terms):
+        with self._lock:
+            doc = self._docs.get(str(uuid))
+            return doc is not None and all(term in doc[1] for term in terms)
+
+    def versions(self):
+        with self._lock:
+            return {uuid: props.get("code_hash") for uuid, (props, _, _) in self._docs.items()}
+
+    # ---------- sync from the store ----------
+    def pull_delta(self, store):
+        """Index new or changed objects and drop deleted ones, as LocalVectorIndex.pull_delta does. Returns (upserted, deleted)."""
+        remote = {str(obj.uuid): obj.properties.get("code_hash")
+                  for obj in store.fetch(self.name, return_properties=["code_hash"])}
+        local = self.versions()
+        stale = [uuid for uuid, code_hash in remote.items() if local.get(uuid, object()) != code_hash]
+        gone = [uuid for uuid in local if uuid not in remote]
+
+        for start in range(0, len(stale), FETCH_IDS_BATCH):
+            objects = store.fetch_by_ids(self.name, stale[start:start + FETCH_IDS_BATCH])
+            self.upsert_many([o.uuid for o in objects], [dict(o.properties) for o in objects])
+        self.delete(gone)
+        if stale or gone:
+            self.save()
+        return len(stale), len(gone)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_keyword_index(name):
+    """The process-wide keyword index of collection `name`, loaded from disk on first use; None when disabled."""
+    if not KEYWORD_INDEX_ENABLED or name not in KEYWORD_COLLECTIONS:
+        return None
+    with _indexes_lock:
+        if name not in _indexes:
+            _indexes[name] = KeywordIndex(name).load()
+        return _indexes[name]
+
+
+def sync_keyword_indexes(client):
+    """One delta pull for every indexed collection (run at startup; ingest keeps the indexes current after that)."""
+    store = as_store(client)
+    for name in KEYWORD_COLLECTIONS:
+        index = get_keyword_index(name)
+        if index is None:
+            continue
+        started = time.perf_counter()
+        upserted, deleted = index.pull_delta(store)
+        print(f"🔤 Keyword index {name}: {len(index)} object(s), +{upserted}/-{deleted} in {time.perf_counter() - started:.2f}s")
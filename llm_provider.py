@@ -0,0 +1,287 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import httpx
+
+import tracing
+
+try:
+    import h2  # noqa: F401  (httpx only negotiates HTTP/2 when h2 is installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+PROVIDERS = ("openai", "ollama")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
+
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT_SECONDS = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_provider = os.getenv("LLM_PROVIDER", "openai")
+_clients = {}
+_async_clients = {}
+_clients_lock = threading.Lock()
+
+
+class LLMError(Exception):
+    pass
+
+
+def set_provider(name):
+    """Switch the backend used by complete()/stream() at runtime."""
+    global _provider
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider {name!r}; expected one of {', '.join(PROVIDERS)}")
+    _provider = name
+
+
+def get_provider():
+    return _provider
+
+
+def model_name(provider=None):
+    return OLLAMA_MODEL if (provider or _provider) == "ollama" else OPENAI_MODEL
+
+
+def _client_options(provider):
+    base_url = OPENAI_BASE_URL if provider == "openai" else OLLAMA_URL
+    headers = {}
+    if provider == "openai" and os.getenv("OPENAI_API_KEY"):
+        headers["Authorization"] = f"Bearer {os.getenv('OPENAI_API_KEY')}"
+    return dict(
+        base_url=base_url,
+        headers=headers,
+        http2=HTTP2_AVAILABLE and base_url.startswith("https"),
+        timeout=httpx.Timeout(READ_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+    )
+
+
+def _client(provider):
+    """One long-lived keep-alive connection pool per backend."""
+    with _clients_lock:
+        if provider not in _clients:
+            _clients[provider] = httpx.Client(**_client_options(provider))
+        return _clients[provider]
+
+
+def _async_client(provider):
+    """Async counterpart of _client; an httpx.AsyncClient is bound to its event loop, so one per (backend, loop)."""
+    key = (provider, asyncio.get_running_loop())
+    with _clients_lock:
+        if key not in _async_clients:
+            _async_clients[key] = httpx.AsyncClient(**_client_options(provider))
+        return _async_clients[key]
+
+
+def close():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        # Async pools are dropped with their loop; their sockets close when it shuts down
+        _async_clients.clear()
+
+
+def _backoff(attempt, response=None):
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass
+    # Full jitter: concurrent callers hitting the same 429 don't retry in lockstep
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _path(provider):
+    return "/api/chat" if provider == "ollama" else "/chat/completions"
+
+
+def _payload(provider, role, messages, stream):
+    messages = [{"role": "system", "content": role}] + list(messages)
+    payload = {"model": model_name(provider), "messages": messages, "stream": stream}
+    if provider == "openai" and stream:
+        payload["stream_options"] = {"include_usage": True}  # usage arrives on the last chunk
+    return payload
+
+
+def _open(provider, role, messages, stream):
+    """
+    Send the request, retrying connect errors and 429/5xx with jittered backoff.
+    Returns an open streaming response; the caller closes it.
+    """
+    client = _client(provider)
+    path = _path(provider)
+    payload = _payload(provider, role, messages, stream)
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = client.send(client.build_request("POST", path, json=payload), stream=True)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+            if attempt == MAX_RETRIES:
+                raise LLMError(f"{provider} unreachable after {attempt + 1} attempt(s): {str(e)}")
+            delay = _backoff(attempt)
+            print(f"⚠️ {provider}: {type(e).__name__}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if response.status_code == 200:
+            return response
+        response.read()
+        response.close()
+        if response.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+            raise LLMError(f"{provider} returned {response.status_code}: {response.text}")
+        delay = _backoff(attempt, response)
+        print(f"⚠️ {provider}: HTTP {response.status_code}, retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+async def _aopen(provider, role, messages, stream):
+    """_open() for the async client; backoff sleeps yield to the event loop."""
+    client = _async_client(provider)
+    path = _path(provider)
+    payload = _payload(provider, role, messages, stream)
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = await client.send(client.build_request("POST", path, json=payload), stream=True)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError) as e:
+            if attempt == MAX_RETRIES:
+                raise LLMError(f"{provider} unreachable after {attempt + 1} attempt(s): {str(e)}")
+            delay = _backoff(attempt)
+            print(f"⚠️ {provider}: {type(e).__name__}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if response.status_code == 200:
+            return response
+        await response.aread()
+        await response.aclose()
+        if response.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+            raise LLMError(f"{provider} returned {response.status_code}: {response.text}")
+        delay = _backoff(attempt, response)
+        print(f"⚠️ {provider}: HTTP {response.status_code}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+def _ollama_usage(body):
+    prompt_tokens, completion_tokens = body.get("prompt_eval_count", 0), body.get("eval_count", 0)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def complete(role, messages, provider=None):
+    """
+    One chat completion with `role` as the system prompt and `messages` as the
+    conversation. Returns (content, usage) with usage as a
+    {prompt_tokens, completion_tokens, total_tokens} dict.
+    """
+    provider = provider or _provider
+    with tracing.span("llm") as record:
+        response = _open(provider, role, messages, stream=False)
+        try:
+            raw = response.read()
+        finally:
+            response.close()
+        content, usage = _parse_completion(provider, json.loads(raw))
+        record.set(bytes=len(raw))
+        _record_usage(record, usage)
+        return content, usage
+
+
+def _record_usage(record, usage):
+    if usage:
+        record.set(tokens_in=usage.get("prompt_tokens") or 0, tokens_out=usage.get("completion_tokens") or 0)
+
+
+def _parse_completion(provider, body):
+    if provider == "ollama":
+        return body["message"]["content"], _ollama_usage(body)
+    return body["choices"][0]["message"]["content"], body.get("usage")
+
+
+def _parse_stream_line(provider, line):
+    """(text delta, usage) for one line of a streamed response; either may be empty/None."""
+    if provider == "ollama":
+        if not line:
+            return "", None
+        chunk = json.loads(line)
+        return chunk.get("message", {}).get("content", ""), _ollama_usage(chunk) if chunk.get("done") else None
+    if not line.startswith("data: ") or line == "data: [DONE]":
+        return "", None
+    chunk = json.loads(line[len("data: "):])
+    delta = chunk["choices"][0].get("delta", {}).get("content") if chunk.get("choices") else None
+    return delta or "", chunk.get("usage")
+
+
+def stream(role, messages, provider=None):
+    """Like complete(), but yields (text so far, usage) as tokens arrive; usage is only set on the last item."""
+    provider = provider or _provider
+    with tracing.span("llm") as record:
+        started = time.perf_counter()
+        response = _open(provider, role, messages, stream=True)
+        content, usage, received = "", None, 0
+        try:
+            for line in response.iter_lines():
+                received += len(line)
+                delta, line_usage = _parse_stream_line(provider, line)
+                usage = line_usage or usage
+                if delta:
+                    if not content:
+                        record.set(first_token=time.perf_counter() - started)
+                    content += delta
+                    yield content, None
+        finally:
+            response.close()
+            record.set(bytes=received)
+            _record_usage(record, usage)
+        yield content, usage
+
+
+async def acomplete(role, messages, provider=None):
+    """complete() on the async client, for handlers running on an event loop."""
+    provider = provider or _provider
+    with tracing.span("llm") as record:
+        response = await _aopen(provider, role, messages, stream=False)
+        try:
+            raw = await response.aread()
+        finally:
+            await response.aclose()
+        content, usage = _parse_completion(provider, json.loads(raw))
+        record.set(bytes=len(raw))
+        _record_usage(record, usage)
+        return content, usage
+
+
+async def astream(role, messages, provider=None):
+    """stream() on the async client: an async generator of (text so far, usage)."""
+    provider = provider or _provider
+    with tracing.span("llm") as record:
+        started = time.perf_counter()
+        response = await _aopen(provider, role, messages, stream=True)
+        content, usage, received = "", None, 0
+        try:
+            async for line in response.aiter_lines():
+                received += len(line)
+                delta, line_usage = _parse_stream_line(provider, line)
+                usage = line_usage or usage
+                if delta:
+                    if not content:
+                        record.set(first_token=time.perf_counter() - started)
+                    content += delta
+                    yield content, None
+        finally:
+            await response.aclose()
+            record.set(bytes=received)
+            _record_usage(record, usage)
+        yield content, usage
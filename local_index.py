@@ -0,0 +1,408 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import tracing
+from vector_codec import VectorCodec
+from vector_store import ResultObject, as_store, where_matches
+
+try:
+    import hnswlib  # optional: approximate search for large mirrors
+except ImportError:
+    hnswlib = None
+
+LOCAL_INDEX_ENABLED = os.getenv("LOCAL_VECTOR_INDEX", "0") == "1"
+LOCAL_INDEX_DIR = os.getenv("LOCAL_VECTOR_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".local_index"))
+SYNC_INTERVAL_SECONDS = int(os.getenv("LOCAL_VECTOR_INDEX_SYNC_SECONDS", "300"))
+HNSW_THRESHOLD = 20000  # below this an exact matrix scan is already sub-millisecond
+MIRRORED_COLLECTIONS = ("FXCodeEmbedding", "FunctionDocsEmbedding")
+# Compact mode: "int8" (4x smaller) or "binary" (32x) codes in RAM, optionally after PCA to LOCAL_VECTOR_INDEX_PCA_DIM
+# dimensions; the float32 matrix stays memory-mapped on disk and only rescores each query's shortlist
+ENCODING = os.getenv("LOCAL_VECTOR_INDEX_ENCODING", "float32")
+PCA_DIM = int(os.getenv("LOCAL_VECTOR_INDEX_PCA_DIM", "0"))
+SHORTLIST_FACTOR = int(os.getenv("LOCAL_VECTOR_INDEX_SHORTLIST", "10"))  # candidates rescored per requested hit
+SHORTLIST_MIN = 100
+CODEC_MIN_ROWS = 1000  # smaller mirrors are scanned exactly; the codec is fitted once there is a corpus to fit on
+FETCH_IDS_BATCH = 100
+TEXT_PROPERTIES = ("code", "text")  # kept in the SQLite sidecar, not the JSON snapshot
+# Saves append changed rows to a journal; the .npy/.json snapshot is rewritten once the journal outgrows this share
+JOURNAL_MAX_SHARE = 0.25
+JOURNAL_MIN_ROWS = 1000
+
+
+class LocalVectorIndex:
+    """
+    In-process mirror of one collection.
+
+    Vectors are L2-normalized rows of a contiguous float32 matrix (so cosine
+    distance is 1 - dot product, as in Weaviate); properties live in a
+    parallel list. Above HNSW_THRESHOLD rows an hnswlib graph is used when
+    installed.
+
+    On disk a snapshot (.npy matrix + JSON sidecar without TEXT_PROPERTIES) is
+    followed by a journal in a SQLite sidecar that also holds the text
+    properties. save() only appends the rows changed since the last save, and
+    the snapshot is rewritten once the journal outgrows JOURNAL_MAX_SHARE of it.
+
+    With a compact encoding (see vector_codec) the saved matrix is memory-
+    mapped instead of loaded, searches scan the in-RAM codes for a shortlist
+    of SHORTLIST_FACTOR * top_k rows and only those rows are rescored
+    exactly; HNSW is not used, since its graph holds every float vector.
+    """
+
+    def __init__(self, name, index_dir=LOCAL_INDEX_DIR, dim=None, encoding=ENCODING, pca_dim=PCA_DIM):
+        self.name = name
+        self.dim = dim
+        self._matrix_path = os.path.join(index_dir, f"{name}.npy")
+        self._sidecar_path = os.path.join(index_dir, f"{name}.json")
+        self._codec_path = os.path.join(index_dir, f"{name}.codec.npz")
+        self._db_path = os.path.join(index_dir, f"{name}.db")
+        self._db = None
+        self.compact = encoding != "float32" or pca_dim > 0
+        self.codec = VectorCodec(encoding, pca_dim) if self.compact else None
+        self._codes = None  # codec codes of rows [0, _size), rebuilt when None
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, dim or 0), dtype=np.float32)
+        self._size = 0
+        self._uuids = []
+        self._properties = []
+        self._rows = {}
+        self._hnsw = None
+        self._hnsw_dirty = True
+        self._changed = {}  # uuid -> True (upserted) / False (deleted) since the last save
+        self._journal_seq = 0  # last journal entry reflected in memory
+        self._journal_rows = 0  # journal entries not yet in the snapshot
+        self._rewrite = False  # snapshot (and every text) on the next save
+        self.loaded = False
+
+    def __len__(self):
+        return self._size
+
+    # ---------- persistence ----------
+    def _connect(self):
+        if self._db is None:
+            os.makedirs(os.path.dirname(self._db_path), exist_ok=True)
+            self._db = sqlite3.connect(self._db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS texts (uuid TEXT PRIMARY KEY, properties TEXT);
+                CREATE TABLE IF NOT EXISTS journal (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT, uuid TEXT, properties TEXT, vector BLOB
+                );
+            """)
+        return self._db
+
+    def load(self):
+        with self._lock:
+            if self.compact:
+                self.codec = VectorCodec.load(self._codec_path, self.codec.encoding, self.codec.pca_dim)
+            if os.path.exists(self._matrix_path) and os.path.exists(self._sidecar_path):
+                with open(self._sidecar_path, "r", encoding="utf-8") as f:
+                    sidecar = json.load(f)
+                self._matrix = np.load(self._matrix_path, mmap_mode="r" if self.compact else None)
+                self._size = len(sidecar["uuids"])
+                self._uuids = sidecar["uuids"]
+                self._properties = sidecar["properties"]
+                self._rows = {uuid: row for row, uuid in enumerate(self._uuids)}
+                self.dim = self._matrix.shape[1] if self._matrix.size else self.dim
+                self._hnsw_dirty = True
+                self._codes = None
+                self._journal_seq = sidecar.get("journal_seq", 0)
+                # Snapshots from before the journal kept the code text in the JSON; move it out on the next save
+                self._rewrite = "journal_seq" not in sidecar
+            replayed = self._replay(self._connect())
+            if self.compact and replayed:
+                self._snapshot()  # fold the journal in so the float rows go back to a memory map
+            self.loaded = True
+        return self
+
+    def _replay(self, db):
+        """Merge the stored text properties into the snapshot rows, then apply the journal after it."""
+        texts = dict(db.execute("SELECT uuid, properties FROM texts"))
+        for uuid, props in zip(self._uuids, self._properties):
+            if uuid in texts:
+                props.update(json.loads(texts[uuid]))
+        upserts, deletes = [], []
+        entries = db.execute("SELECT seq, uuid, properties, vector FROM journal WHERE seq > ? ORDER BY seq",
+                             (self._journal_seq,)).fetchall()
+        # Consecutive upserts (of one dimension) and consecutive deletes are applied as one batch
+        for seq, uuid, properties, vector in entries + [(None, None, None, None)]:
+            if upserts and (properties is None or len(vector) != 4 * len(upserts[0][2])):
+                self.upsert_many(*zip(*upserts))
+                upserts = []
+            if deletes and properties is not None:
+                self.delete(deletes)
+                deletes = []
+            if seq is None:
+                self.delete(deletes)
+                break
+            if properties is None:
+                deletes.append(uuid)
+            else:
+                props = json.loads(properties)
+                props.update(json.loads(texts.get(uuid, "{}")))
+                upserts.append((uuid, props, np.frombuffer(vector, dtype=np.float32)))
+            self._journal_seq = seq
+        self._journal_rows = len(entries)
+        self._changed = {}
+        return len(entries)
+
+    def save(self):
+        """Append the rows changed since the last save to the journal; rewrite the snapshot when it is due."""
+        with self._lock:
+            db = self._connect()
+            changed, self._changed = self._changed, {}
+            upserts = [uuid for uuid, live in changed.items() if live]
+            deletes = [uuid for uuid, live in changed.items() if not live]
+            split = {uuid: _split_texts(self._properties[self._rows[uuid]]) for uuid in (self._uuids if self._rewrite else upserts)}
+            with db:
+                db.executemany("INSERT INTO journal (uuid, properties, vector) VALUES (?, ?, ?)",
+                               [(uuid, json.dumps(split[uuid][0]), self._matrix[self._rows[uuid]].tobytes())
+                                for uuid in upserts] + [(uuid, None, None) for uuid in deletes])
+                db.executemany("INSERT OR REPLACE INTO texts (uuid, properties) VALUES (?, ?)",
+                               [(uuid, json.dumps(texts)) for uuid, (_, texts) in split.items()])
+                db.executemany("DELETE FROM texts WHERE uuid = ?", [(uuid,) for uuid in deletes])
+            if changed:
+                self._journal_seq = db.execute("SELECT MAX(seq) FROM journal").fetchone()[0]
+                self._journal_rows += len(changed)
+            if self._rewrite or self._journal_rows > max(JOURNAL_MIN_ROWS, JOURNAL_MAX_SHARE * self._size):
+                self._snapshot()
+
+    def _snapshot(self):
+        """Rewrite the .npy/.json snapshot from memory and drop the journal entries it now covers."""
+        os.makedirs(os.path.dirname(self._matrix_path), exist_ok=True)
+        self._writable()  # no open map on the file being replaced (Windows refuses)
+        np.save(self._matrix_path + ".tmp.npy", self._matrix[:self._size])
+        os.replace(self._matrix_path + ".tmp.npy", self._matrix_path)
+        tmp_path = self._sidecar_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"uuids": self._uuids, "properties": [_split_texts(props)[0] for props in self._properties],
+                       "journal_seq": self._journal_seq}, f)
+        os.replace(tmp_path, self._sidecar_path)
+        db = self._connect()
+        with db:
+            db.execute("DELETE FROM journal WHERE seq <= ?", (self._journal_seq,))
+        self._journal_rows = 0
+        self._rewrite = False
+        if self.compact:
+            if self.codec.fitted:
+                self.codec.save(self._codec_path)
+            # Hand the float rows back to the page cache; searches only touch their shortlists
+            self._matrix = np.load(self._matrix_path, mmap_mode="r")
+
+    def _writable(self):
+        if isinstance(self._matrix, np.memmap):
+            self._matrix = np.array(self._matrix[:self._size])
+
+    # ---------- writes ----------
+    def upsert_many(self, uuids, properties, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) == 0:
+            return
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            if self._matrix.shape[1] != vectors.shape[1]:
+                # First write, or the embedding model changed: start over at the new dimension
+                self.dim = vectors.shape[1]
+                self._keep_rows([])
+                if self.compact:
+                    self.codec = VectorCodec(self.codec.encoding, self.codec.pca_dim)
+            self._writable()
+            codes = self.codec.encode(vectors) if self._codes is not None else None
+            for uuid, props, vector, code in zip(uuids, properties, vectors, codes if codes is not None else vectors):
+                uuid = str(uuid)
+                row = self._rows.get(uuid)
+                if row is None:
+                    row = self._append_row()
+                    self._rows[uuid] = row
+                    self._uuids.append(uuid)
+                    self._properties.append(props)
+                else:
+                    self._properties[row] = props
+                self._changed[uuid] = True
+                self._matrix[row] = vector
+                if codes is not None:
+                    self._codes[row] = code
+            self._hnsw_dirty = True
+
+    def _append_row(self):
+        if self._size == len(self._matrix):
+            grown = np.zeros((max(64, 2 * len(self._matrix)), self.dim), dtype=np.float32)
+            grown[:self._size] = self._matrix[:self._size]
+            self._matrix = grown
+        if self._codes is not None and self._size == len(self._codes):
+            grown = np.zeros((len(self._matrix),) + self._codes.shape[1:], dtype=self._codes.dtype)
+            grown[:self._size] = self._codes[:self._size]
+            self._codes = grown
+        self._size += 1
+        return self._size - 1
+
+    def delete(self, uuids):
+        with self._lock:
+            rows = {self._rows[str(u)] for u in uuids if str(u) in self._rows}
+            if rows:
+                self._keep_rows([r for r in range(self._size) if r not in rows])
+
+    def delete_where(self, where):
+        with self._lock:
+            keep = [r for r in range(self._size) if not where_matches(self._properties[r], where)]
+            if len(keep) != self._size:
+                self._keep_rows(keep)
+
+    def _keep_rows(self, keep):
+        kept = {self._uuids[r] for r in keep}
+        self._changed.update((uuid, False) for uuid in self._uuids if uuid not in kept)
+        self._matrix = self._matrix[keep].copy() if keep else np.zeros((0, self.dim or 0), dtype=np.float32)
+        self._codes = self._codes[keep].copy() if self._codes is not None and keep else None
+        self._uuids = [self._uuids[r] for r in keep]
+        self._properties = [self._properties[r] for r in keep]
+        self._size = len(keep)
+        self._rows = {uuid: row for row, uuid in enumerate(self._uuids)}
+        self._hnsw_dirty = True
+
+    # ---------- reads ----------
+    @tracing.traced("local_index.query")
+    def query(self, vector, top_k=5, where=None):
+        """Top-k nearest objects by cosine distance, optionally restricted by an exact-match where dict."""
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        with self._lock:
+            if self._size == 0:
+                return []
+            if where is None and self._use_hnsw():
+                labels, distances = self._hnsw.knn_query(query, k=min(top_k, self._size))
+                hits = zip(labels[0].tolist(), distances[0].tolist())
+            else:
+                if where:
+                    candidates = np.array([r for r in range(self._size) if where_matches(self._properties[r], where)], dtype=np.int64)
+                    if candidates.size == 0:
+                        return []
+                else:
+                    candidates = np.arange(self._size)
+                codes = self._compact_codes()
+                if codes is not None:
+                    shortlist = self.codec.shortlist(codes[candidates] if where else codes, query,
+                                                     max(SHORTLIST_FACTOR * top_k, SHORTLIST_MIN))
+                    candidates = candidates[np.sort(shortlist)]  # ascending rows read the memory map sequentially
+                scores = (self._matrix[candidates] if where or codes is not None else self._matrix[:self._size]) @ query
+                k = min(top_k, len(candidates))
+                best = np.argpartition(-scores, k - 1)[:k]
+                best = best[np.argsort(-scores[best])]
+                hits = [(int(candidates[i]), 1.0 - float(scores[i])) for i in best]
+            return [ResultObject(self._uuids[row], self._properties[row], self._matrix[row].tolist(), distance)
+                    for row, distance in hits]
+
+    def _compact_codes(self):
+        """Codes of every row in compact mode (fitting the codec on first use), else None for an exact scan."""
+        if not self.compact or self._size < CODEC_MIN_ROWS:
+            return None
+        if not self.codec.fitted or self._size >= 2 * self.codec.fitted_rows:
+            # Refit as the corpus doubles so the projection and scales keep up with it
+            self.codec.fit(self._matrix[:self._size])
+            os.makedirs(os.path.dirname(self._codec_path), exist_ok=True)
+            self.codec.save(self._codec_path)
+            self._codes = None
+        if self._codes is None:
+            self._codes = self.codec.encode(self._matrix[:self._size])
+            print(f"🗜️ Local index {self.name}: {self._size} vector(s) as {self.codec.describe()}, "
+                  f"{self._codes.nbytes / 2**20:.1f} MiB in RAM vs {self._size * self.dim * 4 / 2**20:.1f} MiB float32")
+        return self._codes[:self._size]
+
+    def _use_hnsw(self):
+        if self.compact or hnswlib is None or self._size < HNSW_THRESHOLD:
+            return False
+        if self._hnsw_dirty:
+            index = hnswlib.Index(space="cosine", dim=self.dim)
+            index.init_index(max_elements=self._size, ef_construction=200, M=16)
+            index.add_items(self._matrix[:self._size], np.arange(self._size))
+            index.set_ef(64)
+            self._hnsw = index
+            self._hnsw_dirty = False
+        return True
+
+    def versions(self):
+        """{uuid: code_hash}, used by the delta pull to skip unchanged objects."""
+        with self._lock:
+            return {uuid: props.get("code_hash") for uuid, props in zip(self._uuids, self._properties)}
+
+    # ---------- sync from Weaviate ----------
+    def pull_delta(self, store):
+        """
+        Bring the mirror up to date with one collection.
+
+        Only uuid + code_hash are listed for every object; vectors and full
+        properties are fetched just for new or changed objects, and objects
+        gone from the store are dropped. Returns (upserted, deleted).
+        """
+        remote = {str(obj.uuid): obj.properties.get("code_hash")
+                  for obj in store.fetch(self.name, return_properties=["code_hash"])}
+
+        local = self.versions()
+        stale = [uuid for uuid, code_hash in remote.items() if local.get(uuid, object()) != code_hash]
+        gone = [uuid for uuid in local if uuid not in remote]
+
+        for start in range(0, len(stale), FETCH_IDS_BATCH):
+            objects = [o for o in store.fetch_by_ids(self.name, stale[start:start + FETCH_IDS_BATCH], include_vector=True)
+                       if o.vector]
+            self.upsert_many([o.uuid for o in objects], [dict(o.properties) for o in objects],
+                             [o.vector["default"] for o in objects])
+        self.delete(gone)
+        if stale or gone:
+            self.save()
+        return len(stale), len(gone)
+
+
+def _split_texts(properties):
+    """(properties without TEXT_PROPERTIES, the text properties)."""
+    return ({key: value for key, value in properties.items() if key not in TEXT_PROPERTIES},
+            {key: value for key, value in properties.items() if key in TEXT_PROPERTIES})
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_local_index(name):
+    """The process-wide mirror of collection `name`, loaded from disk on first use; None when disabled."""
+    if not LOCAL_INDEX_ENABLED or name not in MIRRORED_COLLECTIONS:
+        return None
+    with _indexes_lock:
+        if name not in _indexes:
+            _indexes[name] = LocalVectorIndex(name).load()
+        return _indexes[name]
+
+
+def sync_local_indexes(client):
+    """One delta pull for every mirrored collection."""
+    store = as_store(client)
+    for name in MIRRORED_COLLECTIONS:
+        index = get_local_index(name)
+        if index is None:
+            continue
+        started = time.perf_counter()
+        upserted, deleted = index.pull_delta(store)
+        print(f"🔁 Local index {name}: {len(index)} object(s), +{upserted}/-{deleted} in {time.perf_counter() - started:.2f}s")
+
+
+def start_periodic_sync(client, interval=SYNC_INTERVAL_SECONDS):
+    """Initial delta pull now, then every `interval` seconds on a daemon thread."""
+    if not LOCAL_INDEX_ENABLED:
+        return None
+    sync_local_indexes(client)
+
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                sync_local_indexes(client)
+            except Exception as e:
+                print(f"⚠️ Local index sync failed: {str(e)}")
+
+    thread = threading.Thread(target=_loop, name="local-index-sync", daemon=True)
+    thread.start()
+    return thread
@@ -1,13 +1,19 @@
+import startup  # first, so startup timings cover the imports below
 import os
 import uuid
+from ollama_config import get_model
 from weaviate_config import (
-    get_weaviate_client,
-    store_framework_embedding,
-    store_user_embedding,
+    get_vector_store,
+    store_framework_embeddings,
+    store_user_embedding_with_vector,
+    user_code_writes,
     retrieve_framework_context,
     generate_code_suggestion
 )
 from weaviate_agent import parse_csproj_and_extract_code
+from response_cache import print_usage_report
+from keyword_index import sync_keyword_indexes
+import tracing
 
 def prompt_user(prompt_text):
     return input(f"{prompt_text.strip()} ").strip().lower()
@@ -24,6 +30,9 @@ def read_multiline_input(prompt_text):
 
 def run_agent():
     client = None
+    # Load the model and connect to Weaviate in the background while the user answers prompts
+    startup.mark("imports")
+    warmups = startup.warm_up_all(model=get_model, weaviate=get_vector_store)
     try:
         print("🤖 [AIOptimind] Welcome to AIOptimind Agent v1.0")
 
@@ -38,41 +47,45 @@ def run_agent():
                 target_files.append(file)
 
             code_snippets = parse_csproj_and_extract_code(csproj_path, target_files)
-            client = get_weaviate_client()
+            client = warmups["weaviate"].result()
+            startup.report()
 
-            for file_name, code_str in code_snippets.items():
-                store_framework_embedding(client, file_name, code_str)
+            with tracing.request("ingest"):
+                store_framework_embeddings(client, code_snippets, "FXCodeEmbedding")
 
             print("✅ Framework code embedded and stored.\n")
 
         if prompt_user("🚀 Do you want to optimize your own C# code? (yes/no):") == "yes":
             if client is None:
-                client = get_weaviate_client()
+                client = warmups["weaviate"].result()
+                startup.report()
 
             user_code = read_multiline_input("📝 Paste your C# code (press Enter on empty line to finish):")
             user_prompt = input("📌 What do you want the AI to do with this code?: ").strip()
 
-            code_id = store_user_embedding(client, user_code)
-            print(f"✅ User code stored with ID: {code_id}")
+            # One summary line with the time spent per stage (embedding, store calls, context, LLM)
+            with tracing.request("cli"):
+                code_id, user_vector = store_user_embedding_with_vector(client, user_code)
+                print(f"✅ User code embedded with ID: {code_id}")
 
-            user_collection = client.collections.get("UserCodeEmbeddings")
-            user_object = user_collection.query.fetch_object_by_id(code_id, include_vector=True)
-            
-            if not hasattr(user_object, 'vector') or user_object.vector is None:
-                raise ValueError("Failed to generate vector for user code")
-                
-            user_vector = user_object.vector['default']
-            context_results = retrieve_framework_context(client, user_vector)
+                sync_keyword_indexes(client)  # pick up framework code ingested since the last run
+                context_results = retrieve_framework_context(client, user_vector, user_prompt)
 
-            ai_result = generate_code_suggestion(user_code, user_prompt, context_results)
+                state = {"inputs": {"flags": {"test": False, "optimize": True, "bug": False},
+                                    "FnRadio": {"test": False, "generate": False, "curd": False}}}
+                ai_result, _ = generate_code_suggestion(user_code, user_prompt, context_results, state)
             print("\n💡 Optimized Output:\n")
             print(ai_result)
 
     except Exception as e:
         print(f"❌ Error: {str(e)}")
     finally:
+        if client is None and warmups["weaviate"].done() and not warmups["weaviate"].exception():
+            client = warmups["weaviate"].result()
         if client is not None:
+            user_code_writes.flush()
             client.close()
+        print_usage_report()
 
 if __name__ == "__main__":
     run_agent()
\ No newline at end of file
@@ -1,21 +1,45 @@
-from sentence_transformers import SentenceTransformer
+import threading
 import numpy as np
+import tracing
+from embedding_cache import cache_key, open_cache
+from embedding_backends import EMBEDDING_BACKEND, backend_identity, load_model
 
-# Load the HuggingFace embedding model
-model = SentenceTransformer("intfloat/e5-small-v2")
+MODEL_NAME = "intfloat/e5-small-v2"
+EMBEDDING_DIM = 384  # e5-small-v2 output size; lets the cache open without loading the model
+# Cached vectors are namespaced by backend so ONNX/int8 results never mix with torch ones
+MODEL_IDENTITY = backend_identity(MODEL_NAME, EMBEDDING_BACKEND)
 
-def get_embedding(text):
-    """Get embedding using intfloat/e5-small-v2 model.
+DEFAULT_BATCH_SIZE = 32
 
-    Args:
-        text: Can be:
-            - str: Direct text to embed
-            - list: List of texts to join
-            - tuple: (file_path, content) pair
+_model = None
+_embedding_cache = None
+_cache_opened = False
+_lock = threading.Lock()
 
-    Returns:
-        numpy.ndarray: The embedding vector
+def get_model():
+    """Load the HuggingFace embedding model on first use (importing torch is the slow part).
+
+    The backend (torch, onnx or onnx-int8) comes from EMBEDDING_BACKEND.
     """
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                _model = load_model(MODEL_NAME, EMBEDDING_BACKEND)
+    return _model
+
+def get_embedding_cache():
+    """Persistent content-addressed cache in front of model.encode (None when disabled)."""
+    global _embedding_cache, _cache_opened
+    if not _cache_opened:
+        with _lock:
+            if not _cache_opened:
+                _embedding_cache = open_cache(MODEL_IDENTITY, EMBEDDING_DIM)
+                _cache_opened = True
+    return _embedding_cache
+
+def _prepare_text(text):
+    """Normalize any supported input into the "passage: ..." string the E5 model expects."""
     # Handle different input types
     if isinstance(text, tuple):
         _, prompt = text
@@ -28,8 +52,85 @@ def get_embedding(text):
     prompt = prompt.replace('\ufeff', '').strip()
 
     # Add prefix for E5 model (important for correct embedding behavior)
-    formatted_text = f"passage: {prompt}"
+    return f"passage: {prompt}"
+
+def get_embedding(text):
+    """Get embedding using intfloat/e5-small-v2 model.
+
+    Args:
+        text: Can be:
+            - str: Direct text to embed
+            - list: List of texts to join
+            - tuple: (file_path, content) pair
+
+    Returns:
+        numpy.ndarray: The embedding vector
+    """
+    formatted_text = _prepare_text(text)
+
+    with tracing.span("embedding", bytes=len(formatted_text)) as record:
+        key = cache_key(MODEL_IDENTITY, formatted_text)
+        embedding_cache = get_embedding_cache()
+        if embedding_cache is not None:
+            cached = embedding_cache.get(key)
+            record.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+
+        # Get embedding and convert to numpy array
+        embedding = np.array(get_model().encode(formatted_text), dtype=np.float32)
+        if embedding_cache is not None:
+            embedding_cache.put(key, embedding)
+        return embedding
+
+def lookup_cached(formatted):
+    """Serve already-formatted texts from the cache.
+
+    Returns (result, keys, missing): a float32 matrix with cached rows filled
+    in, the cache key of every text, and the indices still to be embedded.
+    """
+    result = np.empty((len(formatted), EMBEDDING_DIM), dtype=np.float32)
+    embedding_cache = get_embedding_cache()
+    keys = [cache_key(MODEL_IDENTITY, text) for text in formatted]
+    missing = []
+    for i, key in enumerate(keys):
+        cached = embedding_cache.get(key) if embedding_cache is not None else None
+        if cached is None:
+            missing.append(i)
+        else:
+            result[i] = cached
+    return result, keys, missing
+
+def get_embeddings(texts, batch_size=DEFAULT_BATCH_SIZE):
+    """Embed many texts with as few forward passes as possible.
+
+    Inputs are sorted by length so each padded batch holds texts of similar
+    size, encoded batch by batch and scattered back into the caller's order.
+
+    Args:
+        texts: Iterable of anything get_embedding accepts (str, list, tuple).
+        batch_size: Number of texts per forward pass.
+
+    Returns:
+        numpy.ndarray: float32 matrix of shape (len(texts), dim), row i is the
+        embedding of texts[i].
+    """
+    formatted = [_prepare_text(t) for t in texts]
+    with tracing.span("embedding_batch", bytes=sum(len(t) for t in formatted)) as record:
+        result, keys, missing = lookup_cached(formatted)
+        # objects counts the texts actually encoded; the rest came from the cache
+        record.set(objects=len(missing), cache_hit=not missing if formatted else None)
+        if not missing:
+            return result
 
-    # Get embedding and convert to numpy array
-    embedding = model.encode(formatted_text)
-    return np.array(embedding, dtype=np.float32)
+        embedding_cache = get_embedding_cache()
+        model = get_model()
+        order = sorted(missing, key=lambda i: len(formatted[i]))
+        for start in range(0, len(order), batch_size):
+            batch_idx = order[start:start + batch_size]
+            vectors = np.asarray(model.encode([formatted[i] for i in batch_idx], batch_size=len(batch_idx)), dtype=np.float32)
+            result[batch_idx] = vectors
+            if embedding_cache is not None:
+                for i, vector in zip(batch_idx, vectors):
+                    embedding_cache.put(keys[i], vector)
+        return result
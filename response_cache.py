@@ -0,0 +1,183 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from utils import compute_hash
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1") == "1"
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".response_cache", "responses.db"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+# Similarity tier: reuse an answer for a differently worded prompt with the same
+# role, user code and retrieved context when the prompts' cosine similarity is high enough
+SEMANTIC_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_SEMANTIC", "0") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", "0.95"))
+
+# Token-usage report for this process: what the LLM calls cost and what the cache saved
+usage_report = {
+    "llm_calls": 0,
+    "prompt_tokens": 0,
+    "completion_tokens": 0,
+    "total_tokens": 0,
+    "cache_hits_exact": 0,
+    "cache_hits_semantic": 0,
+    "tokens_saved": 0,
+}
+_report_lock = threading.Lock()
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        return usage
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump()
+    return {key: getattr(usage, key, None) for key in ("prompt_tokens", "completion_tokens", "total_tokens")}
+
+
+def record_usage(usage):
+    usage = _usage_dict(usage) or {}
+    with _report_lock:
+        usage_report["llm_calls"] += 1
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            usage_report[key] += usage.get(key) or 0
+
+
+def record_hit(tier, usage):
+    usage = _usage_dict(usage) or {}
+    with _report_lock:
+        usage_report[f"cache_hits_{tier}"] += 1
+        usage_report["tokens_saved"] += usage.get("total_tokens") or 0
+
+
+def response_key(model, role, user_code, prompt, context):
+    """
+    (exact key, scope): the exact key covers the prompt text; the scope is
+    everything but the prompt and bounds the similarity tier. Context objects
+    count by uuid and by content, since a re-synced chunk keeps its uuid.
+    """
+    context_ids = [[str(getattr(obj, "uuid", "")),
+                    compute_hash(json.dumps(getattr(obj, "properties", None) or {}, sort_keys=True, default=str))]
+                   for obj in context or []]
+    scope = compute_hash(json.dumps([model, role, compute_hash(user_code or ""), context_ids]))
+    return compute_hash(f"{scope}\n{prompt}"), scope
+
+
+class ResponseCache:
+    """
+    Persistent LLM response cache in SQLite.
+
+    Entries expire after ttl seconds and the least recently used ones are
+    dropped beyond max_entries. With the similarity tier on, each entry also
+    keeps the prompt embedding so a reworded prompt in the same scope can hit.
+    """
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, ttl=RESPONSE_CACHE_TTL_SECONDS, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, scope TEXT, embedding BLOB, content TEXT, usage TEXT,
+                created_at REAL, last_used REAL
+            );
+            CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope);
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+        """)
+
+    def get(self, key, scope, prompt_vector=None):
+        """Returns (tier, content, usage) or None; tier is "exact" or "semantic"."""
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            row = self._db.execute("SELECT key, content, usage FROM responses WHERE key = ?", (key,)).fetchone()
+            tier = "exact"
+            if row is None and prompt_vector is not None:
+                row, tier = self._nearest(scope, prompt_vector), "semantic"
+            if row is None:
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, row[0]))
+            return tier, row[1], json.loads(row[2]) if row[2] else None
+
+    def _nearest(self, scope, prompt_vector):
+        candidates = self._db.execute(
+            "SELECT key, content, usage, embedding FROM responses WHERE scope = ? AND embedding IS NOT NULL", (scope,)
+        ).fetchall()
+        if not candidates:
+            return None
+        query = np.asarray(prompt_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        matrix = np.stack([np.frombuffer(c[3], dtype=np.float32) for c in candidates])
+        scores = matrix @ query / np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+        best = int(np.argmax(scores))
+        return candidates[best][:3] if scores[best] >= SEMANTIC_CACHE_THRESHOLD else None
+
+    def put(self, key, scope, content, usage, prompt_vector=None):
+        now = time.time()
+        embedding = np.asarray(prompt_vector, dtype=np.float32).tobytes() if prompt_vector is not None else None
+        usage = _usage_dict(usage)
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (key, scope, embedding, content, json.dumps(usage) if usage else None, now, now))
+            self._db.execute("""DELETE FROM responses WHERE key IN (
+                                    SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)""",
+                             (self.max_entries,))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _cache
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+def _prompt_vector(prompt):
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    from ollama_config import get_embedding
+
+    return get_embedding(prompt)
+
+
+def lookup(key, prompt):
+    """(content, usage) from the cache, or None. key comes from response_key()."""
+    cache = get_response_cache()
+    if cache is None:
+        return None
+    hit = cache.get(key[0], key[1], _prompt_vector(prompt))
+    if hit is None:
+        return None
+    tier, content, usage = hit
+    record_hit(tier, usage)
+    print(f"⚡ Response cache hit ({tier}); saved {(usage or {}).get('total_tokens') or 0} token(s)")
+    return content, usage
+
+
+def remember(key, prompt, content, usage):
+    record_usage(usage)
+    cache = get_response_cache()
+    if cache is not None:
+        cache.put(key[0], key[1], content, usage, _prompt_vector(prompt))
+
+
+def print_usage_report():
+    with _report_lock:
+        report = dict(usage_report)
+    if report["llm_calls"] or report["cache_hits_exact"] or report["cache_hits_semantic"]:
+        print(f"🧾 Token usage: {report}")
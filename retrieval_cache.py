@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE", "1") == "1"
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "600"))
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "512"))
+# Components of the unit vector are rounded to 1/QUANTIZATION_SCALE, so re-embedding
+# the same (or a whitespace-only different) snippet lands on the same key
+QUANTIZATION_SCALE = 64
+
+
+def vector_key(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+    return hashlib.sha1(np.round(vector * QUANTIZATION_SCALE).astype(np.int8).tobytes()).hexdigest()
+
+
+def retrieval_key(vector, collections, filters, top_k):
+    return (vector_key(vector), tuple(sorted(collections)), json.dumps(filters, sort_keys=True, default=str), top_k)
+
+
+class RetrievalCache:
+    """
+    LRU + TTL cache of retrieval results.
+
+    Every collection has a generation counter; each entry remembers the
+    generations of the collections it read, and bump() on a write makes all
+    of that collection's entries stale without scanning them. Generations
+    are per process, so writes made by another process (fxcode_crud) only
+    show up here once the TTL expires.
+    """
+
+    def __init__(self, max_entries=RETRIEVAL_CACHE_MAX_ENTRIES, ttl=RETRIEVAL_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, generations, results)
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generations(self, collections):
+        return tuple(self._generations.get(name, 0) for name in collections)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, generations, results = entry
+                if expires_at > time.monotonic() and generations == self.generations(key[1]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return list(results)
+                del self._entries[key]
+                if generations != self.generations(key[1]):
+                    self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, results, generations):
+        """generations must be read before retrieving, so a write racing the query leaves the entry stale."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, generations, list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def bump(self, collection_name):
+        with self._lock:
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+retrieval_cache = RetrievalCache()
+
+
+def lookup(vector, collections, filters, top_k):
+    """
+    Returns (ticket, results); results is None on a miss. Pass the ticket to
+    remember() with the freshly retrieved results.
+    """
+    if not RETRIEVAL_CACHE_ENABLED:
+        return None, None
+    key = retrieval_key(vector, collections, filters, top_k)
+    results = retrieval_cache.get(key)
+    if results is not None:
+        print(f"⚡ Retrieval cache hit ({', '.join(key[1])}, top_k={top_k})")
+        return None, results
+    return (key, retrieval_cache.generations(key[1])), None
+
+
+def remember(ticket, results):
+    if ticket is not None:
+        key, generations = ticket
+        retrieval_cache.put(key, results, generations)
+
+
+def invalidate_collection(collection_name):
+    retrieval_cache.bump(collection_name)
@@ -0,0 +1,167 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import tracing
+
+# Embedding is CPU-bound: a couple of threads saturate the cores torch already uses per call
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "2"))
+# Store lookups, file extraction and other blocking I/O
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "16"))
+# Gradio queue: events sharing a concurrency id share the limit; beyond QUEUE_MAX_SIZE waiting events new ones are refused
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "2"))
+DEFAULT_CONCURRENCY = int(os.getenv("DEFAULT_CONCURRENCY", "8"))
+QUEUE_MAX_SIZE = int(os.getenv("QUEUE_MAX_SIZE", "128"))
+LATENCY_WINDOW = 1000  # samples kept per metric for the percentiles
+
+
+def _percentiles(samples):
+    if not samples:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    values = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 1), "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1), "max_ms": round(float(values.max()), 1)}
+
+
+class BoundedExecutor:
+    """
+    Fixed-size thread pool awaited from the event loop.
+
+    Work beyond `workers` waits in the pool's queue; queue depth and the time
+    each call waited for a thread are recorded for metrics(). Calls run in a
+    copy of the caller's context, so their spans land in the caller's trace.
+    """
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=LATENCY_WINDOW)
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+
+    async def run(self, fn, *args, **kwargs):
+        queued_at = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+
+        def _call():
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self._waits.append(time.perf_counter() - queued_at)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        return await asyncio.get_running_loop().run_in_executor(self._pool, contextvars.copy_context().run, _call)
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "queue_depth": self.queued, "running": self.running,
+                    "completed": self.completed, "wait": _percentiles(list(self._waits))}
+
+
+embedding_executor = BoundedExecutor("embedding", EMBEDDING_WORKERS)
+blocking_executor = BoundedExecutor("blocking", BLOCKING_WORKERS)
+
+
+class HandlerStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._first_output = deque(maxlen=LATENCY_WINDOW)
+        self.active = 0
+        self.calls = 0
+        self.errors = 0
+
+    def started(self):
+        with self._lock:
+            self.active += 1
+            self.calls += 1
+
+    def finished(self, seconds, first_output, failed):
+        with self._lock:
+            self.active -= 1
+            self.errors += failed
+            self._latencies.append(seconds)
+            if first_output is not None:
+                self._first_output.append(first_output)
+
+    def stats(self):
+        with self._lock:
+            return {"active": self.active, "calls": self.calls, "errors": self.errors,
+                    "latency": _percentiles(list(self._latencies)),
+                    "first_output": _percentiles(list(self._first_output))}
+
+
+handler_stats = {}
+
+
+def tracked(name):
+    """
+    Decorator for async-generator Gradio handlers: records active calls, total
+    latency and time to first update, and collects the call's spans into one
+    trace. Gradio may resume the generator from a different task, so the trace
+    is activated around each step rather than once for the whole call.
+    """
+    stats = handler_stats.setdefault(name, HandlerStats())
+
+    def wrap(handler):
+        @functools.wraps(handler)
+        async def run(*args, **kwargs):
+            started = time.perf_counter()
+            first_output = None
+            failed = True
+            trace = tracing.Trace(name)
+            steps = handler(*args, **kwargs)
+            stats.started()
+            try:
+                while True:
+                    with tracing.activate(trace):
+                        try:
+                            outputs = await steps.__anext__()
+                        except StopAsyncIteration:
+                            break
+                    if first_output is None:
+                        first_output = time.perf_counter() - started
+                    yield outputs
+                failed = False
+            finally:
+                with tracing.activate(trace):
+                    await steps.aclose()
+                stats.finished(time.perf_counter() - started, first_output, failed)
+                tracing.finish(trace)
+        return run
+    return wrap
+
+
+def metrics():
+    """Executor queue depth / wait times, per-handler latency percentiles and per-stage span totals for this process."""
+    return {
+        "executors": {executor.name: executor.stats() for executor in (embedding_executor, blocking_executor)},
+        "handlers": {name: stats.stats() for name, stats in handler_stats.items()},
+        "stages": tracing.snapshot(),
+    }
+
+
+tracing.register_gauge("executor_queue_depth", "Calls waiting for an executor thread.",
+                       lambda: {(("executor", e.name),): e.queued for e in (embedding_executor, blocking_executor)})
+tracing.register_gauge("executor_running", "Calls running on an executor thread.",
+                       lambda: {(("executor", e.name),): e.running for e in (embedding_executor, blocking_executor)})
+tracing.register_gauge("handler_active", "Gradio handler calls in progress.",
+                       lambda: {(("handler", name),): stats.active for name, stats in handler_stats.items()})
@@ -0,0 +1,50 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Imported first by the entry points so this approximates process start
+START_TIME = time.perf_counter()
+
+_timings = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="warmup")
+
+
+def mark(stage):
+    """Record how long after start a foreground stage finished."""
+    with _lock:
+        _timings[stage] = time.perf_counter() - START_TIME
+
+
+def _timed(stage, fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        with _lock:
+            _timings[stage] = time.perf_counter() - started
+
+
+def warm_up(stage, fn, *args):
+    """Run fn in the background (e.g. model load, Weaviate connect) and time it; returns a Future."""
+    return _executor.submit(_timed, stage, fn, *args)
+
+
+def warm_up_all(**tasks):
+    """Start several warm-up tasks concurrently: warm_up_all(model=get_model, weaviate=get_client)."""
+    return {stage: warm_up(stage, fn) for stage, fn in tasks.items()}
+
+
+def report(label="Startup"):
+    with _lock:
+        stages = " | ".join(f"{stage} {seconds:.2f}s" for stage, seconds in _timings.items())
+    total = time.perf_counter() - START_TIME
+    print(f"⏱️ {label}: {total:.2f}s" + (f" ({stages})" if stages else ""))
+
+
+def report_when_done(futures, label="Startup"):
+    """Print the report once every warm-up future has finished, without blocking the caller."""
+    def _wait():
+        wait(list(futures))
+        report(label)
+    threading.Thread(target=_wait, daemon=True).start()
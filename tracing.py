@@ -0,0 +1,309 @@
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))  # Prometheus text at :METRICS_PORT/metrics; 0 disables
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+TRACE_SUMMARY = os.getenv("TRACE_SUMMARY", "1") == "1"  # one stage-breakdown line per request
+# Histogram bucket upper bounds in seconds: embedding and store calls at the low end, LLM calls at the high end
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+NAMESPACE = "aioptimind"
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus model: per-bucket counts, sum and count."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Bucket upper bound the q-quantile falls in (the Inf bucket reports the largest finite bound)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets + (self.buckets[-1],), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class StageStats:
+    def __init__(self):
+        self.duration = Histogram()
+        self.first_token = Histogram()
+        self.errors = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.bytes = 0
+        self.objects = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def add(self, span):
+        self.duration.observe(span.seconds)
+        self.errors += span.error
+        attributes = span.attributes
+        if attributes.get("cache_hit") is not None:
+            if attributes["cache_hit"]:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+        self.bytes += attributes.get("bytes") or 0
+        self.objects += attributes.get("objects") or 0
+        self.tokens_in += attributes.get("tokens_in") or 0
+        self.tokens_out += attributes.get("tokens_out") or 0
+        if attributes.get("first_token") is not None:
+            self.first_token.observe(attributes["first_token"])
+
+
+class Span:
+    __slots__ = ("stage", "attributes", "seconds", "error")
+
+    def __init__(self, stage, attributes):
+        self.stage = stage
+        self.attributes = attributes
+        self.seconds = 0.0
+        self.error = False
+
+    def set(self, **attributes):
+        """Attach what the call learned: cache_hit, bytes, objects, tokens_in, tokens_out, first_token (seconds)."""
+        self.attributes.update(attributes)
+
+
+class Trace:
+    """The spans of one request, for its summary line."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.seconds = None
+        self._lock = threading.Lock()
+        self.stages = {}  # stage -> StageStats, in first-seen order
+
+    def add(self, span):
+        with self._lock:
+            self.stages.setdefault(span.stage, StageStats()).add(span)
+
+    def summary(self):
+        """e.g. "📈 cli 3.41s · embedding 1×42ms · weaviate.near_vector 1×31ms · llm 1×3.29s (812→230 tok, ttft 410ms)"."""
+        parts = []
+        with self._lock:
+            for stage, stats in self.stages.items():
+                part = f"{stage} {stats.duration.count}×{_format_seconds(stats.duration.sum)}"
+                details = []
+                if stats.tokens_out:
+                    details.append(f"{stats.tokens_in}→{stats.tokens_out} tok")
+                elif stats.tokens_in:
+                    details.append(f"{stats.tokens_in} tok")
+                if stats.first_token.count:
+                    details.append(f"ttft {_format_seconds(stats.first_token.sum / stats.first_token.count)}")
+                if stats.cache_hits:
+                    details.append(f"{stats.cache_hits} cache hit(s)")
+                if stats.errors:
+                    details.append(f"{stats.errors} error(s)")
+                parts.append(part + (f" ({', '.join(details)})" if details else ""))
+        total = self.seconds if self.seconds is not None else time.perf_counter() - self.started
+        return f"📈 {self.name} {_format_seconds(total)} · " + " · ".join(parts) if parts else f"📈 {self.name} {_format_seconds(total)}"
+
+
+def _format_seconds(seconds):
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+_lock = threading.Lock()
+_stages = {}  # stage -> StageStats since process start
+_requests = {}  # request name -> Histogram of whole-request seconds
+_gauges = []  # (name, help, fn returning {label dict as tuple of pairs: value})
+_current = contextvars.ContextVar("trace", default=None)
+
+
+def _finish(span):
+    with _lock:
+        _stages.setdefault(span.stage, StageStats()).add(span)
+    trace = _current.get()
+    if trace is not None:
+        trace.add(span)
+
+
+@contextmanager
+def span(stage, **attributes):
+    """
+    Time one stage of a request ("embedding", "weaviate.fetch", "llm", ...).
+    The yielded Span takes attributes via set(); an exception marks it as an
+    error and propagates.
+    """
+    record = Span(stage, attributes)
+    started = time.perf_counter()
+    try:
+        yield record
+    except GeneratorExit:
+        raise  # a consumer that stops reading a stream early is not a failure
+    except BaseException:
+        record.error = True
+        raise
+    finally:
+        record.seconds = time.perf_counter() - started
+        _finish(record)
+
+
+def traced(stage):
+    """Decorator form of span() for plain functions; list results are counted as objects."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with span(stage) as record:
+                result = fn(*args, **kwargs)
+                if isinstance(result, list):
+                    record.set(objects=len(result))
+                return result
+        return run
+    return wrap
+
+
+@contextmanager
+def activate(trace):
+    """Make trace the current one for spans on this thread or task (and executors that copy the context)."""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def finish(trace):
+    """Close a request's trace: record its duration and print its summary line."""
+    trace.seconds = time.perf_counter() - trace.started
+    with _lock:
+        _requests.setdefault(trace.name, Histogram()).observe(trace.seconds)
+    if TRACE_SUMMARY:
+        print(trace.summary())
+
+
+@contextmanager
+def request(name):
+    """Collect every span of one request into a Trace, summarized when the block exits."""
+    trace = Trace(name)
+    try:
+        with activate(trace):
+            yield trace
+    finally:
+        finish(trace)
+
+
+def submit(pool, fn, *args, **kwargs):
+    """pool.submit() that carries the current trace into the worker thread."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def register_gauge(name, help_text, collect):
+    """Expose collect() -> {(("label", "value"), ...): number} as a gauge on /metrics."""
+    _gauges.append((name, help_text, collect))
+
+
+# ---------- export ----------
+def snapshot():
+    """Per-stage counts, totals and approximate p50/p95/p99 since process start (for serving.metrics())."""
+    with _lock:
+        return {stage: {"count": s.duration.count, "errors": s.errors,
+                        "seconds_total": round(s.duration.sum, 3),
+                        "p50_s": s.duration.quantile(0.5), "p95_s": s.duration.quantile(0.95), "p99_s": s.duration.quantile(0.99),
+                        "cache_hits": s.cache_hits, "cache_misses": s.cache_misses, "bytes": s.bytes, "objects": s.objects,
+                        "tokens_in": s.tokens_in, "tokens_out": s.tokens_out}
+                for stage, s in _stages.items()}
+
+
+def _labels(pairs):
+    return "{" + ",".join(f'{key}="{str(value)}"' for key, value in pairs) + "}" if pairs else ""
+
+
+def _histogram_lines(name, labels, histogram):
+    lines, cumulative = [], 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(labels + (('le', repr(bound)),))} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+    return lines
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f"# HELP {NAMESPACE}_{name} {help_text}")
+        lines.append(f"# TYPE {NAMESPACE}_{name} {kind}")
+        lines.extend(samples)
+
+    with _lock:
+        stages = sorted(_stages.items())
+        requests = sorted(_requests.items())
+        family("stage_duration_seconds", "histogram", "Duration of each request stage.",
+               [line for stage, s in stages for line in _histogram_lines(f"{NAMESPACE}_stage_duration_seconds", (("stage", stage),), s.duration)])
+        family("llm_first_token_seconds", "histogram", "Time from sending an LLM request to its first streamed token.",
+               [line for stage, s in stages if s.first_token.count
+                for line in _histogram_lines(f"{NAMESPACE}_llm_first_token_seconds", (("stage", stage),), s.first_token)])
+        family("request_duration_seconds", "histogram", "Duration of whole requests (CLI run, Gradio handler call).",
+               [line for name, h in requests for line in _histogram_lines(f"{NAMESPACE}_request_duration_seconds", (("request", name),), h)])
+        for metric, attribute, help_text in (
+                ("stage_errors_total", "errors", "Stage calls that raised."),
+                ("stage_cache_hits_total", "cache_hits", "Stage calls served from a cache."),
+                ("stage_cache_misses_total", "cache_misses", "Stage calls that missed a cache."),
+                ("stage_bytes_total", "bytes", "Bytes sent or received by a stage."),
+                ("stage_objects_total", "objects", "Objects returned or written by a stage.")):
+            family(metric, "counter", help_text,
+                   [f"{NAMESPACE}_{metric}{_labels((('stage', stage),))} {getattr(s, attribute)}" for stage, s in stages])
+        family("stage_tokens_total", "counter", "LLM tokens by direction (in = prompt, out = completion).",
+               [f"{NAMESPACE}_stage_tokens_total{_labels((('stage', stage), ('direction', direction)))} {count}"
+                for stage, s in stages for direction, count in (("in", s.tokens_in), ("out", s.tokens_out))
+                if s.tokens_in or s.tokens_out])
+    for name, help_text, collect in _gauges:
+        family(name, "gauge", help_text,
+               [f"{NAMESPACE}_{name}{_labels(labels)} {value}" for labels, value in collect().items()])
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        data = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve /metrics on a daemon thread; returns the server, or None when disabled or the port is taken."""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"⚠️ Metrics endpoint not started on {host}:{port}: {str(e)}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"📊 Prometheus metrics on http://{host}:{port}/metrics")
+    return server
@@ -4,7 +4,19 @@ import os
 def compute_hash(text):
     return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
-def clean_filename(filename):
-    name = os.path.splitext(os.path.basename(filename))[0]
+def _clean_name(name):
     clean = ''.join(c if c.isalnum() else '_' for c in name)
     return f"file_{clean}" if clean[0].isdigit() else clean
+
+def clean_filename(filename):
+    return _clean_name(os.path.splitext(os.path.basename(filename))[0])
+
+def project_file_name(rel_path):
+    """
+    Stored file_name of a project file: its path relative to the .csproj
+    without the extension ("Services\\Helper.cs" -> "Services/Helper"), so
+    same-named files in different folders stay apart. Root files keep their
+    clean_filename.
+    """
+    parts = [part for part in os.path.splitext(rel_path.replace("\\", "/"))[0].split("/") if part not in ("", ".")]
+    return "/".join(_clean_name(part) for part in parts)
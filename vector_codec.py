@@ -0,0 +1,135 @@
+import numpy as np
+
+ENCODINGS = ("float32", "int8", "binary")
+FIT_SAMPLE_ROWS = 20000  # PCA and int8 scales are fitted on at most this many rows
+SCAN_BLOCK_ROWS = 16384  # codes are scored in blocks so decoding never materializes the whole matrix
+INT8_CLIP_PERCENTILE = 99.9
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class VectorCodec:
+    """
+    Compact codes for unit vectors, used to shortlist candidates before exact rescoring.
+
+    An optional PCA projection (fitted on the corpus) keeps the top pca_dim
+    directions of the centered vectors; the result is then stored as
+    float32, int8 (per-dimension scale, clipped at INT8_CLIP_PERCENTILE) or
+    binary (one sign bit per dimension, packed, compared by Hamming distance).
+    Scores are only good for ranking: callers rescore the shortlist with the
+    original float vectors.
+    """
+
+    def __init__(self, encoding="int8", pca_dim=0):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown vector encoding {encoding!r}; expected one of {', '.join(ENCODINGS)}")
+        self.encoding = encoding
+        self.pca_dim = pca_dim
+        self.mean = None
+        self.components = None  # (dim, pca_dim), or None without PCA
+        self.scale = None       # int8 only: (code_dim,)
+        self.fitted_rows = 0  # corpus size at the last fit
+
+    @property
+    def fitted(self):
+        return self.mean is not None
+
+    @property
+    def code_dim(self):
+        return self.components.shape[1] if self.components is not None else len(self.mean)
+
+    def bytes_per_vector(self):
+        if self.encoding == "binary":
+            return (self.code_dim + 7) // 8
+        return self.code_dim * (1 if self.encoding == "int8" else 4)
+
+    def describe(self):
+        name = self.encoding if not self.pca_dim else f"pca{self.pca_dim}+{self.encoding}"
+        return f"{name} ({self.bytes_per_vector()} B/vector)"
+
+    # ---------- fitting ----------
+    def fit(self, vectors, seed=0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.fitted_rows = len(vectors)
+        if len(vectors) > FIT_SAMPLE_ROWS:
+            vectors = vectors[np.random.default_rng(seed).choice(len(vectors), FIT_SAMPLE_ROWS, replace=False)]
+        self.mean = vectors.mean(axis=0)
+        self.components = None
+        if self.pca_dim and self.pca_dim < vectors.shape[1]:
+            # Right singular vectors of the centered sample are the principal directions, strongest first
+            _, _, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+            components = np.zeros((vectors.shape[1], self.pca_dim), dtype=np.float32)
+            components[:, :min(self.pca_dim, len(vt))] = vt[:self.pca_dim].T
+            self.components = components
+        if self.encoding == "int8":
+            projected = self._project(vectors)
+            clip = np.percentile(np.abs(projected), INT8_CLIP_PERCENTILE, axis=0) if len(projected) else np.ones(projected.shape[1])
+            self.scale = (np.maximum(clip, 1e-6) / 127).astype(np.float32)
+        return self
+
+    def _project(self, vectors):
+        centered = np.asarray(vectors, dtype=np.float32) - self.mean
+        return centered @ self.components if self.components is not None else centered
+
+    # ---------- encoding ----------
+    def encode(self, vectors):
+        projected = self._project(np.atleast_2d(vectors))
+        if self.encoding == "int8":
+            return np.clip(np.rint(projected / self.scale), -127, 127).astype(np.int8)
+        if self.encoding == "binary":
+            return np.packbits(projected > 0, axis=1)
+        return projected.astype(np.float32)
+
+    def scores(self, codes, query):
+        """Ranking score of every code row against one query vector (higher is closer)."""
+        projected = self._project(query[None, :])[0]
+        if self.encoding == "binary":
+            bits = np.packbits(projected > 0)
+        elif self.encoding == "int8":
+            projected = projected * self.scale
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+            block = codes[start:start + SCAN_BLOCK_ROWS]
+            if self.encoding == "binary":
+                scores[start:start + len(block)] = -_POPCOUNT[np.bitwise_xor(block, bits)].sum(axis=1, dtype=np.int32)
+            else:
+                scores[start:start + len(block)] = block.astype(np.float32) @ projected
+        return scores
+
+    def shortlist(self, codes, query, size):
+        """Row indices of the `size` best codes for query, best first."""
+        scores = self.scores(codes, np.asarray(query, dtype=np.float32))
+        size = min(size, len(scores))
+        if size == 0:
+            return np.zeros(0, dtype=np.int64)
+        best = np.argpartition(-scores, size - 1)[:size]
+        return best[np.argsort(-scores[best], kind="stable")]
+
+    # ---------- persistence ----------
+    def save(self, path):
+        arrays = {"mean": self.mean, "fitted_rows": np.array(self.fitted_rows)}
+        if self.components is not None:
+            arrays["components"] = self.components
+        if self.scale is not None:
+            arrays["scale"] = self.scale
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path, encoding, pca_dim):
+        """The codec saved at path if it was fitted with the same settings, else an unfitted one."""
+        codec = cls(encoding, pca_dim)
+        try:
+            with np.load(path) as saved:
+                components = saved["components"] if "components" in saved else None
+                if (components.shape[1] if components is not None else 0) != (pca_dim if pca_dim < len(saved["mean"]) else 0):
+                    return codec
+                if encoding == "int8" and "scale" not in saved:
+                    return codec
+                codec.mean = saved["mean"]
+                codec.components = components
+                codec.scale = saved["scale"] if encoding == "int8" else None
+                codec.fitted_rows = int(saved["fitted_rows"])
+        except (OSError, KeyError, ValueError):
+            pass
+        return codec
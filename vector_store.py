@@ -0,0 +1,503 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+import tracing
+
+VECTOR_STORE = os.getenv("VECTOR_STORE", "weaviate")  # "weaviate" or "embedded"
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".vector_store"))
+FETCH_PAGE_SIZE = 1000
+# Weaviate's QUERY_MAXIMUM_RESULTS: offset + limit of one query may not pass it
+QUERY_MAXIMUM_RESULTS = int(os.getenv("WEAVIATE_QUERY_MAXIMUM_RESULTS", "10000"))
+WRITE_BATCH_SIZE = 200
+
+
+class ResultMetadata:
+    __slots__ = ("distance", "score")
+
+    def __init__(self, distance=None, score=None):
+        self.distance = distance
+        self.score = score
+
+
+class ResultObject:
+    """Same shape as a Weaviate query result object: uuid, properties, vector, metadata.distance."""
+    __slots__ = ("uuid", "properties", "vector", "metadata")
+
+    def __init__(self, uuid, properties, vector=None, distance=None, score=None):
+        self.uuid = uuid
+        self.properties = properties
+        self.vector = {"default": vector} if vector is not None else {}
+        self.metadata = ResultMetadata(distance, score)
+
+
+def where_matches(properties, where):
+    """where is {property: value} or {property: [values]}; all entries must match."""
+    for key, expected in where.items():
+        value = properties.get(key)
+        if isinstance(expected, (list, tuple, set)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class VectorStore(ABC):
+    """
+    The storage operations the agent needs, independent of the backend.
+
+    Filters are plain dicts in the where_matches format; results are
+    ResultObject-shaped (Weaviate's own objects for the Weaviate backend).
+    Property types for create_collection are "text", "int" or "key" (text
+    matched as a whole: file names, hashes and ids used in filters).
+    """
+
+    @abstractmethod
+    def list_collections(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_collection(self, name, properties, vectorized_property=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert(self, name, uuid, properties, vector=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert(self, name, objects):
+        """objects: iterable of (uuid, properties, vector). Returns [(uuid, error message)] for failures."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetch_by_ids(self, name, uuids, include_vector=False):
+        raise NotImplementedError
+
+    def fetch_by_id(self, name, uuid, include_vector=False):
+        objects = self.fetch_by_ids(name, [uuid], include_vector=include_vector)
+        return objects[0] if objects else None
+
+    @abstractmethod
+    def fetch(self, name, where=None, return_properties=None, include_vector=False, limit=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_many(self, name, where):
+        """Delete every object matching where; returns the number deleted."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_ids(self, name, uuids):
+        raise NotImplementedError
+
+    @abstractmethod
+    def near_vector(self, name, vector, top_k=5, where=None, include_vector=False):
+        raise NotImplementedError
+
+    @abstractmethod
+    def hybrid(self, name, query, vector, alpha=0.5, top_k=5, where=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class WeaviateStore(VectorStore):
+    """
+    VectorStore over a connected Weaviate v4 client.
+
+    Text filters on word-tokenized properties match any value containing the
+    same words ("Helper" also matches "Services/Helper"), so filtered results
+    are narrowed to exact matches here. Collections created with "key"
+    properties are field-tokenized and exact already.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def _exact(objects, where):
+        return [obj for obj in objects if where_matches(obj.properties, where)] if where else objects
+
+    def _filter(self, where):
+        from weaviate.classes.query import Filter
+
+        clauses = []
+        for key, expected in (where or {}).items():
+            if isinstance(expected, (list, tuple, set)):
+                # equal() per value: contains_any would tokenize text properties
+                options = [Filter.by_property(key).equal(value) for value in expected]
+                clauses.append(options[0] if len(options) == 1 else Filter.any_of(options))
+            else:
+                clauses.append(Filter.by_property(key).equal(expected))
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else Filter.all_of(clauses)
+
+    @tracing.traced("weaviate.list_collections")
+    def list_collections(self):
+        return set(self.client.collections.list_all(simple=True))
+
+    @tracing.traced("weaviate.create_collection")
+    def create_collection(self, name, properties, vectorized_property=None):
+        from weaviate.classes.config import Configure, DataType, Property, Tokenization
+
+        types = {"text": DataType.TEXT, "key": DataType.TEXT, "int": DataType.INT}
+        self.client.collections.create(
+            name=name,
+            vectorizer_config=Configure.Vectorizer.text2vec_weaviate(),
+            properties=[
+                Property(name=prop, data_type=types[kind], vectorizePropertyName=(prop == vectorized_property),
+                         tokenization=Tokenization.FIELD if kind == "key" else None)
+                for prop, kind in properties
+            ]
+        )
+
+    @tracing.traced("weaviate.insert")
+    def insert(self, name, uuid, properties, vector=None):
+        self.client.collections.get(name).data.insert(uuid=uuid, properties=properties, vector=vector)
+
+    @tracing.traced("weaviate.upsert")
+    def upsert(self, name, objects):
+        collection = self.client.collections.get(name)
+        with collection.batch.fixed_size(batch_size=WRITE_BATCH_SIZE) as batch:
+            for uuid, properties, vector in objects:
+                batch.add_object(properties=properties, uuid=uuid,
+                                 vector=vector.tolist() if isinstance(vector, np.ndarray) else vector)
+        return [(failed.object_.uuid, failed.message) for failed in collection.batch.failed_objects]
+
+    @tracing.traced("weaviate.fetch_by_ids")
+    def fetch_by_ids(self, name, uuids, include_vector=False):
+        from weaviate.classes.query import Filter
+
+        uuids = [str(u) for u in uuids]
+        if not uuids:
+            return []
+        if len(uuids) == 1:
+            obj = self.client.collections.get(name).query.fetch_object_by_id(uuids[0], include_vector=include_vector)
+            return [obj] if obj else []
+        result = self.client.collections.get(name).query.fetch_objects(
+            filters=Filter.by_id().contains_any(uuids), include_vector=include_vector, limit=len(uuids)
+        )
+        return result.objects
+
+    @tracing.traced("weaviate.fetch")
+    def fetch(self, name, where=None, return_properties=None, include_vector=False, limit=None):
+        """
+        Whole-collection listings page with the cursor API, which has no result
+        cap. Cursors cannot be filtered, so filtered fetches page by offset and
+        fall back to a filtered cursor scan if they would pass QUERY_MAXIMUM_RESULTS.
+        """
+        collection = self.client.collections.get(name)
+        if not where:
+            return self._scan(collection, None, return_properties, include_vector, limit)
+        filters = self._filter(where)
+        if return_properties is not None:
+            return_properties = list(dict.fromkeys(list(return_properties) + list(where)))
+        objects = []
+        offset = 0
+        while True:
+            page_size = FETCH_PAGE_SIZE if limit is None else min(FETCH_PAGE_SIZE, limit - len(objects))
+            if offset + page_size > QUERY_MAXIMUM_RESULTS:
+                print(f"⚠️ {name}: filtered fetch passes {QUERY_MAXIMUM_RESULTS} results, scanning the collection instead")
+                return self._scan(collection, where, return_properties, include_vector, limit)
+            page = collection.query.fetch_objects(
+                filters=filters, limit=page_size, offset=offset,
+                return_properties=return_properties, include_vector=include_vector
+            )
+            objects.extend(page.objects)
+            if len(page.objects) < page_size or (limit is not None and len(objects) >= limit):
+                return self._exact(objects, where)
+            offset += page_size
+
+    @staticmethod
+    def _scan(collection, where, return_properties, include_vector, limit):
+        """Every object via collection.iterator() (cursor on the object id), filtered here by where_matches."""
+        if where and return_properties is not None:
+            return_properties = list(dict.fromkeys(list(return_properties) + list(where)))
+        objects = []
+        for obj in collection.iterator(include_vector=include_vector, return_properties=return_properties,
+                                       cache_size=FETCH_PAGE_SIZE):
+            if where and not where_matches(obj.properties, where):
+                continue
+            objects.append(obj)
+            if limit is not None and len(objects) >= limit:
+                break
+        return objects
+
+    @tracing.traced("weaviate.delete_many")
+    def delete_many(self, name, where):
+        # The ids of exact matches first: a word-tokenized filter could delete other files' objects
+        return self.delete_ids(name, [obj.uuid for obj in self.fetch(name, where, return_properties=list(where))])
+
+    @tracing.traced("weaviate.delete_ids")
+    def delete_ids(self, name, uuids):
+        from weaviate.classes.query import Filter
+
+        uuids = [str(u) for u in uuids]
+        collection = self.client.collections.get(name)
+        deleted = 0
+        for start in range(0, len(uuids), FETCH_PAGE_SIZE):
+            deleted += collection.data.delete_many(where=Filter.by_id().contains_any(uuids[start:start + FETCH_PAGE_SIZE])).matches
+        return deleted
+
+    @tracing.traced("weaviate.near_vector")
+    def near_vector(self, name, vector, top_k=5, where=None, include_vector=False):
+        from weaviate.classes.query import MetadataQuery
+
+        return self._exact(self.client.collections.get(name).query.near_vector(
+            near_vector=vector, limit=top_k, filters=self._filter(where),
+            include_vector=include_vector, return_metadata=MetadataQuery(distance=True)
+        ).objects, where)
+
+    @tracing.traced("weaviate.hybrid")
+    def hybrid(self, name, query, vector, alpha=0.5, top_k=5, where=None):
+        from weaviate.classes.query import MetadataQuery
+
+        return self._exact(self.client.collections.get(name).query.hybrid(
+            query=query, vector=vector, alpha=alpha, limit=top_k, filters=self._filter(where),
+            return_metadata=MetadataQuery(distance=True, score=True)
+        ).objects, where)
+
+    def close(self):
+        self.client.close()
+
+
+def _tokens(text):
+    return re.findall(r"[A-Za-z_][A-Za-z0-9_]*", text.lower())
+
+
+class EmbeddedStore(VectorStore):
+    """
+    Single-box VectorStore: properties in SQLite, vectors in one memory-mapped
+    float32 file per collection.
+
+    Each object owns a fixed row of its collection's vector file; deleted rows
+    are reused by later inserts. Search is an exact cosine scan over the live
+    rows, which are cached in memory between writes. Nothing leaves the
+    process, so it needs no credentials and has no network latency.
+    """
+
+    def __init__(self, directory=VECTOR_STORE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(directory, "store.db"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS collections (name TEXT PRIMARY KEY, schema TEXT, dim INTEGER);
+            CREATE TABLE IF NOT EXISTS objects (
+                collection TEXT, uuid TEXT, row INTEGER, properties TEXT,
+                PRIMARY KEY (collection, uuid)
+            );
+            CREATE INDEX IF NOT EXISTS objects_row ON objects (collection, row);
+        """)
+        self._vectors = {}  # name -> np.memmap
+        self._live = {}  # name -> (rows, uuids, properties, normalized vectors), dropped on write
+
+    # ---------- vectors ----------
+    def _vector_path(self, name):
+        return os.path.join(self.directory, f"{name}.f32")
+
+    def _dim(self, name):
+        row = self._db.execute("SELECT dim FROM collections WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise ValueError(f"❌ Collection {name} does not exist")
+        return row[0]
+
+    def _matrix(self, name, min_rows=0):
+        dim = self._dim(name)
+        if not dim:
+            return None
+        matrix = self._vectors.get(name)
+        if matrix is None or len(matrix) < min_rows:
+            path = self._vector_path(name)
+            rows = os.path.getsize(path) // (4 * dim) if os.path.exists(path) else 0
+            if rows < min_rows:
+                rows = max(min_rows, 2 * rows, 1024)
+                with open(path, "ab") as f:
+                    f.truncate(rows * dim * 4)
+            matrix = np.memmap(path, dtype=np.float32, mode="r+", shape=(rows, dim))
+            self._vectors[name] = matrix
+        return matrix
+
+    def _free_rows(self, name, count):
+        used = {r for (r,) in self._db.execute("SELECT row FROM objects WHERE collection = ?", (name,))}
+        rows, candidate = [], 0
+        while len(rows) < count:
+            if candidate not in used:
+                rows.append(candidate)
+            candidate += 1
+        return rows
+
+    # ---------- schema ----------
+    @tracing.traced("embedded_store.list_collections")
+    def list_collections(self):
+        return {name for (name,) in self._db.execute("SELECT name FROM collections")}
+
+    @tracing.traced("embedded_store.create_collection")
+    def create_collection(self, name, properties, vectorized_property=None):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO collections VALUES (?, ?, 0)",
+                             (name, json.dumps({"properties": properties, "vectorized": vectorized_property})))
+
+    # ---------- writes ----------
+    @tracing.traced("embedded_store.insert")
+    def insert(self, name, uuid, properties, vector=None):
+        failed = self.upsert(name, [(uuid, properties, vector)])
+        if failed:
+            raise ValueError(failed[0][1])
+
+    @tracing.traced("embedded_store.upsert")
+    def upsert(self, name, objects):
+        objects = [(str(uuid), properties, vector) for uuid, properties, vector in objects]
+        failed = [(uuid, "embedded store needs a vector (manual embedding)") for uuid, _, vector in objects if vector is None]
+        objects = [o for o in objects if o[2] is not None]
+        if not objects:
+            return failed
+        with self._lock, self._db:
+            dim = self._dim(name)
+            if not dim:
+                dim = len(objects[0][2])
+                self._db.execute("UPDATE collections SET dim = ? WHERE name = ?", (dim, name))
+
+            existing = dict(self._db.execute(
+                f"SELECT uuid, row FROM objects WHERE collection = ? AND uuid IN ({','.join('?' * len(objects))})",
+                [name] + [uuid for uuid, _, _ in objects]
+            ).fetchall()) if len(objects) <= 900 else dict(
+                self._db.execute("SELECT uuid, row FROM objects WHERE collection = ?", (name,)).fetchall()
+            )
+            new_uuids = list(dict.fromkeys(uuid for uuid, _, _ in objects if uuid not in existing))
+            existing.update(zip(new_uuids, self._free_rows(name, len(new_uuids))))
+
+            matrix = self._matrix(name, min_rows=max(existing.values()) + 1)
+            for uuid, properties, vector in objects:
+                matrix[existing[uuid]] = np.asarray(vector, dtype=np.float32)
+            matrix.flush()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO objects (collection, uuid, row, properties) VALUES (?, ?, ?, ?)",
+                [(name, uuid, existing[uuid], json.dumps(properties)) for uuid, properties, _ in objects]
+            )
+            self._live.pop(name, None)
+        return failed
+
+    @tracing.traced("embedded_store.delete_many")
+    def delete_many(self, name, where):
+        with self._lock:
+            rows, uuids, properties, _ = self._live_rows(name)
+            return self.delete_ids(name, [uuid for uuid, props in zip(uuids, properties) if where_matches(props, where)])
+
+    @tracing.traced("embedded_store.delete_ids")
+    def delete_ids(self, name, uuids):
+        uuids = [str(u) for u in uuids]
+        if not uuids:
+            return 0
+        with self._lock, self._db:
+            deleted = self._db.executemany("DELETE FROM objects WHERE collection = ? AND uuid = ?",
+                                           [(name, uuid) for uuid in uuids]).rowcount
+            self._live.pop(name, None)
+        return deleted
+
+    # ---------- reads ----------
+    def _live_rows(self, name):
+        with self._lock:
+            if name not in self._live:
+                records = self._db.execute("SELECT row, uuid, properties FROM objects WHERE collection = ? ORDER BY row",
+                                           (name,)).fetchall()
+                rows = np.array([r for r, _, _ in records], dtype=np.int64)
+                vectors = np.array(self._matrix(name)[rows]) if len(rows) else np.zeros((0, 0), dtype=np.float32)
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                self._live[name] = (rows, [u for _, u, _ in records], [json.loads(p) for _, _, p in records], vectors)
+            return self._live[name]
+
+    def _result(self, name, row, uuid, properties, return_properties=None, include_vector=False, distance=None, score=None):
+        if return_properties is not None:
+            properties = {key: properties.get(key) for key in return_properties}
+        vector = self._matrix(name)[row].tolist() if include_vector else None
+        return ResultObject(uuid, dict(properties), vector, distance, score)
+
+    @tracing.traced("embedded_store.fetch_by_ids")
+    def fetch_by_ids(self, name, uuids, include_vector=False):
+        wanted = {str(u) for u in uuids}
+        rows, live_uuids, properties, _ = self._live_rows(name)
+        return [self._result(name, row, uuid, props, include_vector=include_vector)
+                for row, uuid, props in zip(rows, live_uuids, properties) if uuid in wanted]
+
+    @tracing.traced("embedded_store.fetch")
+    def fetch(self, name, where=None, return_properties=None, include_vector=False, limit=None):
+        rows, uuids, properties, _ = self._live_rows(name)
+        results = []
+        for row, uuid, props in zip(rows, uuids, properties):
+            if where is None or where_matches(props, where):
+                results.append(self._result(name, row, uuid, props, return_properties, include_vector))
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+    def _similarities(self, name, vector, where):
+        rows, uuids, properties, vectors = self._live_rows(name)
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        if not where:
+            return np.arange(len(rows)), vectors @ query if len(rows) else np.zeros(0, dtype=np.float32)
+        candidates = np.array([i for i, props in enumerate(properties) if where_matches(props, where)], dtype=np.int64)
+        if candidates.size == 0:
+            return candidates, np.zeros(0, dtype=np.float32)
+        return candidates, vectors[candidates] @ query
+
+    @tracing.traced("embedded_store.near_vector")
+    def near_vector(self, name, vector, top_k=5, where=None, include_vector=False):
+        with self._lock:
+            candidates, scores = self._similarities(name, vector, where)
+            if candidates.size == 0:
+                return []
+            k = min(top_k, len(candidates))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            rows, uuids, properties, _ = self._live_rows(name)
+            return [self._result(name, rows[candidates[i]], uuids[candidates[i]], properties[candidates[i]],
+                                 include_vector=include_vector, distance=1.0 - float(scores[i]))
+                    for i in best]
+
+    @tracing.traced("embedded_store.hybrid")
+    def hybrid(self, name, query, vector, alpha=0.5, top_k=5, where=None):
+        """Relative-score fusion of cosine similarity and query-term overlap in the text properties."""
+        with self._lock:
+            candidates, scores = self._similarities(name, vector, where)
+            if candidates.size == 0:
+                return []
+            rows, uuids, properties, _ = self._live_rows(name)
+            terms = set(_tokens(query or ""))
+            keyword = np.array([
+                len(terms & set(_tokens(" ".join(str(v) for v in properties[i].values() if isinstance(v, str)))))
+                for i in candidates
+            ], dtype=np.float32)
+
+            def _normalized(values):
+                spread = values.max() - values.min()
+                return (values - values.min()) / spread if spread > 0 else np.zeros_like(values)
+
+            fused = alpha * _normalized(scores) + (1 - alpha) * _normalized(keyword)
+            best = np.argsort(-fused)[:top_k]
+            return [self._result(name, rows[candidates[i]], uuids[candidates[i]], properties[candidates[i]],
+                                 distance=1.0 - float(scores[i]), score=float(fused[i]))
+                    for i in best]
+
+    def close(self):
+        with self._lock:
+            for matrix in self._vectors.values():
+                matrix.flush()
+            self._vectors.clear()
+            self._db.close()
+
+
+def as_store(client):
+    """Accept either a VectorStore or a raw Weaviate client (older call sites)."""
+    return client if isinstance(client, VectorStore) else WeaviateStore(client)
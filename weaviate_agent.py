@@ -1,6 +1,11 @@
 import os
+import glob
+from fnmatch import fnmatch
 from lxml import etree
-from utils import clean_filename
+from utils import project_file_name
+
+# MSBuild's DefaultItemExcludes for SDK-style projects
+DEFAULT_EXCLUDES = ("bin/**", "obj/**", "**/.*/**")
 
 def get_cs_files_from_csproj(csproj_path, target_filenames):
     if not os.path.exists(csproj_path):
@@ -25,6 +30,60 @@ def get_cs_files_from_csproj(csproj_path, target_filenames):
                     cs_files.append(file_path)
     return cs_files
 
+def _msbuild_match(rel_path, pattern):
+    pattern = pattern.replace("\\", "/")
+    return fnmatch(rel_path, pattern) or fnmatch(rel_path, pattern.replace("**/", ""))
+
+def _expand_include(csproj_dir, include):
+    """Expand one Compile Include value (may hold ';'-separated wildcards) to paths relative to csproj_dir."""
+    paths = []
+    for part in filter(None, (p.strip() for p in include.split(";"))):
+        part = part.replace("\\", "/")
+        if any(c in part for c in "*?"):
+            matches = glob.glob(os.path.join(csproj_dir, part), recursive=True)
+            paths.extend(os.path.relpath(m, csproj_dir).replace(os.sep, "/") for m in sorted(matches))
+        else:
+            paths.append(part)
+    return paths
+
+def get_all_cs_files_from_csproj(csproj_path):
+    """
+    Every Compile item of a project, relative to the .csproj directory (forward slashes).
+
+    Handles classic projects (explicit <Compile Include>) and SDK-style
+    projects, whose implicit **/*.cs glob (minus bin/, obj/ and hidden folders)
+    applies unless EnableDefaultCompileItems is false. <Compile Remove> is honoured.
+    """
+    if not os.path.exists(csproj_path):
+        print(f"❌ Project file not found at: {csproj_path}")
+        return []
+
+    csproj_dir = os.path.dirname(os.path.abspath(csproj_path))
+    root = etree.parse(csproj_path).getroot()
+    ns = {'ns': root.tag.split('}')[0].strip('{')} if '}' in root.tag else {}
+    prefix = "ns:" if ns else ""
+
+    includes, removes = [], []
+    for compile_item in root.findall(f".//{prefix}ItemGroup/{prefix}Compile", ns):
+        if 'Include' in compile_item.attrib:
+            includes.extend(_expand_include(csproj_dir, compile_item.attrib['Include']))
+        if 'Remove' in compile_item.attrib:
+            removes.extend(p.strip() for p in compile_item.attrib['Remove'].split(";") if p.strip())
+
+    is_sdk_style = root.get("Sdk") is not None or root.find(f"{prefix}Sdk", ns) is not None
+    default_items = root.findtext(f".//{prefix}PropertyGroup/{prefix}EnableDefaultCompileItems", default="true", namespaces=ns)
+    cs_files = []
+    if is_sdk_style and default_items.strip().lower() != "false":
+        for path in sorted(glob.glob(os.path.join(csproj_dir, "**", "*.cs"), recursive=True)):
+            rel_path = os.path.relpath(path, csproj_dir).replace(os.sep, "/")
+            if not any(_msbuild_match(rel_path, pattern) for pattern in DEFAULT_EXCLUDES):
+                cs_files.append(rel_path)
+
+    for path in includes:
+        if path not in cs_files:
+            cs_files.append(path)
+    return [p for p in cs_files if not any(_msbuild_match(p, pattern) for pattern in removes)]
+
 def read_cs_files(csproj_dir, cs_files):
     code_snippets = {}
     for cs_file in cs_files:
@@ -32,7 +91,7 @@ def read_cs_files(csproj_dir, cs_files):
         if os.path.exists(file_path):
             with open(file_path, "r", encoding="utf-8") as f:
                 content = f.read().strip()
-                clean_name = clean_filename(cs_file)
+                clean_name = project_file_name(cs_file)
                 code_snippets[clean_name] = {
                     "original_path": cs_file,
                     "content": content
@@ -1,15 +1,28 @@
 import os
 import uuid
+import numpy as np
 import requests
 import weaviate
 from dotenv import load_dotenv
 from weaviate.classes.init import Auth
-from weaviate.classes.query import Filter, MetadataQuery
-from weaviate.classes.config import Property, Configure, DataType
+from weaviate.util import generate_uuid5
 from utils import compute_hash
+from cs_chunker import chunk_cs_source
+from doc_chunker import chunk_document
+from embedding_pool import embed_parallel
+from write_behind import WriteBehindQueue
+from local_index import get_local_index
+from keyword_index import RRF_K, get_keyword_index, reciprocal_rank_fusion, symbols
+from vector_store import VECTOR_STORE, EmbeddedStore, ResultObject, WeaviateStore, as_store
+import retrieval_cache
+import tracing
+import response_cache
+import llm_provider
+from serving import blocking_executor
+from context_packer import count_tokens, pack_context
 import time
-from openai import OpenAI
-from ollama_config import get_embedding  # import here to avoid circular imports
+from concurrent.futures import ThreadPoolExecutor
+from ollama_config import get_embedding, get_embeddings, DEFAULT_BATCH_SIZE  # import here to avoid circular imports
 # from weaviate.classes.query import Filter  
 # from weaviate.collections.classes.filters import Filter, WhereFilter
 # from weaviate.collections.classes.filters import Filter as CollectionFilter, WhereFilter # Collection hybrid filters
@@ -20,6 +33,9 @@ load_dotenv(env_path)
 
 USE_MANUAL_EMBEDDING = True  # Set to False to use Weaviate's default
 
+# UserCodeEmbeddings inserts happen off the request path (see store_user_embedding_with_vector)
+user_code_writes = WriteBehindQueue("user-code-writes")
+
 
 def get_weaviate_client():
     url = os.getenv("WEAVIATE_URL")
@@ -33,43 +49,40 @@ def get_weaviate_client():
         auth_credentials=Auth.api_key(key),
     )
 
-    for name in ["FXCodeEmbedding", "UserCodeEmbeddings", "SnippetCodeEmbeddings","FunctionDocsEmbedding"]:
-        if not client.collections.exists(name):
-
-            if name == "FXCodeEmbedding":
-                properties=[
-                    Property(name="code", data_type=DataType.TEXT, vectorizePropertyName=True),
-                    Property(name="file_name", data_type=DataType.TEXT, vectorizePropertyName=False),
-                    Property(name="code_hash", data_type=DataType.TEXT, vectorizePropertyName=False)
-                ]
-            elif name == "SnippetCodeEmbeddings":
-                properties=[
-                    Property(name="code", data_type=DataType.TEXT, vectorizePropertyName=True),
-                    Property(name="file_name", data_type=DataType.TEXT, vectorizePropertyName=False)
-                ]
-            elif name == "UserCodeEmbeddings":
-                properties=[
-                    Property(name="code", data_type=DataType.TEXT, vectorizePropertyName=True),
-                    Property(name="code_id", data_type=DataType.TEXT, vectorizePropertyName=False)
-                ]
-            elif name == "FunctionDocsEmbedding":
-                properties=[
-                    Property(name="text", data_type=DataType.TEXT, vectorizePropertyName=True),
-                    Property(name="file_name", data_type=DataType.TEXT, vectorizePropertyName=False),
-                    Property(name="code_hash", data_type=DataType.TEXT, vectorizePropertyName=False),
-                    Property(name="code_id", data_type=DataType.TEXT, vectorizePropertyName=False),
-                    Property(name="user_name", data_type=DataType.TEXT, vectorizePropertyName=False),
-
-                ]
-
-            client.collections.create(
-                name=name,
-                vectorizer_config=Configure.Vectorizer.text2vec_weaviate(),
-                properties=properties
-            )
-
+    ensure_schema(WeaviateStore(client))
     return client
 
+# Properties per collection as (name, type); the first one is the vectorized text.
+# "key" properties are filtered on and must match whole values (see WeaviateStore)
+SCHEMA = {
+    "FXCodeEmbedding": [("code", "text"), ("file_name", "key"), ("code_hash", "key"), ("symbol_path", "text"),
+                        ("start_line", "int"), ("end_line", "int"), ("chunk_index", "int")],
+    "UserCodeEmbeddings": [("code", "text"), ("code_id", "key")],
+    "SnippetCodeEmbeddings": [("code", "text"), ("file_name", "key")],
+    "FunctionDocsEmbedding": [("text", "text"), ("file_name", "key"), ("code_hash", "key"),
+                              ("code_id", "key"), ("user_name", "key"), ("section", "text"),
+                              ("start_line", "int"), ("end_line", "int"), ("chunk_index", "int")],
+}
+
+def ensure_schema(store):
+    # One round trip for the schema instead of an exists() call per collection
+    existing = store.list_collections()
+    for name, properties in SCHEMA.items():
+        if name not in existing:
+            store.create_collection(name, properties, vectorized_property=properties[0][0])
+
+def get_vector_store():
+    """
+    The VectorStore selected by VECTOR_STORE: "weaviate" (default, Weaviate
+    Cloud from weaviate_creds.env) or "embedded" (SQLite + memory-mapped
+    vectors in VECTOR_STORE_DIR, no network or credentials needed).
+    """
+    if VECTOR_STORE == "embedded":
+        store = EmbeddedStore()
+        ensure_schema(store)
+        return store
+    return WeaviateStore(get_weaviate_client())
+
 def store_framework_embedding(client, file_name, code_str, tablename,user_name=None):
     if tablename == "FunctionDocsEmbedding":
         return_state,code_id = store_document_embedding(client, file_name, code_str, tablename,user_name)
@@ -98,7 +111,7 @@ def store_framework_embedding(client, file_name, code_str, tablename,user_name=N
 #     return code_id
 
 def store_user_embedding(client, code_str):    
-    collection = client.collections.get("UserCodeEmbeddings")
+    store = as_store(client)
     code_id = str(uuid.uuid4())
 
     properties = {
@@ -109,153 +122,401 @@ def store_user_embedding(client, code_str):
 
     if USE_MANUAL_EMBEDDING:
         vector = get_embedding(code_str).tolist()
-        collection.data.insert(uuid=code_id, properties=properties, vector=vector)
+        store.insert("UserCodeEmbeddings", code_id, properties, vector)
         print(f"✅inside manual embedding")
     else:
-        collection.data.insert(uuid=code_id, properties=properties)
+        store.insert("UserCodeEmbeddings", code_id, properties)
         print(f"✅inside weaviate embedding")
-    time.sleep(2)  # Optional: give Weaviate time to vectorize if using automatic
+        with tracing.span("weaviate.vectorize_wait"):
+            time.sleep(2)  # Optional: give Weaviate time to vectorize if using automatic
     
-    result = collection.query.fetch_object_by_id(code_id, include_vector=True)
+    result = store.fetch_by_id("UserCodeEmbeddings", code_id, include_vector=True)
     if not result or not result.vector:
         raise ValueError("❌ Vector not generated for user code")
 
     print(f"✅ Stored user code with ID: {code_id}")
     return code_id
 
+def store_user_embedding_with_vector(client, code_str):
+    """
+    Embed the user's code locally and return (code_id, vector) immediately.
+
+    The UserCodeEmbeddings insert is queued on user_code_writes (flushed at
+    shutdown), so retrieval can start as soon as the vector exists. Without
+    manual embedding Weaviate has to vectorize, so this falls back to
+    store_user_embedding and reads the vector back.
+    """
+    if not USE_MANUAL_EMBEDDING:
+        code_id = store_user_embedding(client, code_str)
+        return code_id, get_user_vector(client, code_id)['default']
+
+    code_id = str(uuid.uuid4())
+    vector = get_embedding(code_str).tolist()
+    properties = {
+        "code": code_str,
+        "code_id": code_id,
+        "embedding_source": "Hugging Face"
+    }
+    user_code_writes.submit(as_store(client).insert, "UserCodeEmbeddings", code_id, properties, vector)
+    print(f"✅ Embedded user code {code_id}; store queued")
+    return code_id, vector
+
 def get_user_vector(client, code_id):
-    collection = client.collections.get("UserCodeEmbeddings")
+    store = as_store(client)
 
-    result = collection.query.fetch_object_by_id(code_id, include_vector=True)
+    result = store.fetch_by_id("UserCodeEmbeddings", code_id, include_vector=True)
     
     if result and result.vector:
         print(f"✅ Retrieved vector for user code ID {code_id}")
         return result.vector
     else:
         print(f"⚠️ Vector not found for ID {code_id}. Trying again in 4 seconds...")
-        time.sleep(4)
-        result = collection.query.fetch_object_by_id(code_id, include_vector=True)
+        with tracing.span("weaviate.vectorize_wait"):
+            time.sleep(4)
+        result = store.fetch_by_id("UserCodeEmbeddings", code_id, include_vector=True)
         if result and result.vector:
             print(f"✅ Vector found on retry for ID {code_id}")
             return result.vector
 
     raise ValueError(f"❌ User vector still empty after retry for code ID: {code_id}")
 
-# def _store_embedding(client, file_name, code_str, collection_name):
-#     collection = client.collections.get(collection_name)
-#     code_hash = compute_hash(code_str)
-
-#     result = collection.query.fetch_objects(
-#         filters=Filter.by_property("file_name").equal(file_name)
-#     )
-
-#     if result.objects:
-#         obj = result.objects[0]
-#         if obj.properties.get("code_hash") == code_hash:
-#             print(f"🟡 {file_name} unchanged. Skipping.")
-#             return
-#         else:
-#             print(f"🟠 {file_name} changed. Updating.")
-#             collection.data.delete_many(where=Filter.by_property("file_name").equal(file_name))
-
-#     properties = {
-#         "file_name": file_name,
-#         "code": code_str,
-#         "code_hash": code_hash
-#     }
-#     collection.data.insert(properties=properties)
-#     print(f"✅ {file_name} stored in {collection_name}.")
-
 def _store_embedding(client, file_name, code_str, collection_name):
-    collection = client.collections.get(collection_name)
-    code_hash = compute_hash(code_str)
-
-    result = collection.query.fetch_objects(
-        filters=Filter.by_property("file_name").equal(file_name)
-    )
+    """One file through store_framework_embeddings; returns "new", "changed" or "unchanged"."""
+    result_state = store_framework_embeddings(client, {file_name: code_str}, collection_name)[file_name]
+    if result_state == "error":
+        raise ValueError(f"❌ Failed to store {file_name} in {collection_name}")
+    return result_state
 
-    if result.objects:
-        obj = result.objects[0]
-        if obj.properties.get("code_hash") == code_hash:
+def split_code_chunks(code_str):
+    """Split a C# file into method-level chunks; falls back to the whole file when nothing parses."""
+    chunks = chunk_cs_source(code_str)
+    if not chunks:
+        chunks = [{"symbol_path": "", "signature": "", "start_line": 1,
+                   "end_line": code_str.count("\n") + 1, "code": code_str}]
+    return chunks
+
+FILTER_BATCH_SIZE = 100  # file names per OR filter, keeps each request small
+
+def chunk_uuid(file_name, chunk_index):
+    """Deterministic object id, so re-storing a file overwrites its chunks in place (upsert)."""
+    return generate_uuid5(f"{file_name}#{chunk_index}")
+
+def fetch_by_file_names(store, collection_name, file_names, return_properties=None):
+    """All objects whose file_name is in file_names: one OR-filtered query per FILTER_BATCH_SIZE names."""
+    store = as_store(store)
+    file_names = list(file_names)
+    objects = []
+    for start in range(0, len(file_names), FILTER_BATCH_SIZE):
+        objects.extend(store.fetch(collection_name, where={"file_name": file_names[start:start + FILTER_BATCH_SIZE]},
+                                   return_properties=return_properties))
+    return objects
+
+def delete_by_file_names(store, collection_name, file_names):
+    """Delete every object of the given files; returns the number of objects deleted."""
+    store = as_store(store)
+    file_names = list(file_names)
+    deleted = 0
+    for start in range(0, len(file_names), FILTER_BATCH_SIZE):
+        deleted += store.delete_many(collection_name, {"file_name": file_names[start:start + FILTER_BATCH_SIZE]})
+    if deleted:
+        retrieval_cache.invalidate_collection(collection_name)
+    local = get_local_index(collection_name)
+    if local is not None and file_names:
+        local.delete_where({"file_name": file_names})
+        local.save()
+    keywords = get_keyword_index(collection_name)
+    if keywords is not None and file_names:
+        keywords.delete_where({"file_name": file_names})
+        keywords.save()
+    return deleted
+
+def store_framework_embeddings(client, snippets, collection_name="FXCodeEmbedding", batch_size=DEFAULT_BATCH_SIZE, workers=1):
+    """
+    Bulk version of _store_embedding for a {file_name: code} dict.
+
+    Existing hashes for all files come back from one OR-filtered query,
+    unchanged files are skipped, every chunk of every new/changed file is
+    embedded in a single get_embeddings call (sharded across `workers`
+    processes when workers > 1) and written through the batch API with
+    deterministic UUIDs, so an update is an upsert rather than delete+insert.
+    Returns {file_name: "new" | "changed" | "unchanged" | "error"}.
+    """
+    store = as_store(client)
+    result_summary = {}
+    pending = []
+
+    stored_hashes = {}
+    stored_ids = {}
+    for obj in fetch_by_file_names(store, collection_name, snippets.keys(), return_properties=["file_name", "code_hash"]):
+        stored_hashes.setdefault(obj.properties.get("file_name"), set()).add(obj.properties.get("code_hash"))
+        stored_ids.setdefault(obj.properties.get("file_name"), set()).add(str(obj.uuid))
+
+    for file_name, code_str in snippets.items():
+        code_hash = compute_hash(code_str)
+        existing = stored_hashes.get(file_name)
+        if existing == {code_hash}:
             print(f"🟡 {file_name} unchanged. Skipping.")
-            return "unchanged"
-        else:
+            result_summary[file_name] = "unchanged"
+            continue
+        if existing:
             print(f"🟠 {file_name} changed. Updating.")
-            collection.data.delete_many(where=Filter.by_property("file_name").equal(file_name))
-            result_state = "changed"
-    else:
-        result_state = "new"
+        try:
+            pending.append((file_name, split_code_chunks(code_str), code_hash, "changed" if existing else "new"))
+        except Exception as e:
+            print(f"❌ Error chunking {file_name}: {str(e)}")
+            result_summary[file_name] = "error"
 
-    properties = {
-        "file_name": file_name,
-        "code": code_str,
-        "code_hash": code_hash,
-        "embedding_source": "Hugging Face" if USE_MANUAL_EMBEDDING else "weaviate"
-    }
+    if not pending:
+        return result_summary
 
+    all_vectors = None
     if USE_MANUAL_EMBEDDING:
-        vector = get_embedding(code_str).tolist()
-        collection.data.insert(properties=properties, vector=vector)
-        print(f"✅ inside manual embedding")
-    else:
-        collection.data.insert(properties=properties)
-        print(f"✅ inside weaviate embedding")
+        texts = [chunk["code"] for _, chunks, _, _ in pending for chunk in chunks]
+        print(f"📦 Embedding {len(texts)} chunk(s) from {len(pending)} new/changed file(s) in batches of {batch_size}...")
+        all_vectors = embed_parallel(texts, workers, batch_size=batch_size)
+
+    offset = 0
+    object_files = {}
+    objects = []
+    mirrored = []
+    for file_name, chunks, code_hash, result_state in pending:
+        for index, chunk in enumerate(chunks):
+            object_id = chunk_uuid(file_name, index)
+            object_files[str(object_id)] = file_name
+            properties = {
+                "file_name": file_name,
+                "code": chunk["code"],
+                "code_hash": code_hash,
+                "symbol_path": chunk["symbol_path"],
+                "start_line": chunk["start_line"],
+                "end_line": chunk["end_line"],
+                "chunk_index": index,
+                "embedding_source": "Hugging Face" if USE_MANUAL_EMBEDDING else "weaviate"
+            }
+            vector = all_vectors[offset] if all_vectors is not None else None
+            objects.append((object_id, properties, vector))
+            if vector is not None:
+                mirrored.append((file_name, object_id, properties, vector))
+            offset += 1
+
+    failed = store.upsert(collection_name, objects)
+    retrieval_cache.invalidate_collection(collection_name)
+    failed_files = {object_files.get(str(object_id)) for object_id, _ in failed}
+    for _, message in failed[:5]:
+        print(f"❌ Batch write failed: {message}")
+
+    # Chunks a changed file no longer has (or pre-chunking objects) keep their old ids
+    stale_ids = []
+    for file_name, chunks, code_hash, result_state in pending:
+        if file_name in failed_files:
+            result_summary[file_name] = "error"
+            continue
+        if result_state == "changed":
+            new_ids = {str(chunk_uuid(file_name, index)) for index in range(len(chunks))}
+            stale_ids.extend(stored_ids.get(file_name, set()) - new_ids)
+        print(f"✅ {file_name} stored in {collection_name} ({len(chunks)} chunk(s)).")
+        result_summary[file_name] = result_state
+
+    if stale_ids:
+        store.delete_ids(collection_name, stale_ids)
+    _mirror_chunks(collection_name, [m for m in mirrored if m[0] not in failed_files])
+    keywords = get_keyword_index(collection_name)
+    if keywords is not None:
+        written = [(object_id, properties) for object_id, properties, _ in objects
+                   if object_files[str(object_id)] not in failed_files]
+        keywords.upsert_many([object_id for object_id, _ in written], [properties for _, properties in written])
+        keywords.delete(stale_ids)
+        keywords.save()
+    return result_summary
+
+def _mirror_chunks(collection_name, mirrored):
+    """Write-through to the local index so reads see the new chunks before the next delta pull."""
+    local = get_local_index(collection_name)
+    if local is None or not mirrored:
+        return
+    local.delete_where({"file_name": sorted({file_name for file_name, _, _, _ in mirrored})})
+    local.upsert_many([object_id for _, object_id, _, _ in mirrored],
+                      [properties for _, _, properties, _ in mirrored],
+                      [vector for _, _, _, vector in mirrored])
+    local.save()
+
+DOC_TEXT_TOKEN_BUDGET = int(os.getenv("DOC_TEXT_TOKEN_BUDGET", "2000"))  # longer documents go into the prompt as their best chunks
+
+def fetch_document_chunks(client, tablename, code_id, user_name=None):
+    """Every chunk of one stored document (vectors included), in document order."""
+    where = {"code_id": code_id}
+    if user_name:
+        where["user_name"] = user_name
+    objects = as_store(client).fetch(tablename, where=where, include_vector=True)
+    return sorted(objects, key=lambda obj: obj.properties.get("chunk_index") or 0)
+
+def _unit_vectors(chunks):
+    vectors = np.asarray([obj.vector["default"] for obj in chunks], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+def document_vector(chunks):
+    """One query vector for a whole document: the normalized mean of its chunks' unit vectors."""
+    chunks = [obj for obj in chunks if obj.vector and obj.vector.get("default") is not None]
+    if not chunks:
+        raise ValueError("❌ Vector not generated for user code")
+    mean = _unit_vectors(chunks).mean(axis=0)
+    norm = np.linalg.norm(mean)
+    return (mean / norm if norm else mean).tolist()
 
-    print(f"✅ {file_name} stored in {collection_name}.")
-    return result_state
+def document_text(full_text, chunks, vector, budget=DOC_TEXT_TOKEN_BUDGET):
+    """
+    The document as it goes into the prompt: the whole text when it fits in
+    budget tokens, otherwise the chunks most similar to vector (the prompt's
+    embedding, or document_vector for a whole-document task) that fit,
+    in document order.
+    """
+    if (full_text and count_tokens(full_text) <= budget) or not chunks:
+        return full_text
+    scored = [obj for obj in chunks if obj.vector and obj.vector.get("default") is not None]
+    similarity = {}
+    if scored and vector is not None:
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        similarity = {id(obj): float(s) for obj, s in zip(scored, _unit_vectors(scored) @ query)}
+    ranked = sorted(range(len(chunks)), key=lambda i: -similarity.get(id(chunks[i]), 0.0))
+
+    chosen, used = [], 0
+    for i in ranked:
+        cost = count_tokens(chunks[i].properties.get("text") or "") + 1
+        if used + cost <= budget:
+            chosen.append(i)
+            used += cost
+    print(f"📑 Document text: {len(chosen)}/{len(chunks)} chunk(s), {used} token(s) of {budget}")
+    return "\n\n".join(chunks[i].properties.get("text") or "" for i in sorted(chosen or ranked[:1]))
 
 def store_document_embedding(client, file_name, doc_text,tablename,user_name):
     """
-    Stores a document embedding (e.g., PDF or DOCX converted to plain text) to the 'FunctionDocsEmbedding' collection in Weaviate.
+    Stores a document (e.g., PDF or DOCX converted to plain text) to the 'FunctionDocsEmbedding' collection in Weaviate.
 
     Parameters:
     - client: weaviate client connection.
     - file_name: Name of the original document file (e.g., "HRPolicy.pdf").
     - doc_text: The extracted text content of the document.
-    """
-    collection = client.collections.get(tablename)
-    code_hash = compute_hash(doc_text)
-
-
-    match_filter = Filter.by_property("file_name").equal(file_name) & Filter.by_property("user_name").equal(user_name)
 
-    result = collection.query.fetch_objects(filters=match_filter)
-
-
-    if result.objects:
-        obj = result.objects[0]
-        if obj.properties.get("code_hash") == code_hash:
+    Returns (state, code_id); see store_document_embeddings.
+    """
+    return store_document_embeddings(client, {file_name: doc_text}, tablename, user_name)[file_name]
+
+def _mirror_documents(tablename, user_name, written):
+    """Write-through of freshly stored documents to the local vector mirror and the keyword index."""
+    if not written:
+        return
+    file_names = [properties["file_name"] for _, properties, _ in written]
+    local = get_local_index(tablename)
+    vectors = [(code_id, properties, vector) for code_id, properties, vector in written if vector is not None]
+    if local is not None and vectors:
+        local.delete_where({"file_name": file_names, "user_name": user_name})
+        local.upsert_many([code_id for code_id, _, _ in vectors], [properties for _, properties, _ in vectors],
+                          [vector for _, _, vector in vectors])
+        local.save()
+    keywords = get_keyword_index(tablename)
+    if keywords is not None:
+        keywords.delete_where({"file_name": file_names, "user_name": user_name})
+        keywords.upsert_many([code_id for code_id, _, _ in written], [properties for _, properties, _ in written])
+        keywords.save()
+
+def store_document_embeddings(client, documents, tablename, user_name, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Store a {file_name: doc_text} dict of documents for one user.
+
+    Each document is split into section chunks (doc_chunker) stored as
+    separate objects that share the document's code_id, so retrieval can
+    return the relevant sections instead of the whole file. The user's
+    stored copies of all files come back from one OR-filtered query, the
+    chunks of every new or changed document are embedded in one
+    get_embeddings call and written in one upsert; replaced copies are
+    deleted by id only after their successor is stored.
+    Returns {file_name: (state, code_id)}; state is "error" and code_id None on failure.
+    """
+    store = as_store(client)
+    results = {}
+    pending = []
+
+    stored = {}
+    try:
+        for obj in fetch_by_file_names(store, tablename, documents.keys(), return_properties=["file_name", "code_hash", "code_id", "user_name"]):
+            if obj.properties.get("user_name") == user_name:
+                stored.setdefault(obj.properties.get("file_name"), []).append((str(obj.uuid), obj.properties))
+    except Exception as e:
+        print(f"❌ Error checking {len(documents)} document(s): {str(e)}")
+        return {file_name: ("error", None) for file_name in documents}
+
+    for file_name, doc_text in documents.items():
+        code_hash = compute_hash(doc_text)
+        existing = stored.get(file_name, [])
+        if existing and existing[0][1].get("code_hash") == code_hash:
             print(f"🟡 {file_name} unchanged. Skipping.")
-            code_id = obj.properties.get("code_id")
-            return "unchanged",code_id
-        else:
+            results[file_name] = ("unchanged", existing[0][1].get("code_id"))
+            continue
+        if existing:
             print(f"🟠 {file_name} changed. Updating.")
-            collection.data.delete_many(where=match_filter)
-            result_state = "changed"
-    else:
-        result_state = "new"
-
-    code_id = str(uuid.uuid4())     
+        pending.append((file_name, doc_text, code_hash, "changed" if existing else "new"))
+
+    if not pending:
+        return results
+
+    code_ids, chunk_counts, objects, owners = {}, {}, [], []
+    for file_name, doc_text, code_hash, _ in pending:
+        code_id = code_ids[file_name] = str(uuid.uuid4())
+        chunks = chunk_document(doc_text)
+        chunk_counts[file_name] = len(chunks)
+        for index, chunk in enumerate(chunks):
+            properties = {
+                "file_name": file_name,
+                "text": chunk["text"],
+                "code_hash": code_hash,
+                "code_id": code_id,
+                "user_name": user_name,
+                "section": chunk["section"],
+                "start_line": chunk["start_line"],
+                "end_line": chunk["end_line"],
+                "chunk_index": index,
+                "embedding_source": "Hugging Face" if USE_MANUAL_EMBEDDING else "weaviate"
+            }
+            objects.append((generate_uuid5(f"{code_id}#{index}"), properties, None))
+            owners.append(file_name)
 
-    properties = {
-        "file_name": file_name,
-        "text": doc_text,
-        "code_hash": code_hash,
-        "code_id": code_id,
-        "user_name": user_name,
-        "embedding_source": "Hugging Face" if USE_MANUAL_EMBEDDING else "weaviate"
-    }
-
-    if USE_MANUAL_EMBEDDING:    
-        vector = get_embedding(doc_text).tolist()
-        collection.data.insert(uuid=code_id,properties=properties, vector=vector)
-        print(f"✅ Document embedding inserted manually.")
-    else:
-        collection.data.insert(properties=properties)
-        print(f"✅ Document embedding inserted via Weaviate vectorizer.")
-    
-    print(f"✅ {file_name} stored in {doc_text}.")
-    return result_state,code_id
+    if USE_MANUAL_EMBEDDING:
+        print(f"📦 Embedding {len(objects)} chunk(s) of {len(pending)} new/changed document(s) in batches of {batch_size}...")
+        vectors = get_embeddings([properties["text"] for _, properties, _ in objects], batch_size=batch_size)
+        objects = [(object_id, properties, vector) for (object_id, properties, _), vector in zip(objects, vectors)]
+
+    try:
+        failed = store.upsert(tablename, objects)
+    except Exception as e:
+        print(f"❌ Error storing {len(objects)} chunk(s): {str(e)}")
+        results.update({file_name: ("error", None) for file_name, _, _, _ in pending})
+        return results
+    retrieval_cache.invalidate_collection(tablename)
+    failed_ids = {str(object_id) for object_id, _ in failed}
+    for _, message in failed[:5]:
+        print(f"❌ Batch write failed: {message}")
+    failed_files = {file_name for (object_id, _, _), file_name in zip(objects, owners) if str(object_id) in failed_ids}
+
+    written, stale_ids = [], []
+    for (object_id, properties, vector), file_name in zip(objects, owners):
+        if file_name in failed_files:
+            stale_ids.append(object_id)  # a partly written copy; the previous one stays in place
+        else:
+            written.append((object_id, properties, vector))
+    for file_name, _, _, result_state in pending:
+        if file_name in failed_files:
+            results[file_name] = ("error", None)
+            continue
+        stale_ids.extend(object_id for object_id, _ in stored.get(file_name, []))
+        print(f"✅ {file_name} stored in {tablename} ({chunk_counts[file_name]} chunk(s)).")
+        results[file_name] = (result_state, code_ids[file_name])
+
+    if stale_ids:
+        store.delete_ids(tablename, stale_ids)
+    _mirror_documents(tablename, user_name, written)
+    return results
 
 # def retrieve_framework_context(client, user_vector,user_query_text, top_k=5):
 #     if not user_vector:
@@ -357,21 +618,114 @@ Only return the updated C# code—no explanation or extra text.
     else:
         raise Exception(f"Failed to generate suggestion: {response.text}")
 
-def retrieve_framework_context(client, user_vector,user_prompt, top_k=5):
+RETRIEVAL_WORKERS = 4
+# Share of the reciprocal-rank fusion that goes to BM25 keyword hits (0 = vector only, 1 = keyword only)
+HYBRID_KEYWORD_WEIGHT = float(os.getenv("HYBRID_KEYWORD_WEIGHT", "0.5"))
+# Prompts naming a code symbol (SaveAsync, AppCRUD) are cut to this many hits once a chunk containing it is found
+SYMBOL_TOP_K = int(os.getenv("SYMBOL_TOP_K", "3"))
+_retrieval_pool = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+
+def _query_source(store, user_vector, collection_name, where, top_k):
+    local = get_local_index(collection_name)
+    if local is not None and len(local):
+        return local.query(user_vector, top_k, where=where)
+    return store.near_vector(collection_name, user_vector, top_k=top_k, where=where)
+
+def _keyword_source(collection_name, query_text, where, top_k):
+    keywords = get_keyword_index(collection_name)
+    return keywords.search(query_text, top_k, where=where) if keywords is not None else []
+
+def _distance_of(obj):
+    distance = getattr(obj.metadata, "distance", None) if getattr(obj, "metadata", None) is not None else None
+    return distance if distance is not None else float("inf")
+
+def _fuse(sources, vector_lists, keyword_lists, query_text, top_k):
+    """
+    Reciprocal-rank fusion of every per-collection vector and keyword list.
+    Each hit comes back as a fresh result object with metadata.score set to
+    its fused score and metadata.distance kept from the vector hit, if any.
+    """
+    hits, collection_of = {}, {}
+    for (name, _), vector_hits, keyword_hits in zip(sources, vector_lists, keyword_lists):
+        for obj in list(keyword_hits) + list(vector_hits):  # vector hits last: they carry the distance
+            hits[str(obj.uuid)] = obj
+            collection_of[str(obj.uuid)] = name
+    fused = reciprocal_rank_fusion(
+        [[str(obj.uuid) for obj in results] for results in vector_lists + keyword_lists],
+        [1 - HYBRID_KEYWORD_WEIGHT] * len(vector_lists) + [HYBRID_KEYWORD_WEIGHT] * len(keyword_lists),
+        k=RRF_K,
+    )
+
+    wanted = symbols(query_text)
+    if wanted:
+        # Chunks containing every symbol the prompt names go first, and fewer hits are needed
+        exact = {object_id for object_id, _ in fused
+                 if get_keyword_index(collection_of[object_id]) is not None
+                 and get_keyword_index(collection_of[object_id]).has_terms(object_id, wanted)}
+        if exact:
+            fused = sorted(fused, key=lambda item: item[0] not in exact)  # stable: fused order kept within each group
+            top_k = min(top_k, SYMBOL_TOP_K)
+
+    results = []
+    for object_id, score in fused[:top_k]:
+        obj = hits[object_id]
+        vector = obj.vector.get("default") if obj.vector else None
+        results.append(ResultObject(obj.uuid, dict(obj.properties), vector, getattr(obj.metadata, "distance", None), score))
+    return results
+
+def retrieve_multi(client, user_vector, sources, top_k=5, query_text=None):
+    """
+    Nearest objects across several collections.
+
+    sources is [(collection_name, where or None)]. Each collection is queried
+    for top_k on its own thread (local mirror when populated), so the wall
+    time is that of the slowest query rather than the sum. Results are merged
+    by cosine distance, which is comparable across collections because they
+    share one embedding model, and cut to a global top_k.
+
+    With query_text, each collection's BM25 keyword index is searched as well
+    and all lists are combined by reciprocal-rank fusion (HYBRID_KEYWORD_WEIGHT).
+    """
     if not user_vector:
         raise ValueError("❌ Cannot retrieve context - user vector is empty")
+    with tracing.span("retrieval") as record:
+        store = as_store(client)
+        hybrid = bool(query_text) and HYBRID_KEYWORD_WEIGHT > 0 and any(get_keyword_index(name) for name, _ in sources)
+
+        filters = {name: where for name, where in sources}
+        if hybrid:
+            filters = {"where": filters, "query": query_text, "keyword_weight": HYBRID_KEYWORD_WEIGHT}
+        ticket, cached = retrieval_cache.lookup(user_vector, [name for name, _ in sources], filters, top_k)
+        record.set(cache_hit=cached is not None)
+        if cached is not None:
+            record.set(objects=len(cached))
+            return cached
+
+        if len(sources) == 1 and not hybrid:
+            vector_lists = [_query_source(store, user_vector, sources[0][0], sources[0][1], top_k)]
+            keyword_lists = []
+        else:
+            vector_futures = [tracing.submit(_retrieval_pool, _query_source, store, user_vector, name, where, top_k) for name, where in sources]
+            keyword_futures = [tracing.submit(_retrieval_pool, _keyword_source, name, query_text, where, top_k)
+                               for name, where in sources] if hybrid else []
+            vector_lists = [future.result() for future in vector_futures]
+            keyword_lists = [future.result() for future in keyword_futures]
+
+        if hybrid and any(keyword_lists):
+            merged = _fuse(sources, vector_lists, keyword_lists, query_text, top_k)
+        else:
+            merged = sorted((obj for results in vector_lists for obj in results), key=_distance_of)[:top_k]
+        record.set(objects=len(merged))
+        retrieval_cache.remember(ticket, merged)
+        return merged
 
-    fx_collection = client.collections.get("FXCodeEmbedding")
-    snippet_collection = client.collections.get("SnippetCodeEmbeddings")
-    fun_collection = client.collections.get("FunctionDocsEmbedding")
+def retrieve_framework_context(client, user_vector,user_prompt, top_k=5):
+    if not user_vector:
+        raise ValueError("❌ Cannot retrieve context - user vector is empty")
 
     # file_filter = Filter.by_property("file_name").equal("AppCRUD")
-    fx_results = fx_collection.query.near_vector(
-        near_vector=user_vector,
-        limit=top_k,
-        # filters=file_filter,
-        return_metadata=MetadataQuery(distance=True)
-    )
+    # Vector search fused with BM25 over identifiers, so "use AppCRUD SaveAsync" finds SaveAsync
+    fx_results = retrieve_multi(client, user_vector, [("FXCodeEmbedding", None)], top_k=top_k, query_text=user_prompt)
     
     # fx_results = fx_collection.query.hybrid(
     #     query=user_prompt,               # 👈 use user text (e.g., "optimize exception handling")
@@ -394,17 +748,14 @@ def retrieve_framework_context(client, user_vector,user_prompt, top_k=5):
     #     return_metadata=MetadataQuery(distance=True)
     # )
     # Combine results from both collections
-    combined_results = fx_results.objects 
+    combined_results = fx_results
     return combined_results
 
-def retrieve_Fun_framework_context(client, user_vector, top_k=5):
+def retrieve_Fun_framework_context(client, user_vector, top_k=10, user_prompt=None):
     if not user_vector:
         raise ValueError("❌ Cannot retrieve context - user vector is empty")
 
     
-    fx_collection = client.collections.get("FXCodeEmbedding")
-    snippet_collection = client.collections.get("SnippetCodeEmbeddings")
-    fun_collection = client.collections.get("FunctionDocsEmbedding")
      # 🔥 HARD-CODED list of allowed files
     allowed_files = ["JobHeader_Save_environment.docx","JobHeader_Save_environment1.docx"]
 
@@ -462,30 +813,14 @@ def retrieve_Fun_framework_context(client, user_vector, top_k=5):
     #         Filter.by_property("file_name").equal(fname) for fname in allowed_files
     #     ]
     # )
-    # Start with the first condition
-    file_filter = Filter.by_property("file_name").equal(allowed_files[0])
-
-    # For each additional file name, create an OR condition
-    for file in allowed_files[1:]:
-        file_filter = file_filter | Filter.by_property("file_name").equal(file)
+    # Any of the allowed files (an OR of equal() filters on Weaviate)
+    file_filter = {"file_name": allowed_files}
     
-    fx_results = fx_collection.query.near_vector(
-        near_vector=user_vector,
-        limit=top_k,
-        return_metadata=MetadataQuery(distance=True)
-    )
-
-    
-
-    fun_results = fun_collection.query.near_vector(
-        near_vector=user_vector,
-        limit=top_k,
-        #filters=Filter.by_property("file_name").equal_any(allowed_files),
-        filters=file_filter,
-        return_metadata=MetadataQuery(distance=True)
-    )
-    # Combine results from both collections
-    combined_results = fx_results.objects +fun_results.objects
+    # Both collections are queried concurrently and merged by distance under one top_k
+    combined_results = retrieve_multi(client, user_vector, [
+        ("FXCodeEmbedding", None),
+        ("FunctionDocsEmbedding", file_filter),
+    ], top_k=top_k, query_text=user_prompt)
     return combined_results
 
 
@@ -535,17 +870,74 @@ Only return the updated C# code—no explanation or extra text.
 
 
     
-IS_OLLAMA = False  # Set to True to use Ollama (Mistral), False to use OpenAI
+def stream_chat(role, user_message, cache_key, prompt):
+    """
+    Generator over (text so far, usage) while the model produces tokens; usage
+    is only set on the last item. A cached answer comes back as one item.
+    """
+    with tracing.span("response_cache") as record:
+        cached = response_cache.lookup(cache_key, prompt)
+        record.set(cache_hit=cached is not None)
+    if cached is not None:
+        yield cached
+        return
+
+    content, usage = "", None
+    for content, usage in llm_provider.stream(role, [{"role": "user", "content": user_message}]):
+        yield content, usage
+
+    print("Message content:\n", content)
+    print("\nToken usage:", usage)
+    response_cache.remember(cache_key, prompt, content, usage)
+
+async def astream_chat(role, user_message, cache_key, prompt):
+    """stream_chat() as an async generator on the async LLM client; cache I/O runs off the event loop."""
+    with tracing.span("response_cache") as record:
+        cached = await blocking_executor.run(response_cache.lookup, cache_key, prompt)
+        record.set(cache_hit=cached is not None)
+    if cached is not None:
+        yield cached
+        return
+
+    content, usage = "", None
+    async for content, usage in llm_provider.astream(role, [{"role": "user", "content": user_message}]):
+        yield content, usage
+
+    print("Message content:\n", content)
+    print("\nToken usage:", usage)
+    await blocking_executor.run(response_cache.remember, cache_key, prompt, content, usage)
+
+def _reply(role, user_message, cache_key, prompt, stream):
+    """
+    stream=False: (content, usage). stream=True: generator of (text so far, usage)
+    for the UI to render incrementally. stream="async": the same as an async generator.
+    """
+    if stream == "async":
+        return astream_chat(role, user_message, cache_key, prompt)
+    if stream:
+        return stream_chat(role, user_message, cache_key, prompt)
+    return complete_chat(role, user_message, cache_key, prompt)
+
+def complete_chat(role, user_message, cache_key, prompt):
+    """(content, usage) for one system role + user message through the configured provider, cached."""
+    with tracing.span("response_cache") as record:
+        cached = response_cache.lookup(cache_key, prompt)
+        record.set(cache_hit=cached is not None)
+    if cached is not None:
+        return cached
+
+    message_content, token_usage = llm_provider.complete(role, [{"role": "user", "content": user_message}])
+    print("Message content:\n", message_content)
+    print("\nToken usage:", token_usage)
+    response_cache.remember(cache_key, prompt, message_content, token_usage)
+    return message_content, token_usage
 
-def generate_code_suggestion(user_code_, userprompt_, retrievedcontext_,state):
+def generate_code_suggestion(user_code_, userprompt_, retrievedcontext_,state, stream=False):
     Notes = "NOTE:- While Handling the exceptions Use the internal framework Logging Service to log exceptions instead of using 'throw new'." 
     # + "\n" + "2. If the user Prompt Prefers any kind of Transaction type. Please go on with the Internal Framework Logic since we have already predefined methods in APPCRUD.If that method is not applicable to the user case go with your suggestions";
     
-    snippets = [
-        f"{i+1}.\nCode:\n{obj.properties['code']}"
-        for i, obj in enumerate(retrievedcontext_)
-        if 'code' in obj.properties
-]
+    # Fenced, deduplicated, relevance-ordered snippets within the token budget
+    snippets = pack_context(retrievedcontext_, model=llm_provider.model_name(), fields=("code",))
 
     user_message = f"""The user has submitted the following C# code with the instruction: "{userprompt_}"
 
@@ -572,58 +964,17 @@ Here are some framework patterns:
         role = "You are an AI agent that specializes in identifying and fixing bugs in C# code according to internal framework patterns. Only return the bugs and explanation." + "\n" + Notes
     elif state["inputs"]["FnRadio"]["curd"]:
          role = "You are an AI agent that specializes in Writing a CRUD Operation from the Functional Documents provided by user who writes according to internal framework patterns.Only return the updated C# code with explanation." + "\n" + Notes
-    if IS_OLLAMA:
-        # Use Ollama (Mistral) locally
-        response = requests.post("http://localhost:11434/api/chat", json={
-            "model": "mistral",
-            "messages": [
-                {"role": "system", "content": role},
-                {"role": "user", "content": user_message}
-            ],
-            "stream": False
-        })
-
-        if response.status_code == 200:
-            content = response.json()["message"]["content"]
-            print("Message content:\n", content)
-            return content, None
-        else:
-            raise Exception(f"Failed to generate suggestion via Ollama: {response.text}")
-    else:
-        # Use OpenAI API (GPT-4o mini)
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": role
-                },
-                {
-                    "role": "user",
-                    "content": user_message
-                }
-            ]
-        )
-
-        message_content = response.choices[0].message.content
-        token_usage = response.usage
-        print("Message content:\n", message_content)
-        print("\nToken usage:", token_usage)
-        return message_content, token_usage
-
-def generate_FN_code_Testcase_suggestion(user_code_, userprompt_, retrievedcontext_,state):
+
+    cache_key = response_cache.response_key(llm_provider.model_name(), role, user_code_, userprompt_, retrievedcontext_)
+    return _reply(role, user_message, cache_key, userprompt_, stream)
+
+def generate_FN_code_Testcase_suggestion(user_code_, userprompt_, retrievedcontext_,state, stream=False):
 
     # Notes = "NOTE:- While Handling the exceptions Use the internal framework Logging Service to log exceptions instead of using 'throw new'."
     Notes = "NOTE:- Focus on internal framework practices. Be clear and detailed in your suggestions."
 
 
-    snippets = [
-    f"{i+1}.\nCode:\n{obj.properties.get('code', '[No code available]')}\nText:\n{obj.properties.get('text', '[No text available]')}"
-    for i, obj in enumerate(retrievedcontext_)
-    if 'code' in obj.properties or 'text' in obj.properties
-]
+    snippets = pack_context(retrievedcontext_, model=llm_provider.model_name(), fields=("code", "text"))
 
     user_message = f"""The user has provided the following functional document with the instruction: "{userprompt_}"
 
@@ -646,56 +997,15 @@ Relevant Framework Context:
          role = "You are an AI agent that specializes in generation the C# code for the functional document provided by user and based on the internal framework patterns.Only return the updated C# code with explanation." + "\n" + Notes
     elif state["inputs"]["FnRadio"]["curd"]:
         role = "You are an AI agent that specializes in writing a CRUD operation in C# according to internal framework patterns. Only return the updated C# code with explanation." + "\n" + Notes
-    if IS_OLLAMA:
-        # Use Ollama (Mistral) locally
-        response = requests.post("http://localhost:11434/api/chat", json={
-            "model": "mistral",
-            "messages": [
-                {"role": "system", "content": role},
-                {"role": "user", "content": user_message}
-            ],
-            "stream": False
-        })
-
-        if response.status_code == 200:
-            content = response.json()["message"]["content"]
-            print("Message content:\n", content)
-            return content, None
-        else:
-            raise Exception(f"Failed to generate suggestion via Ollama: {response.text}")
-    else:
-        # Use OpenAI API (GPT-4o mini)
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": role
-                },
-                {
-                    "role": "user",
-                    "content": user_message
-                }
-            ]
-        )
-
-        message_content = response.choices[0].message.content
-        token_usage = response.usage
-        print("Message content:\n", message_content)
-        print("\nToken usage:", token_usage)
-        return message_content, token_usage
-
-def SuggestFxCode_Based_on_user_input(User_Promt, retrievedcontext_):
+
+    cache_key = response_cache.response_key(llm_provider.model_name(), role, user_code_, userprompt_, retrievedcontext_)
+    return _reply(role, user_message, cache_key, userprompt_, stream)
+
+def SuggestFxCode_Based_on_user_input(User_Promt, retrievedcontext_, stream=False):
     # Notes = "NOTE:- While Handling the exceptions Use the internal framework Logging Service to log exceptions instead of using 'throw new'."
     #Notes = "NOTE:- Focus on internal framework practices. Be clear and detailed in your suggestions.and return the correct framework pattern that user asked for."
 
-    snippets = [
-    f"{i+1}.\nCode:\n{obj.properties['code']}"
-    for i, obj in enumerate(retrievedcontext_)
-    if 'code' in obj.properties
-]
+    snippets = pack_context(retrievedcontext_, model=llm_provider.model_name(), fields=("code",))
     user_message = f"""The user has Requested to Get the instruction: "{User_Promt}"
     Here are some framework patterns:
 
@@ -704,25 +1014,6 @@ def SuggestFxCode_Based_on_user_input(User_Promt, retrievedcontext_):
 
 """
     role = "You are an AI agent specialized in my internal framework. Your knowledge is based entirely on the internal framework you were trained with. you should focus only on the user question and return the exact code avaiable in the framework or Just List out the method name avaiable in the framework code which user asked for.Don't search on the entire framework code. Just target on the specific file user asked for."
-    # Use OpenAI API (GPT-4o mini)
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-    response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": role
-                },
-                {
-                    "role": "user",
-                    "content": user_message
-                }
-            ]
-        )
-
-    message_content = response.choices[0].message.content
-    token_usage = response.usage
-    print("Message content:\n", message_content)
-    print("\nToken usage:", token_usage)
-    return message_content, token_usage    
+
+    cache_key = response_cache.response_key(llm_provider.model_name(), role, None, User_Promt, retrievedcontext_)
+    return _reply(role, user_message, cache_key, User_Promt, stream)    
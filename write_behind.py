@@ -0,0 +1,52 @@
+import atexit
+import queue
+import threading
+import time
+
+
+class WriteBehindQueue:
+    """
+    Runs writes on a background thread so the request path never waits for them.
+
+    submit() blocks only when max_pending writes are already queued
+    (backpressure). flush() waits for everything queued so far and is
+    registered at exit; callers that close their client explicitly should
+    flush() first.
+    """
+
+    def __init__(self, name="write-behind", max_pending=1000):
+        self.name = name
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, fn, *args, **kwargs):
+        self._queue.put((fn, args, kwargs))
+
+    def _run(self):
+        while True:
+            fn, args, kwargs = self._queue.get()
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ {self.name}: background write failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def pending(self):
+        return self._queue.unfinished_tasks
+
+    def flush(self, timeout=30):
+        """Wait until every queued write has run; returns False if timeout expired first."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"⚠️ {self.name}: {self._queue.unfinished_tasks} write(s) still pending at flush timeout")
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True